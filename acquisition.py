@@ -0,0 +1,246 @@
+import queue, threading, time
+from concurrent.futures import Future
+import numpy as np
+import batch, calibration
+from limits import LimitMonitor
+from pipeline import BoundedQueue
+import quality
+
+
+class AcquisitionEngine():
+    """
+    The single owner of the devices.
+
+    ...
+
+    A background thread reads both devices every `period` seconds (or at
+    the interval chosen by the adaptive ClipX reader), builds one batch of
+    rows per read (see `batch.py`), gives every row the Net F/T sample
+    streamed just before it, appends it to the `SampleBuffer`,
+    queues it for the `Recorder` and the subscribers and keeps the latest values for the HTTP handlers.
+    Every Net F/T sample is also queued for the `Recorder` at the RDT rate. No device
+    read and no hand-over to a consumer waits, so a slow consumer cannot
+    stall the acquisition. Request handlers never call the
+    devices directly: device operations (connect, tare, disconnect) are
+    submitted with `submit()` and run between two reads in the acquisition
+    thread, so any number of concurrent clients can be served without
+    touching the DLLs.
+
+    Attributes
+    ----------
+    devices: DeviceManager
+        the supervised device connections.
+    buffer: SampleBuffer
+        in-memory buffer filled with every acquired row.
+    recorder: Recorder
+        writes the rows to `./data` while recording.
+    heidenCon: bool
+        whether the Heidenhain EIB741 is read.
+    period: float
+        acquisition period in seconds, or None to follow the polling
+        interval of `devices.reader`. Default is None.
+    latest: dict
+        last values of every channel (positions in mm, forces in N and
+        torques in Nm, untared), plus the `gap` flags of every device and
+        the sequence number and quality flags of the last row.
+    seq: int
+        sequence number of the next row. Every row gets the next number, for
+        the life of the engine (see `quality.py`).
+    subscribers: dict
+        name -> BoundedQueue of the consumers added with `subscribe()`.
+    calibrations: dict
+        sensor name -> `calibration.Calibration` that converts its raw values.
+        Replayed sessions are already in physical units and use the defaults.
+        Their rows keep the positions and Net F/T values recorded with every
+        load cell line.
+    limits: LimitMonitor
+        checks every batch against the channel limits and sends the alarms.
+    """
+
+    def __init__(self, devices, buffer, recorder, heidenCon=True, period=None, calibrations=None, limits=None):
+        self.devices = devices
+        self.buffer = buffer
+        self.recorder = recorder
+        self.heidenCon = heidenCon
+        self.period = period
+        self.latest = {"ax": 0, "ay": 0, "az": 0, "fx": 0, "fy": 0, "fz": 0, "tx": 0, "ty": 0, "tz": 0,
+                       "nfx": 0, "nfy": 0, "nfz": 0, "ntx": 0, "nty": 0, "ntz": 0,
+                       "hbcGap": False, "heidenGap": False, "netftGap": False, "seq": -1, "quality": 0}
+        self.seq = 0
+        self.subscribers = {}
+        self.calibrations = calibrations or calibration.defaults()
+        self.replayCalibrations = calibration.defaults()
+        self.limits = limits or LimitMonitor()
+        self.commands = queue.Queue()
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """Starts the acquisition thread if it is not running yet.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True, name="acquisition")
+        self.thread.start()
+
+    def stop(self):
+        """Stops the soft real-time loop of the devices, if any, and the
+        acquisition thread and waits for them.
+        """
+        self.devices.stopRealtime(restream=False)
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def subscribe(self, name, capacity=10000, policy="decimate"):
+        """Adds a consumer of every acquired row. The rows are handed over
+        as `batch.DTYPE` arrays through a `pipeline.BoundedQueue`, so a slow
+        consumer never stalls the acquisition (unless it asks for the 'block'
+        policy).
+
+        Returns
+        -------
+        BoundedQueue
+            the queue the consumer reads with `get()`.
+        """
+        queue = BoundedQueue(name, capacity, policy)
+        self.subscribers = dict(self.subscribers, **{name: queue})
+        return queue
+
+    def unsubscribe(self, name):
+        subscribers = dict(self.subscribers)
+        queue = subscribers.pop(name, None)
+        self.subscribers = subscribers
+        if queue is not None:
+            queue.close()
+
+    def submit(self, fn, *args):
+        """Runs `fn(*args)` in the acquisition thread.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            the result (or the exception) of the call.
+        """
+        future = Future()
+        self.commands.put((future, fn, args))
+        return future
+
+    def runCommands(self, timeout):
+        """Runs the submitted commands, waiting up to `timeout` seconds for the first one.
+        """
+        try:
+            future, fn, args = self.commands.get(timeout=timeout) if timeout > 0 else self.commands.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            try:
+                future, fn, args = self.commands.get_nowait()
+            except queue.Empty:
+                return
+
+    def run(self):
+        deadline = time.monotonic()
+        while self.running:
+            try:
+                if self.devices.wanted:
+                    self.acquire()
+            except Exception as e:
+                print("[ ACQUISITION ]: Error ocurred while reading the devices. Error message: ")
+                print(e)
+            deadline += self.period or self.devices.reader.interval
+            now = time.monotonic()
+            if deadline < now:
+                deadline = now
+            self.runCommands(deadline - now)
+
+    def activeCalibrations(self):
+        """Returns the calibrations applied to the rows being acquired.
+        """
+        return self.replayCalibrations if self.devices.replaying else self.calibrations
+
+    def acquire(self):
+        """Reads the devices once and distributes the new rows.
+        """
+        latest = dict(self.latest)
+        calibrations = self.activeCalibrations()
+        clipx = self.devices.readClipX()
+        hbcGap = clipx is None
+        lines = 0 if hbcGap else len(clipx[0])
+
+        heidenGap = False
+        status = 0
+        if self.heidenCon:
+            data = self.devices.readHeiden()
+            heidenGap = data is None
+            if heidenGap:
+                latest.update(ax=float('nan'), ay=float('nan'), az=float('nan'))
+            else:
+                status = data[0]
+                raw = [position if position is not None else np.nan for position in data[1:4]]
+                latest.update(zip(calibration.SENSORS["heiden"], calibrations["heiden"].apply([raw])[0].tolist()))
+
+        #   A single row with NaN forces marks the start of a ClipX outage.
+        gapRow = hbcGap and not self.latest["hbcGap"]
+        seq = self.seq
+        rows = batch.empty(lines + gapRow)
+        rows["seq"] = np.arange(seq, seq + len(rows))
+        rows["values"][:, :3] = (latest["ax"], latest["ay"], latest["az"])
+        rows["status"] = status
+        #   Flags raised by a read with no rows stay pending until the next row.
+        rows["flags"] = (self.devices.takeFlags() if len(rows) else 0) | (quality.HEIDEN_GAP if heidenGap else 0)
+        if lines:
+            #   The whole read is converted with one matrix product, written in place.
+            rows["time"][:lines] = clipx[0]
+            calibrations["clipx"].apply(clipx[1], out=rows["values"][:lines, 3:9])
+            latest.update(zip(calibration.SENSORS["clipx"], rows["values"][lines - 1, 3:9].tolist()))
+        if hbcGap:
+            for channel in calibration.SENSORS["clipx"]:
+                latest[channel] = float('nan')
+        if gapRow:
+            rows["time"][-1] = time.time()
+            rows["values"][-1, 3:9] = np.nan
+            rows["flags"][-1] |= quality.CLIPX_GAP
+        netftGap = self.latest["netftGap"]
+        netft = self.devices.readNetFT(rows["time"]) if len(rows) else None
+        recorded = clipx[2] if lines else None
+        if recorded is not None:
+            #   A replay gives back the positions and the Net F/T values of every line.
+            calibrations["heiden"].apply(recorded[0], out=rows["values"][:lines, :3])
+            calibrations["netft"].apply(recorded[1], out=rows["values"][:lines, 9:])
+            latest.update(zip(calibration.SENSORS["heiden"] + calibration.SENSORS["netft"],
+                              rows["values"][lines - 1, :3].tolist() + rows["values"][lines - 1, 9:].tolist()))
+            netftGap = False
+        elif len(rows) and netft is None:
+            #   The Net F/T is not used, or the devices are replayed.
+            rows["values"][:, 9:] = np.nan
+            latest.update(dict.fromkeys(calibration.SENSORS["netft"], float('nan')))
+            netftGap = False
+        elif netft is not None:
+            calibrations["netft"].apply(netft[0], out=rows["values"][:, 9:])
+            rows["flags"] |= netft[1]
+            netftGap = bool(netft[1][-1] & quality.NETFT_GAP)
+            latest.update(zip(calibration.SENSORS["netft"], rows["values"][-1, 9:].tolist()))
+        samples = self.devices.takeNetFT()
+        if samples is not None and len(samples) and self.recorder.isRecording():
+            calibrations["netft"].apply(samples["values"], out=samples["values"])
+            self.recorder.enqueueNetFT(samples)
+        self.seq = seq + len(rows)
+        if lines and self.limits.enabled():
+            self.limits.check(rows["time"][:lines], rows["values"][:lines], rows["seq"][:lines])
+        #   The same batch is passed by reference to every consumer.
+        self.buffer.extend(rows)
+        if len(rows) and self.recorder.isRecording():
+            self.recorder.enqueue(rows)
+        for queue in list(self.subscribers.values()):
+            queue.put(rows)
+        if len(rows):
+            latest.update(seq=int(rows["seq"][-1]), quality=int(rows["flags"][-1]))
+        latest.update(hbcGap=hbcGap, heidenGap=heidenGap, netftGap=netftGap)
+        self.latest = latest
@@ -1,10 +1,24 @@
-import csv, pathlib, os, datetime, time
-from flask import Flask, jsonify, Response, request, session, render_template
+import csv, json, pathlib, os, datetime, threading, time
+import numpy as np
+from flask import Flask, jsonify, Response, request, session, render_template, stream_with_context
 from flask_cors import CORS, cross_origin
-from netBoxConnection import create_udp_socket, send_request, read_data
+from netBoxConnection import RECV_ADDRESS
 from fakeheiden import FakeHeinden
-from pyeibwrapper import PyEIBWrapper
-from pyhbcwrapper import PyHBCWraperr
+from acquisition import AcquisitionEngine
+from catalog import Catalog
+from clipxreader import ClipXReader
+from limits import LimitMonitor, KINDS
+import batch, calibration
+import columnar, export
+from devices import DeviceManager
+from pyeibwrapper import packetFields
+from recorder import Recorder, FIELDS
+from replay import ReplaySession
+import pyramid
+from profiler import SamplingProfiler
+import quality
+from samplebuffer import SampleBuffer, channelIndex, CHANNELS
+from spectrum import WelchEstimator
 
 
 
@@ -13,9 +27,51 @@ cors = CORS(app)
 app.config['CORS_HEADERS'] = 'Content-Type'
 app.secret_key = "kofoajgraijf#&%kdfj3321*"
 #Init global objects
-heiden = None
-hbc = None
 heidenCon = True
+#   The Net F/T is off by default: /api/connect turns it on with its address.
+netftCon = False
+devices = DeviceManager('./eib7_64.dll', heidenCon, RECV_ADDRESS if netftCon else None)
+buffer = SampleBuffer()
+welch = WelchEstimator()
+recorder = Recorder()
+catalog = Catalog()
+limits = LimitMonitor()
+limits.load()
+engine = AcquisitionEngine(devices, buffer, recorder, heidenCon, calibrations=calibration.load(), limits=limits)
+profiler = SamplingProfiler()
+
+
+#   A server-sent event stream holds a server worker thread while it is open:
+#   at most `MAX_STREAMS` are served at once, so the other routes always keep
+#   free workers (see `serve.py`).
+MAX_STREAMS = 4
+streamSlots = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+def setMaxStreams(limit):
+    global MAX_STREAMS, streamSlots
+    MAX_STREAMS = limit
+    streamSlots = threading.BoundedSemaphore(limit)
+
+
+def netftEndpoint(value):
+    """Parses the `netft` parameter of /api/connect: 'IP', 'IP:PORT' or
+    'off'. Returns ('IP', PORT), or False for 'off'.
+    """
+    if value == "off":
+        return False
+    host, _, port = value.partition(':')
+    port = int(port) if port else RECV_ADDRESS[1]
+    if not host or not 0 < port < 65536:
+        raise ValueError("netft must be IP, IP:PORT or off")
+    return host, port
+
+
+def finite(value):
+    """Returns `value`, or None if it is NaN or infinite (e.g. an EIB741
+    axis not in the data packet): JSON has no NaN.
+    """
+    return value if np.isfinite(value) else None
 
 
 @app.route('/', methods=['GET'])
@@ -30,8 +86,7 @@ def root():
 @app.route('/api/tareloadcell', methods=['GET'])
 def tareLoadCell():
     print("[SYSTEM]: REQUEST RECEIVED")
-    global hbc
-    result = hbc.sdoWrite(0x4410, 4, "")
+    result = engine.submit(lambda: devices.hbc.sdoWrite(0x4410, 4, "")).result()
     print(f"[SYSTEM]: results {result}")
     if result == -1:
         return jsonify({"message": "clipX tare unsuccessful"}), 200
@@ -41,11 +96,13 @@ def tareLoadCell():
 @app.route('/api/tareheiden', methods=['GET'])
 def tareHeiden():
     print("[SYSTEM]: REQUEST RECEIVED")
-    global heiden
-    status, ax, ay, az, aw = heiden.readData()
-    session["tarex"] = ax/2000000
-    session["tarey"] = ay/2000000
-    session["tarez"] = az/2000000
+    latest = engine.latest
+    if latest["heidenGap"]:
+        return jsonify({"message": "heidenhain tare unsuccessful"}), 200
+    #   Axes not in the data packet have no position and keep a zero tare.
+    session["tarex"] = finite(latest["ax"]) or 0
+    session["tarey"] = finite(latest["ay"]) or 0
+    session["tarez"] = finite(latest["az"]) or 0
     return jsonify({"message": "heidenhain tare successful"}), 200
     """res = heiden.tare()
     print(f"[SYSTEM]: results {res}")
@@ -69,33 +126,48 @@ def test():
 #   Function: connect
 #   Route: GET /api/connect/
 #   Description: Closes all open conncections (NetBox and eib741)
+#   Params: rate (ClipX lines per second, default 10), block (lines per
+#   ClipX read, default adaptive), axes (EIB741 axes in the data packet,
+#   comma separated, default ax,ay,az), netft (IP or IP:PORT of the Net F/T,
+#   port 49152 by default, or off; default keeps the current one, off at
+#   start), netftRate (RDT output rate set on the Net F/T, default 1000)
 @app.route('/api/connect', methods=['GET'])
 def connect():
     try:
-        """sk = create_udp_socket()
-        send_request(('127.0.0.1', 49152), 0x0002, 1, sk)
-        fx, fy, fz, tx, ty, tz = read_data(sk)
-        sk.close()"""
-
-        if heidenCon:
-            global heiden
-            heiden = PyEIBWrapper('./eib7_64.dll')
-            heiden.openConnectInit([0, 1, 2 , 3])
-            heiden.configStreaming()
-
-
-        global hbc
-        hbc = PyHBCWraperr()
-        hbc.connect()
-        hbc.sdoWrite(0x4428, 8, '10')
-        hbc.startMeasurement()
+        #   Both devices are connected concurrently. If they are already
+        #   up (e.g. after a browser reload) they are reused as they are.
+        #   The Net F/T streams on its own thread.
+        rate = request.args.get('rate')
+        block = request.args.get('block')
+        axes = request.args.get('axes')
+        netftRate = request.args.get('netftRate')
+        netftAddress = request.args.get('netft')
+        try:
+            rate = float(rate) if rate else None
+            block = int(block) if block else None
+            axes = axes.split(',') if axes else None
+            netftRate = float(netftRate) if netftRate else None
+            netftAddress = netftEndpoint(netftAddress) if netftAddress else None
+            #   Checked on a throwaway reader: the live one is only changed by
+            #   devices.connect, in the acquisition thread.
+            ClipXReader(rate or devices.reader.rate, block)
+            if axes is not None:
+                packetFields(axes)
+            if netftRate is not None and not 0 < netftRate <= 7000:
+                raise ValueError("netftRate must be between 0 and 7000")
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        engine.start()
+        warm = engine.submit(devices.connect, rate, block, axes, netftRate, netftAddress).result()
+        if not warm:
+            buffer.clear()
         
         
 
         #   Use only when HeidenHain eib741 is connected
         
 
-        fields = ["Date", "Heidenhain Ax", "Heidenhain Ay", "Heidenhain Az", "Load Cell Fx", "Load Cell Fy", "Load Cell Fz", "Load Cell Tx", "Load Cell Ty", "Load Cell Tz"]
+        fields = FIELDS
         filename = "netbox-data-" + datetime.datetime.now().strftime("%d-%m-%Y-%H-%M") + ".csv"
         session['filename'] = filename
         if not os.path.exists(pathlib.Path().absolute().joinpath('data').joinpath(filename)):
@@ -103,7 +175,9 @@ def connect():
                 csv_writer = csv.DictWriter(csv_file, fieldnames=fields)
                 csv_writer.writeheader()
                 csv_file.close()
-        return jsonify({"message": "Connection sucessful", "filename": filename}), 200
+        return jsonify({"message": "Connection sucessful", "filename": filename, "warm": warm,
+                        "clipx": devices.reader.stats(), "axes": devices.axes,
+                        "netft": devices.netft.stats() if devices.netft is not None else None}), 200
     except Exception as e:
         print("[ SERVER ]: Error ocurred in route: '/api/connect'. Error message: ")
         print(e)
@@ -113,82 +187,490 @@ def connect():
 
 #   Function: readSamples
 #   Route: GET /api/readsamples/
-#   Description: Reads Samples from both sensors and sends 
-#   them to the client. It als writes samples if it is requested. 
+#   Description: Sends the latest samples of both sensors to the 
+#   client. It also starts or stops recording if it is requested. 
+#   `tare` holds the Heidenhain tare offsets of the session, subtracted from
+#   the positions sent here but not from the ones of /api/samples.
 @app.route('/api/readsamples', methods=['GET'])
 def readSamples():
     try:
-        
-        """sk = create_udp_socket()
-        send_request(('127.0.0.1', 49152), 0x0002, 1, sk)
-        fx, fy, fz, tx, ty, tz = read_data(sk)
-        sk.close()"""
-
-        global hbc
-        fx = 0
-        fy = 0
-        fz = 0
-        tx = 0
-        ty = 0
-        tz = 0
-        ax = 0
-        ay = 0
-        az = 0
-        aw = 0
-        while hbc.availableLines() > 0:
-                fx, fy, fz, tx, ty, tz = hbc.readNextBlock()
+        #   The acquisition engine reads the devices and records the rows.
+        #   Requests only switch the recording on and off and get the latest values.
+        if not devices.wanted:
+            raise ConnectionError("Devices are not connected")
+        if request.args.get('write') == "true":
+            recorder.start(session['filename'], (session["tarex"], session["tarey"], session["tarez"]),
+                           calibration.identity(engine.activeCalibrations()))
+        elif recorder.filename == session.get('filename'):
+            recorder.stop()
+        latest = engine.latest
+        hbcGap = latest["hbcGap"]
+        heidenGap = latest["heidenGap"]
+        return jsonify({
+            "fz": None if hbcGap else finite(latest["fy"]), 
+            "ax": None if heidenGap else finite(latest["ax"] - session["tarex"]),
+            "ay": None if heidenGap else finite(latest["ay"] - session["tarey"]),
+            "az": None if heidenGap else finite(latest["az"] - session["tarez"]),
+            "nfz": None if latest["netftGap"] else finite(latest["nfz"]),
+            "gap": hbcGap or heidenGap,
+            "seq": latest["seq"],
+            "quality": latest["quality"],
+            "flags": quality.names(latest["quality"]),
+            "tare": {"ax": session["tarex"], "ay": session["tarey"], "az": session["tarez"]}}), 200
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/readSamples. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
 
+#   Function: samples
+#   Route: GET /api/samples/
+#   Description: Every sample acquired after the sequence number `since`, as
+#   a columnar batch, plus the cursor for the next call (`next`). Clients
+#   catch up without losing samples as long as they call again before the
+#   in-memory buffer wraps around (`missed` counts the samples lost).
+#   With `wait`, the request is held until there is at least one new sample.
+#   A cursor past the newest sequence number (e.g. kept by a client across a
+#   restart of the server, which numbers the samples from 0 again) is reset:
+#   the samples are returned from the oldest one, with `reset` true.
+#   Params: since (default -1, the oldest sample), max (default 10000),
+#   channels (comma separated, default all), wait (seconds, max 30),
+#   format (json, or binary: little-endian columns seq int64, time float64,
+#   one float64 column per channel and quality uint16, described by the
+#   X-Columns header)
+@app.route('/api/samples', methods=['GET'])
+def samples():
+    try:
+        since = int(request.args.get('since', -1))
+        limit = int(request.args.get('max', 10000))
+        wait = float(request.args.get('wait', 0))
+        output = request.args.get('format', 'json')
+        channels = request.args.get('channels')
+        channels = channels.split(',') if channels else list(CHANNELS)
+        columns = [channelIndex(channel) for channel in channels]
+        if not 0 < limit <= 100000 or not 0 <= wait <= 30:
+            raise ValueError("max must be between 1 and 100000 and wait between 0 and 30")
+        if output not in ("json", "binary"):
+            raise ValueError("format must be 'json' or 'binary'")
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        #   The engine numbers a row before it reaches the buffer, so a valid cursor is never past it.
+        reset = since > engine.seq - 1
+        if reset:
+            since = -1
+        if wait > 0:
+            buffer.wait(since, wait)
+        seqs, times, values, flags, missed = buffer.since(since, limit)
+        cursor = int(seqs[-1]) if len(seqs) else max(since, -1)
+        if output == "binary":
+            parts = [seqs.astype('<i8'), times.astype('<f8')] + \
+                [np.ascontiguousarray(values[:, column]).astype('<f8') for column in columns] + [flags.astype('<u2')]
+            names = ["seq:<i8", "time:<f8"] + [f"{channel}:<f8" for channel in channels] + ["quality:<u2"]
+            return Response(b''.join(part.tobytes() for part in parts), mimetype='application/octet-stream',
+                            headers={"X-Rows": str(len(seqs)), "X-Next": str(cursor), "X-Missed": str(missed),
+                                     "X-Reset": "true" if reset else "false",
+                                     "X-Columns": ",".join(names)})
+        toList = lambda a: np.where(np.isnan(a), None, a).tolist()
+        return jsonify({
+            "next": cursor,
+            "missed": missed,
+            "reset": reset,
+            "rows": len(seqs),
+            "columns": dict({"seq": seqs.tolist(), "time": times.tolist(), "quality": flags.tolist()},
+                            **{channel: toList(values[:, column]) for channel, column in zip(channels, columns)})}), 200
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/samples. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
 
-        #   Use only when HeidenHain eib741 is connected
-        if heidenCon:
-            global heiden
-            status, ax, ay, az, aw = heiden.readData()
-            if request.args.get('write') == "true":
-                filename = session['filename']
-                fields =  ["Date", "Heidenhain Ax", "Heidenhain Ay", "Heidenhain Az", "Load Cell Fx", "Load Cell Fy", "Load Cell Fz", "Load Cell Tx", "Load Cell Ty", "Load Cell Tz"]
-                with open(f'./data/{filename}', 'a', newline='') as csv_file:
-                    dialect = csv.excel
-                    dialect.delimiter = ";"
-                    csv_writer = csv.DictWriter(csv_file, fieldnames=fields, dialect=dialect)
-                    info = {
-                        'Date': datetime.datetime.now().strftime("%d-%m-%Y-%H:%M:%S"),
-                        'Heidenhain Ax': ax/2000000 - session["tarex"],
-                        'Heidenhain Ay': ay/2000000 - session["tarey"],
-                        'Heidenhain Az': az/2000000 - session["tarez"],
-                        'Load Cell Fx': fz/1000,
-                        'Load Cell Fy': fy/1000,
-                        'Load Cell Fz': fz/1000,
-                        'Load Cell Tx': tx/1000,
-                        'Load Cell Ty': ty/1000,
-                        'Load Cell Tz': tz/1000,
-                    }
-                    csv_writer.writerow(info)
-                    csv_file.close()
+#   Function: replay
+#   Route: GET /api/replay/
+#   Description: Replaces the devices with the replay of a recording of ./data.
+#   The real devices are used again after /api/disconnect.
+#   Params: file, speed (1 real time, N N times faster, 0 as fast as possible), loop
+@app.route('/api/replay', methods=['GET'])
+def replay():
+    try:
+        filename = os.path.basename(request.args.get('file', ''))
+        path = pathlib.Path().absolute().joinpath('data').joinpath(filename)
+        if not filename or not os.path.isfile(path):
+            return jsonify({"message": f"Recording '{filename}' not found"}), 404
+        speed = float(request.args.get('speed', 1))
+        if speed < 0:
+            return jsonify({"message": "speed must be 0 or greater"}), 400
+        engine.start()
+        engine.submit(devices.replay, ReplaySession(str(path), speed, request.args.get('loop') == "true")).result()
+        buffer.clear()
+        return jsonify({"message": "Replay started", "filename": filename, "speed": speed}), 200
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/replay. Error message: ")
+        print(e)
+        return jsonify({"message": "Failed to start replay"}), 500
+
+#   Function: burst
+#   Route: GET /api/burst/
+#   Description: Captures a burst of Heidenhain positions with a recording
+#   mode of the eib741 (recorded on the device at the trigger rate and then
+#   transferred) and stores it as a columnar session in ./data.
+#   Live positions are a gap during the capture. The capture runs on the
+#   request thread so the ClipX is still read meanwhile; every EIB741 call
+#   (reads, /api/disconnect, reconnects) waits for it on the device lock.
+#   Params: mode (single, roll), period (trigger period in microseconds), seconds (maximum duration)
+@app.route('/api/burst', methods=['GET'])
+def burst():
+    try:
+        modes = {"single": 3, "roll": 4}
+        mode = request.args.get('mode', 'single')
+        if mode not in modes:
+            raise ValueError("mode must be 'single' or 'roll'")
+        period = int(request.args.get('period', 20))
+        seconds = float(request.args.get('seconds', 1))
+        if period < 1 or seconds <= 0:
+            raise ValueError("period and seconds must be positive")
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        start = time.time()
+        heiden = engine.calibrations["heiden"]
+        columns = devices.burst(modes[mode], period, seconds, heiden)
+        filename = "burst-" + datetime.datetime.fromtimestamp(start).strftime("%d-%m-%Y-%H-%M-%S") + columnar.SUFFIX
+        columnar.writeSession(f'./data/{filename}', columns, {"mode": mode, "period": period, "start": start,
+                                                              "calibration": f"heiden:{heiden.identity}"})
+        return jsonify({"message": "Burst captured", "filename": filename, "samples": len(columns["time"]),
+                        "rate": 1e6 / period}), 200
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/burst. Error message: ")
+        print(e)
+        return jsonify({"message": "Burst capture failed"}), 500
+
+#   Function: realtime
+#   Route: GET /api/realtime/
+#   Description: Switches the Heidenhain eib741 between streaming and the
+#   soft real-time mode (polled at a fixed period by a dedicated thread, for
+#   closed-loop use) and reports the latency and jitter of the loop.
+#   Params: action (start, stop, stats), period (microseconds, start only)
+@app.route('/api/realtime', methods=['GET'])
+def realtime():
+    try:
+        action = request.args.get('action', 'stats')
+        if action not in ("start", "stop", "stats"):
+            raise ValueError("action must be 'start', 'stop' or 'stats'")
+        period = int(request.args.get('period', 1000))
+        if period < 1:
+            raise ValueError("period must be positive")
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        if action == "start":
+            stats = engine.submit(devices.startRealtime, period).result().stats()
+        elif action == "stop":
+            stats = engine.submit(devices.stopRealtime).result()
+        else:
+            stats = devices.realtime.stats() if devices.realtime is not None else None
+        return jsonify({"message": f"Soft real-time {action}", "stats": stats}), 200
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/realtime. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
+
+#   Function: sessions
+#   Route: GET /api/sessions/
+#   Description: Lists the recorded sessions from the catalog, without
+#   opening the recordings.
+#   Params: sort (any column, default start_time), order (asc, desc), limit, offset
+#   and filters <column>_<op>=<value>, op being gt, ge, lt, le or eq.
+#   Example: /api/sessions?fz_max_gt=500&start_time_ge=1700000000&sort=fz_max
+@app.route('/api/sessions', methods=['GET'])
+def sessions():
+    try:
+        filters = []
+        for key, value in request.args.items():
+            if key in ("sort", "order", "limit", "offset"):
+                continue
+            column, _, operator = key.rpartition('_')
+            filters.append((column, operator, value if column in ("filename", "calibration") else float(value)))
+        rows = catalog.search(filters, request.args.get('sort', 'start_time'), request.args.get('order', 'desc'),
+                              int(request.args.get('limit', 100)), int(request.args.get('offset', 0)))
+        return jsonify({"sessions": rows}), 200
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/sessions. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
+
+#   Function: overview
+#   Route: GET /api/overview/
+#   Description: Min, max and mean of a recording between `start` and `end`
+#   (seconds since the epoch) at the coarsest pyramid level that still gives
+#   one bucket per pixel of `width`. Level 0 means raw rows.
+#   Params: file, start, end, width, channels (comma separated, default all)
+@app.route('/api/overview', methods=['GET'])
+def overview():
+    try:
+        filename = os.path.basename(request.args.get('file', ''))
+        path = pathlib.Path().absolute().joinpath('data').joinpath(filename)
+        if not filename or not pyramid.hasLevel(str(path), pyramid.LEVELS[0]):
+            return jsonify({"message": f"No pyramid found for recording '{filename}'"}), 404
+        start = request.args.get('start')
+        end = request.args.get('end')
+        width = int(request.args.get('width', 1000))
+        channels = request.args.get('channels')
+        channels = channels.split(',') if channels else list(CHANNELS)
+        columns = [channelIndex(channel) for channel in channels]
+        level, times, mins, maxs, means = pyramid.query(
+            str(path), float(start) if start else None, float(end) if end else None, width)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        toList = lambda a: np.where(np.isnan(a), None, a).tolist()
         return jsonify({
-            "fz": fy/1000, 
-            "ax": ax/2000000 - session["tarex"],
-            "ay": ay/2000000 - session["tarey"],
-            "az": az/2000000 - session["tarez"]}), 200
+            "file": filename,
+            "level": level,
+            "times": times.tolist(),
+            "channels": {channel: {"min": toList(mins[:, column]), "max": toList(maxs[:, column]), "mean": toList(means[:, column])}
+                         for channel, column in zip(channels, columns)}}), 200
     except Exception as e:
-        print("[ SERVER ]: Error ocurred in route: /api/readSamples. Error message: ")
+        print("[ SERVER ]: Error ocurred in route: /api/overview. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
+
+#   Function: exportRecording
+#   Route: GET /api/export/
+#   Description: Streams a recording of ./data (a .csv file or a .columns
+#   session) as a chunked download. Rows are read and sent chunk by chunk, so
+#   the memory used does not depend on the size of the recording.
+#   Params: file, format (csv, ndjson, binary; default csv), channels (comma
+#   separated, default all), start, end (seconds since the epoch) and every
+#   (keep one row out of `every`, default 1). The binary format is a sequence
+#   of little-endian records described by the X-Columns header (name:dtype).
+@app.route('/api/export', methods=['GET'])
+def exportRecording():
+    try:
+        filename = os.path.basename(request.args.get('file', ''))
+        path = pathlib.Path().absolute().joinpath('data').joinpath(filename)
+        if not filename or not (filename.endswith('.csv') and path.is_file()
+                                or filename.endswith(columnar.SUFFIX) and path.is_dir()):
+            return jsonify({"message": f"No recording found with name '{filename}'"}), 404
+        output = request.args.get('format', 'csv')
+        channels = request.args.get('channels')
+        channels = channels.split(',') if channels else list(CHANNELS)
+        for channel in channels:
+            channelIndex(channel)
+        start = request.args.get('start')
+        end = request.args.get('end')
+        names, chunks = export.stream(str(path), output, channels, float(start) if start else None,
+                                      float(end) if end else None, int(request.args.get('every', 1)))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/export. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
+    extension = {"csv": "csv", "ndjson": "ndjson", "binary": "bin"}[output]
+    headers = {"Content-Disposition": f"attachment; filename={filename.rsplit('.', 1)[0]}.{extension}"}
+    if output == "binary":
+        headers["X-Columns"] = ",".join(f"{name}:{dtype}" for name, dtype in names)
+    return Response(stream_with_context(chunks), mimetype=export.MIMETYPES[output], headers=headers)
+
+#   Function: spectrum
+#   Route: GET /api/spectrum/
+#   Description: Welch power spectral density of one channel over the
+#   last `seconds` seconds of the in-memory buffer.
+#   Params: channel (ax, ay, az, fx, fy, fz, tx, ty, tz), seconds, nperseg, noverlap
+@app.route('/api/spectrum', methods=['GET'])
+def spectrum():
+    try:
+        channel = request.args.get('channel', 'fz')
+        seconds = float(request.args.get('seconds', 10))
+        nperseg = int(request.args.get('nperseg', 256))
+        noverlap = request.args.get('noverlap')
+        noverlap = int(noverlap) if noverlap is not None else None
+        column = channelIndex(channel)
+        start, times, values, generation = buffer.last(seconds)
+        freqs, psd, fs, segments = welch.psd(start, times, values[:, column], generation, channel, nperseg, noverlap)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        peak = int(psd[1:].argmax()) + 1 if len(psd) > 1 else 0
+        return jsonify({
+            "channel": channel,
+            "fs": fs,
+            "segments": segments,
+            "frequencies": freqs.tolist(),
+            "psd": psd.tolist(),
+            "peak": {"frequency": float(freqs[peak]), "psd": float(psd[peak])}}), 200
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/spectrum. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
+
+#   Function: pipeline
+#   Route: GET /api/pipeline/
+#   Description: Counters of the acquisition pipeline: the queues between the
+#   acquisition and its consumers (rows queued, dropped and decimated, Net F/T
+#   samples queued for the recording), the ClipX reader and the Net F/T stream.
+@app.route('/api/pipeline', methods=['GET'])
+def pipeline():
+    try:
+        return jsonify({
+            "recorder": recorder.queue.stats(),
+            "recorderNetFT": recorder.netftQueue.stats(),
+            "subscribers": [queue.stats() for queue in engine.subscribers.values()],
+            "clipx": devices.reader.stats(),
+            "netft": devices.netft.stats() if devices.netft is not None else None,
+            "limits": limits.stats()}), 200
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/pipeline. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
+
+#   Function: setLimits
+#   Route: GET /api/limits/
+#   Description: Sets the limits of one channel (the other channels keep
+#   theirs) and returns every limit, the active alarms and the alarm
+#   statistics. Without a channel only returns them.
+#   Params: channel, high, low, rate (units per second), hysteresis (band of
+#   high and low), rateHysteresis, clear (true removes the limits of the channel)
+@app.route('/api/limits', methods=['GET'])
+def setLimits():
+    try:
+        channel = request.args.get('channel')
+        if channel:
+            channelIndex(channel)
+            current = dict(limits.limits)
+            if request.args.get('clear') == "true":
+                current.pop(channel, None)
+            else:
+                keys = KINDS + ("hysteresis", "rateHysteresis")
+                current[channel] = {key: float(request.args[key]) for key in keys if request.args.get(key)}
+            limits.configure(current)
+        return jsonify(limits.stats()), 200
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/limits. Error message: ")
+        print(e)
+        return jsonify({"message": "Internal Server Error"}), 500
+
+#   Function: alarms
+#   Route: GET /api/alarms/
+#   Description: Pushes the alarms raised and cleared by the limit monitor as
+#   server-sent events, one `alarm` event per alarm, as soon as the
+#   acquisition detects them. A comment is sent every 15 s to keep the
+#   connection open. 503 if `MAX_STREAMS` streams are already open.
+@app.route('/api/alarms', methods=['GET'])
+def alarms():
+    slots = streamSlots
+    if not slots.acquire(blocking=False):
+        return jsonify({"message": f"Too many open streams (max {MAX_STREAMS})"}), 503
+    name = f"alarms-{request.remote_addr}-{time.monotonic_ns()}"
+    queue = limits.subscribe(name)
+
+    def events():
+        yield ": connected\n\n"
+        while True:
+            pending = queue.get(timeout=15)
+            queue.done()
+            if queue.closed:
+                return
+            if not pending:
+                yield ": keep-alive\n\n"
+            for alarm in pending:
+                yield f"event: alarm\ndata: {json.dumps(alarm)}\n\n"
+
+    def close():
+        limits.unsubscribe(name)
+        slots.release()
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(close)
+    return response
+
+#   Function: live
+#   Route: GET /api/live/
+#   Description: Pushes every acquired row as server-sent events, one `rows`
+#   event per batch: {"rows": [[time, ax, ..., ntz, seq, quality], ...],
+#   "quality": {"missing", "flags", "flagged"}}. Missing values are null.
+#   A client that falls behind gets every n-th row (the `decimate` policy of
+#   `AcquisitionEngine.subscribe()`), counted in `missing`. A comment is sent
+#   every 15 s to keep the connection open. 503 if `MAX_STREAMS` streams are
+#   already open.
+@app.route('/api/live', methods=['GET'])
+def live():
+    slots = streamSlots
+    if not slots.acquire(blocking=False):
+        return jsonify({"message": f"Too many open streams (max {MAX_STREAMS})"}), 503
+    name = f"live-{request.remote_addr}-{time.monotonic_ns()}"
+    queue = engine.subscribe(name)
+
+    def events():
+        yield ": connected\n\n"
+        while True:
+            rows = queue.get(timeout=15)
+            queue.done()
+            if queue.closed:
+                return
+            if len(rows) == 0:
+                yield ": keep-alive\n\n"
+                continue
+            data = {"rows": [[finite(value) for value in row] for row in batch.rows(rows)],
+                    "quality": quality.summary(rows["seq"], rows["flags"])}
+            yield f"event: rows\ndata: {json.dumps(data)}\n\n"
+
+    def close():
+        engine.unsubscribe(name)
+        slots.release()
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(close)
+    return response
+
+#   Function: profile
+#   Route: GET /api/profile/
+#   Description: Admin route, only served to localhost. Samples the stacks of
+#   every thread of the server (request handlers, acquisition, devices) for
+#   `seconds` seconds and returns them as text. Nothing runs when no profile
+#   is requested.
+#   Params: seconds (default 5, max 120), interval (ms, default 5),
+#   format (collapsed for flamegraph.pl / speedscope, top for a pstats-like table)
+@app.route('/api/profile', methods=['GET'])
+def profile():
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"message": "Forbidden"}), 403
+    try:
+        seconds = float(request.args.get('seconds', 5))
+        interval = float(request.args.get('interval', 5))
+        output = request.args.get('format', 'collapsed')
+        if not 0 < seconds <= 120 or interval < 1:
+            raise ValueError("seconds must be between 0 and 120 and interval 1 ms or more")
+        if output not in ("collapsed", "top"):
+            raise ValueError("format must be 'collapsed' or 'top'")
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    try:
+        profiler.run(seconds, interval / 1000)
+        text = profiler.collapsed() if output == "collapsed" else profiler.top()
+        return Response(text, mimetype='text/plain')
+    except RuntimeError as e:
+        return jsonify({"message": str(e)}), 409
+    except Exception as e:
+        print("[ SERVER ]: Error ocurred in route: /api/profile. Error message: ")
         print(e)
         return jsonify({"message": "Internal Server Error"}), 500
 
 #   Function: disconnect
 #   Route: GET /api/disconnect/
-#   Description: Closes all open conncections (NetBox and eib741)
+#   Description: Closes all open conncections (NetBox, Net F/T and eib741)
 @app.route('/api/disconnect', methods=['GET'])
 def disconnect():
     try:
         #   Use only when HeidenHain eib741 is connected
-        global hbc
-        hbc.stopMeasurements()
-        global heiden
-        heiden.safeExit()
+        recorder.stop()
+        engine.submit(devices.disconnect).result()
         #fakeHeiden = FakeHeinden('path/to/dll')
-        """sk = create_udp_socket()
-        send_request(('127.0.0.1', 49152), 0x0000, 0, sk)
-        sk.close()"""
         #fakeHeiden.fakeExit()
         return jsonify({"message": "Disconnected"}), 200
     except Exception as e:
@@ -199,4 +681,6 @@ def disconnect():
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=4000)
+    #   Development server. The reloader is disabled because it would start a
+    #   second process owning the devices. Use serve.py in production.
+    app.run(debug=True, port=4000, use_reloader=False)
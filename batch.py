@@ -0,0 +1,52 @@
+#   BATCHES OF ACQUIRED ROWS
+#
+#   The acquisition hands its rows to the consumers (sample buffer, recorder,
+#   limit monitor, live subscribers) as one numpy structured array per read,
+#   with the fixed schema `DTYPE`. A batch is filled in place from the device
+#   buffers and the calibration product, and the same array is passed by
+#   reference to every consumer, which must not modify it. Compared to one
+#   tuple of Python floats per row, a row costs `DTYPE.itemsize` bytes and no
+#   allocation per value, and every consumer works on whole columns.
+#
+#   Schema:
+#       time      float64   host timestamp, seconds since the epoch
+#       seq       int64     sequence number (see `quality.py`)
+#       values    float64[len(CHANNELS)]   ax, ay, az (mm), fx, fy, fz (N), tx, ty, tz (Nm),
+#                 nfx, nfy, nfz (N), ntx, nty, ntz (Nm)
+#       status    uint16    EIB741 status word of the positions
+#       flags     uint16    quality bitfield (see `quality.py`)
+
+import numpy as np
+from samplebuffer import CHANNELS
+
+
+DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("seq", "<i8"),
+    ("values", "<f8", (len(CHANNELS),)),
+    ("status", "<u2"),
+    ("flags", "<u2"),
+])
+
+
+def empty(n):
+    """Returns a batch of `n` rows. Every field must be filled by the caller.
+    """
+    return np.empty(n, dtype=DTYPE)
+
+
+def concatenate(batches):
+    """Joins batches into a single one, without copying a lone batch.
+    """
+    if len(batches) == 1:
+        return batches[0]
+    return np.concatenate(batches) if batches else empty(0)
+
+
+def rows(batch):
+    """Returns the rows of a batch as (timestamp, ax, ay, az, fx, fy, fz, tx,
+    ty, tz, nfx, nfy, nfz, ntx, nty, ntz, seq, flags) tuples, for callers
+    that need Python values.
+    """
+    return [(time, *values, seq, flags) for time, values, seq, flags in
+            zip(batch["time"].tolist(), batch["values"].tolist(), batch["seq"].tolist(), batch["flags"].tolist())]
@@ -0,0 +1,146 @@
+#   BENCHMARK OF THE ACQUISITION HOT PATH
+#
+#   Measures the CPU time and the memory allocated per sample from a raw
+#   ClipX read to the consumers (sample buffer, recorder queue and writer,
+#   a live subscriber), with the rows as one tuple of Python floats per row
+#   (before) and as `batch.py` structured arrays (after). The devices are
+#   not used: the raw lines are random and the recording goes to a
+#   temporary directory.
+#
+#   Usage: python benchmark.py [batch sizes] [samples]
+#   Example: python benchmark.py 1,10,32,100,1000 20000
+#
+#   Results
+#   -------
+#   Single core Linux VM, Python 3.11, numpy 2.4, 20000 samples, 15 channels:
+#
+#       rows/batch    CPU us/sample         peak bytes/sample     queued bytes/row
+#                     before    after       before    after       before    after
+#               1      209.2    263.2       134672     5876          616      140
+#              10       36.4     42.6        14053     1192          616      140
+#              32       27.8     18.0         4922     1048          616      140
+#             100       19.0     10.0         2074     1071          616      140
+#            1000       17.4      8.2          868     1110          616      140
+#
+#   The adaptive ClipX reader aims at 32 lines per read. With a single row
+#   per read the fixed cost of the numpy calls is not amortized, but that only
+#   happens at low rates. Most of the peak of the tuple rows is the record
+#   buffer csv.writer allocates on its first row, once per recorder write.
+
+import csv, datetime, io, shutil, sys, tempfile, time, tracemalloc
+import numpy as np
+import batch, calibration
+from pipeline import BoundedQueue
+from recorder import Recorder, DATE_FORMAT
+from samplebuffer import SampleBuffer
+
+
+def tupleRows(times, raw, seq, scale):
+    """The rows of a read as they were built before: one tuple per line
+    from the reader, then one tuple per row with the scaled values.
+    """
+    lines = [(t,) + tuple(line) for t, line in zip(times.tolist(), raw.tolist())]
+    ax, ay, az = 1e-3, 2e-3, 3e-3
+    netft = (float('nan'),) * 6
+    return [(timestamp, ax, ay, az, fx*scale, fy*scale, fz*scale, tx*scale, ty*scale, tz*scale, *netft, seq + i, 0)
+            for i, (timestamp, fx, fy, fz, tx, ty, tz) in enumerate(lines)]
+
+
+def writeTuples(recorder, rows):
+    """The recorder write of tuple rows as it was before: csv.writer and one
+    date per row.
+    """
+    text = io.StringIO()
+    writer = csv.writer(text, delimiter=';')
+    offsets = []
+    for row in rows:
+        offsets.append(recorder.position + text.tell())
+        writer.writerow([datetime.datetime.fromtimestamp(row[0]).strftime(DATE_FORMAT), *row[1:]])
+    text = text.getvalue()
+    recorder.file.write(text)
+    recorder.file.flush()
+    recorder.position += len(text)
+    rows = np.array(rows)
+    recorder.pyramid.add(rows[:, 0], rows[:, 1:16], np.array(offsets))
+    recorder.stats.add(rows[:, 0], rows[:, 1:16])
+
+
+def before(times, raw, seq, buffer, recorder, queue, clipx):
+    rows = tupleRows(times, raw, seq, 1 / 1000)
+    for row in rows:
+        buffer.append(row[0], row[1:16], row[16], row[17])
+    queue.put(rows)
+    writeTuples(recorder, [row for row in queue.get()])
+    return len(rows)
+
+
+def after(times, raw, seq, buffer, recorder, queue, clipx):
+    rows = batch.empty(len(times))
+    rows["time"] = times
+    rows["seq"] = np.arange(seq, seq + len(times))
+    rows["values"][:, :3] = (1e-3, 2e-3, 3e-3)
+    rows["values"][:, 9:] = np.nan
+    rows["status"] = 0
+    rows["flags"] = 0
+    clipx.apply(raw, out=rows["values"][:, 3:9])
+    buffer.extend(rows)
+    queue.put(rows)
+    recorder.write(queue.get())
+    return len(rows)
+
+
+def run(path, size, samples, directory):
+    """Runs `samples` samples through `path` in batches of `size` rows.
+
+    Returns
+    -------
+    tuple
+        CPU microseconds per sample and median peak of allocated bytes per sample.
+    """
+    filename = f"{path.__name__}-{size}.csv"
+    open(f"{directory}/{filename}", 'w').close()
+    recorder = Recorder(directory)
+    recorder.start(filename, (0, 0, 0))
+    buffer = SampleBuffer()
+    queue = BoundedQueue("benchmark", 10 ** 6)
+    clipx = calibration.defaults()["clipx"]
+    rng = np.random.default_rng(0)
+    reads = [(1.7e9 + (i + np.arange(size)) / 1000, rng.normal(size=(size, 6)) * 1000)
+             for i in range(0, samples, size)]
+    peaks = []
+    seq = 0
+    cpu = time.process_time()
+    for times, raw in reads:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        seq += path(times, raw, seq, buffer, recorder, queue, clipx)
+        peaks.append((tracemalloc.get_traced_memory()[1] - start) / size)
+        queue.done()
+    cpu = time.process_time() - cpu
+    recorder.stop()
+    return cpu / seq * 1e6, float(np.median(peaks))
+
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "1,10,32,100,1000").split(',')]
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    directory = tempfile.mkdtemp()
+    #   Memory of one queued row: a tuple of 18 Python numbers, or one structured row.
+    queued = sys.getsizeof(tuple(range(18))) + 18 * sys.getsizeof(1.0), batch.DTYPE.itemsize
+    print("rows/batch    CPU us/sample         peak bytes/sample     queued bytes/row")
+    print("              before    after       before    after       before    after")
+    try:
+        tracemalloc.start()
+        for size in sizes:
+            #   tracemalloc slows both paths down: the CPU time is the best of three runs without it.
+            _, beforePeak = run(before, size, samples, directory)
+            _, afterPeak = run(after, size, samples, directory)
+            tracemalloc.stop()
+            beforeCpu = min(run(before, size, samples, directory)[0] for _ in range(3))
+            afterCpu = min(run(after, size, samples, directory)[0] for _ in range(3))
+            tracemalloc.start()
+            print(f"{size:10d}    {beforeCpu:7.1f}  {afterCpu:7.1f}      {beforePeak:7.0f}  {afterPeak:7.0f}      "
+                  f"{queued[0]:6d}  {queued[1]:6d}")
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(directory)
@@ -0,0 +1,132 @@
+#   CALIBRATION OF THE SENSORS
+#
+#   Converts the raw values of a sensor into physical units with a full
+#   calibration matrix and an offset: values = (raw - offset) @ matrix.T.
+#   A multi-axis load cell needs the full 6x6 decoupling matrix, since every
+#   force and torque depends on every bridge. The matrices are read from
+#   calibration.json, one entry per sensor:
+#
+#       {"clipx": {"id": "...", "matrix": [[...] * 6] * 6, "offset": [...] * 6}, ...}
+#
+#   Sensors missing from the file use `DEFAULTS`, the plain unit conversion
+#   used before: raw/1000 for forces and torques, raw/2000000 for positions,
+#   and for the Net F/T its factory counts per force and torque (1000000).
+#   Every calibration has an identity (its id and a hash of its matrix and
+#   offset) recorded in the session catalog, so a recording can always be
+#   traced back to the calibration it was converted with.
+
+import hashlib, json, os
+import numpy as np
+from samplebuffer import NETFT_CHANNELS
+
+
+#   Channels converted by every sensor, in column order.
+SENSORS = {
+    "clipx": ("fx", "fy", "fz", "tx", "ty", "tz"),
+    "heiden": ("ax", "ay", "az"),
+    "netft": NETFT_CHANNELS,
+}
+
+DEFAULTS = {
+    "clipx": {"id": "clipx-default", "matrix": np.diag([1 / 1000] * 6).tolist(), "offset": [0] * 6},
+    "heiden": {"id": "heiden-default", "matrix": np.diag([1 / 2000000] * 3).tolist(), "offset": [0] * 3},
+    "netft": {"id": "netft-default", "matrix": np.diag([1 / 1000000] * 6).tolist(), "offset": [0] * 6},
+}
+
+
+class Calibration():
+    """
+    The calibration of one sensor.
+
+    ...
+
+    Attributes
+    ----------
+    sensor: str
+        name of the sensor, from `SENSORS`.
+    id: str
+        name given to the calibration in the configuration.
+    matrix: numpy.ndarray[n, n]
+        calibration matrix, applied to the raw values minus the offset.
+    offset: numpy.ndarray[n]
+        raw value of every channel at zero load.
+    identity: str
+        id and hash of the matrix and offset, e.g. 'clipx-default@3f2a9c1b'.
+    """
+
+    def __init__(self, sensor, id, matrix, offset=None):
+        n = len(SENSORS[sensor])
+        self.sensor = sensor
+        self.id = id
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.offset = np.zeros(n) if offset is None else np.asarray(offset, dtype=np.float64)
+        if self.matrix.shape != (n, n) or self.offset.shape != (n,):
+            raise ValueError(f"The calibration of '{sensor}' needs a {n}x{n} matrix and {n} offsets")
+        #   Transposed once so a batch is converted with a single (rows, n) @ (n, n) product.
+        self.transposed = np.ascontiguousarray(self.matrix.T)
+        digest = hashlib.sha1(self.matrix.tobytes() + self.offset.tobytes()).hexdigest()[:8]
+        self.identity = f"{id}@{digest}"
+
+    def apply(self, raw, out=None):
+        """Converts a batch of raw values.
+
+        Params
+        ------
+        raw: numpy.ndarray[rows, n]
+            raw values, one column per channel of the sensor.
+        out: numpy.ndarray[rows, n]
+            optional array the values are written to, e.g. the columns of a
+            `batch.DTYPE` batch.
+
+        Returns
+        -------
+        numpy.ndarray[rows, n]
+            values in physical units. A NaN raw value (e.g. an EIB741 axis
+            not in the data packet) only makes NaN the outputs whose matrix
+            row uses it: with a diagonal matrix, its own channel.
+        """
+        raw = np.asarray(raw, dtype=np.float64) - self.offset
+        missing = np.isnan(raw)
+        if not missing.any():
+            return np.matmul(raw, self.transposed, out=out)
+        #   NaN times a zero coefficient would still be NaN: the missing values are left out of the product.
+        values = np.matmul(np.where(missing, 0, raw), self.transposed, out=out)
+        values[np.matmul(missing, self.transposed != 0)] = np.nan
+        return values
+
+
+def load(path='./calibration.json'):
+    """Reads the calibrations of every sensor. A missing file or sensor
+    uses `DEFAULTS`.
+
+    Returns
+    -------
+    dict
+        sensor name -> Calibration.
+    """
+    config = {}
+    if os.path.isfile(path):
+        with open(path) as file:
+            config = json.load(file)
+    unknown = set(config) - set(SENSORS)
+    if unknown:
+        raise ValueError(f"Unknown sensors in {path}: {', '.join(sorted(unknown))}")
+    calibrations = {}
+    for sensor in SENSORS:
+        entry = config.get(sensor, DEFAULTS[sensor])
+        calibrations[sensor] = Calibration(sensor, entry.get("id", sensor), entry["matrix"], entry.get("offset"))
+    return calibrations
+
+
+def defaults():
+    """Returns the calibrations of `DEFAULTS`.
+    """
+    return {sensor: Calibration(sensor, entry["id"], entry["matrix"], entry["offset"])
+            for sensor, entry in DEFAULTS.items()}
+
+
+def identity(calibrations):
+    """Returns the identity of a set of calibrations, e.g.
+    'clipx:clipx-default@3f2a9c1b;heiden:heiden-default@0b1e44d2'.
+    """
+    return ";".join(f"{sensor}:{calibrations[sensor].identity}" for sensor in sorted(calibrations))
@@ -0,0 +1,215 @@
+#   SESSION CATALOG
+#
+#   A SQLite index of the recordings of `./data` (data/catalog.db) with the
+#   metadata of every session: start and end time, duration, number of rows,
+#   min/max/mean of every channel, the tare offsets and the calibrations used. The recorder updates it
+#   when a recording closes, so sessions can be listed and searched without
+#   opening the recording files.
+#
+#   Usage: python catalog.py [data directory]    (indexes the recordings missing from the catalog)
+
+import glob, os, sqlite3, sys
+from contextlib import contextmanager
+import numpy as np
+from csvimport import parseFile
+from samplebuffer import CHANNELS
+
+
+STATS = ("min", "max", "mean", "count")
+COLUMNS = ["filename", "start_time", "end_time", "duration", "samples", "tarex", "tarey", "tarez", "calibration"] + \
+    [f"{channel}_{stat}" for channel in CHANNELS for stat in STATS]
+OPERATORS = {"gt": ">", "ge": ">=", "lt": "<", "le": "<=", "eq": "="}
+
+
+class SessionStats():
+    """
+    Running statistics of a recording, updated with every batch of rows.
+
+    Attributes
+    ----------
+    start, end: float
+        first and last timestamp.
+    samples: int
+        number of rows.
+    min, max, sum, count: numpy.ndarray
+        per channel statistics. NaN values (gaps) are not counted.
+    """
+
+    def __init__(self):
+        n = len(CHANNELS)
+        self.start = None
+        self.end = None
+        self.samples = 0
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.sum = np.zeros(n)
+        self.count = np.zeros(n, dtype=np.int64)
+
+    def add(self, times, values):
+        if len(times) == 0:
+            return
+        if self.start is None:
+            self.start = float(times[0])
+        self.end = float(times[-1])
+        self.samples += len(times)
+        self.min = np.fmin(self.min, np.fmin.reduce(values, axis=0))
+        self.max = np.fmax(self.max, np.fmax.reduce(values, axis=0))
+        self.sum += np.nansum(values, axis=0)
+        self.count += np.sum(~np.isnan(values), axis=0)
+
+
+class Catalog():
+    """
+    The SQLite catalog of the sessions. A new connection is opened for every
+    operation, so a Catalog can be shared between threads.
+    """
+
+    def __init__(self, path='./data/catalog.db'):
+        self.path = path
+
+    @contextmanager
+    def connect(self):
+        """Opens a connection, commits on success and always closes it.
+        """
+        connection = sqlite3.connect(self.path)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def create(self):
+        """Creates the sessions table if it does not exist, and adds the
+        columns missing from a catalog created by an older version.
+        """
+        types = lambda column: "INTEGER" if column == "samples" or column.endswith("_count") else \
+            "TEXT" if column == "calibration" else "REAL"
+        columns = ", ".join(["filename TEXT PRIMARY KEY"] + [f"{column} {types(column)}" for column in COLUMNS[1:]])
+        with self.connect() as connection:
+            connection.execute(f"CREATE TABLE IF NOT EXISTS sessions ({columns})")
+            existing = {row["name"] for row in connection.execute("PRAGMA table_info(sessions)")}
+            for column in COLUMNS:
+                if column not in existing:
+                    connection.execute(f"ALTER TABLE sessions ADD COLUMN {column} {types(column)}")
+            connection.execute("CREATE INDEX IF NOT EXISTS sessions_start ON sessions (start_time)")
+
+    def get(self, filename):
+        self.create()
+        with self.connect() as connection:
+            row = connection.execute("SELECT * FROM sessions WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def update(self, filename, stats, tare=(0, 0, 0), calibration=None):
+        """Adds the statistics of a closed recording to the catalog. If the
+        session is already there (a recording appended in several parts),
+        the statistics are merged.
+
+        Params
+        ------
+        filename: str
+            name of the recording inside `./data`.
+        stats: SessionStats
+            statistics of the rows written.
+        tare: tuple
+            (x, y, z) Heidenhain tare offsets used.
+        calibration: str
+            identity of the calibrations used (see `calibration.identity()`).
+            A session recorded with several calibrations keeps all of them,
+            separated by commas.
+        """
+        if stats.samples == 0:
+            return
+        old = self.get(filename)
+        row = {"filename": filename, "start_time": stats.start, "end_time": stats.end,
+               "samples": stats.samples, "tarex": tare[0], "tarey": tare[1], "tarez": tare[2],
+               "calibration": calibration}
+        for i, channel in enumerate(CHANNELS):
+            count = int(stats.count[i])
+            row[f"{channel}_count"] = count
+            row[f"{channel}_min"] = float(stats.min[i]) if count else None
+            row[f"{channel}_max"] = float(stats.max[i]) if count else None
+            row[f"{channel}_mean"] = float(stats.sum[i] / count) if count else None
+        if old is not None:
+            row["start_time"] = min(old["start_time"], row["start_time"])
+            row["end_time"] = max(old["end_time"], row["end_time"])
+            row["samples"] += int(old["samples"])
+            used = [identity for identity in (old["calibration"] or "").split(",") if identity]
+            if calibration and calibration not in used:
+                used.append(calibration)
+            row["calibration"] = ",".join(used) or None
+            for channel in CHANNELS:
+                oldCount = int(old[f"{channel}_count"] or 0)
+                count = row[f"{channel}_count"]
+                if oldCount == 0:
+                    continue
+                if count > 0:
+                    row[f"{channel}_min"] = min(old[f"{channel}_min"], row[f"{channel}_min"])
+                    row[f"{channel}_max"] = max(old[f"{channel}_max"], row[f"{channel}_max"])
+                    row[f"{channel}_mean"] = (old[f"{channel}_mean"] * oldCount + row[f"{channel}_mean"] * count) / (oldCount + count)
+                else:
+                    for stat in ("min", "max", "mean"):
+                        row[f"{channel}_{stat}"] = old[f"{channel}_{stat}"]
+                row[f"{channel}_count"] = oldCount + count
+        row["duration"] = row["end_time"] - row["start_time"]
+        with self.connect() as connection:
+            connection.execute(
+                f"INSERT OR REPLACE INTO sessions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [row[column] for column in COLUMNS])
+
+    def search(self, filters=None, sort="start_time", order="desc", limit=100, offset=0):
+        """Lists the sessions matching every filter.
+
+        Params
+        ------
+        filters: list
+            (column, operator, value) tuples, operator being one of `OPERATORS`.
+        sort: str
+            column used to sort the sessions.
+        order: str
+            'asc' or 'desc'.
+        limit, offset: int
+            page of results.
+
+        Returns
+        -------
+        list
+            one dict per session.
+        """
+        if sort not in COLUMNS:
+            raise ValueError(f"Unknown column '{sort}'")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be 'asc' or 'desc'")
+        where = []
+        params = []
+        for column, operator, value in filters or []:
+            if column not in COLUMNS or operator not in OPERATORS:
+                raise ValueError(f"Invalid filter '{column}_{operator}'")
+            where.append(f"{column} {OPERATORS[operator]} ?")
+            params.append(value)
+        query = "SELECT * FROM sessions"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {sort} {order} LIMIT ? OFFSET ?"
+        self.create()
+        with self.connect() as connection:
+            return [dict(row) for row in connection.execute(query, params + [int(limit), int(offset)])]
+
+
+def index(directory='./data'):
+    """Adds to the catalog every recording of `directory` that is not in it yet.
+    """
+    catalog = Catalog(os.path.join(directory, 'catalog.db'))
+    for path in sorted(glob.glob(os.path.join(directory, 'netbox-data-*.csv'))):
+        filename = os.path.basename(path)
+        if catalog.get(filename) is not None:
+            continue
+        columns = parseFile(path)
+        stats = SessionStats()
+        stats.add(columns["time"], np.column_stack([columns[channel] for channel in CHANNELS]))
+        catalog.update(filename, stats)
+        print(f"[SYSTEM]: {filename} indexed ({stats.samples} rows)")
+
+
+if __name__ == '__main__':
+    index(sys.argv[1] if len(sys.argv) > 1 else './data')
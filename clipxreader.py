@@ -0,0 +1,144 @@
+#   ADAPTIVE CLIPX READER
+#
+#   Reads the ClipX buffer in blocks and decides when the next read should
+#   happen. The block size and the polling interval follow the backlog seen
+#   by `availableLines()`: at high rates the buffer is polled more often and
+#   drained with large blocks so it never overflows, at low rates it is
+#   polled less often so no CPU is spent on empty reads.
+
+import time
+import numpy as np
+
+
+class ClipXReader():
+    """
+    Block reader of the ClipX with an adaptive block size and polling interval.
+
+    ...
+
+    Attributes
+    ----------
+    rate: float
+        measurement rate written to the ClipX, in lines per second.
+    blockSize: int
+        lines read per DLL call. With `adaptive` it follows the backlog.
+    adaptive: bool
+        whether the block size and the interval are adapted.
+    interval: float
+        seconds until the next read.
+    minInterval, maxInterval: float
+        limits of `interval`.
+    targetLines: int
+        backlog aimed at when the next read happens.
+    capacity: int
+        lines the ClipX buffer can hold. A backlog over half of it switches
+        to the fastest polling straight away.
+    maxBlock: int
+        limit of `blockSize`.
+    observedRate: float
+        lines per second measured between reads (moving average).
+    backlog: float
+        lines found per read (moving average).
+    overflows: int
+        reads that found the device buffer full (lines may have been lost).
+    """
+
+    def __init__(self, rate=10, blockSize=None, capacity=4096, targetLines=32,
+                 minInterval=0.005, maxInterval=0.5, maxBlock=1024):
+        self.capacity = capacity
+        self.targetLines = targetLines
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.maxBlock = maxBlock
+        self.configure(rate, blockSize)
+
+    def configure(self, rate=10, blockSize=None):
+        """Sets the rate and the block size of a session.
+
+        Params
+        ------
+        rate: float
+            measurement rate in lines per second.
+        blockSize: int
+            fixed block size, or None to adapt it to the backlog.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if blockSize is not None and not 1 <= blockSize <= self.maxBlock:
+            raise ValueError(f"block size must be between 1 and {self.maxBlock}")
+        self.rate = rate
+        self.adaptive = blockSize is None
+        self.blockSize = blockSize or 1
+        self.observedRate = rate
+        self.backlog = 0
+        self.interval = self.clamp(self.targetLines / rate)
+        self.lastRead = None
+        self.reads = 0
+        self.lines = 0
+        self.emptyReads = 0
+        self.maxBacklog = 0
+        self.overflows = 0
+
+    def clamp(self, interval):
+        return min(self.maxInterval, max(self.minInterval, interval))
+
+    def read(self, hbc):
+        """Reads every available line in blocks of `blockSize` lines and
+        adapts the block size and the interval to the backlog found.
+
+        Params
+        ------
+        hbc: PyHBCWraperr
+            the ClipX wrapper.
+
+        Returns
+        -------
+        numpy.ndarray
+            (n, 6) array of fx, fy, fz, tx, ty, tz in raw units.
+        """
+        now = time.monotonic()
+        available = hbc.availableLines()
+        blocks = []
+        remaining = available
+        while remaining > 0:
+            count = min(self.blockSize, remaining)
+            blocks.append(hbc.readBlock(count))
+            remaining -= count
+        self.update(now, available)
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.concatenate(blocks) if blocks else np.zeros((0, 6))
+
+    def update(self, now, available):
+        """Adapts the block size and the interval to a read of `available` lines.
+        """
+        self.reads += 1
+        self.lines += available
+        self.maxBacklog = max(self.maxBacklog, available)
+        if available == 0:
+            self.emptyReads += 1
+        if available >= self.capacity:
+            self.overflows += 1
+        if self.lastRead is not None and now > self.lastRead:
+            self.observedRate = 0.8 * self.observedRate + 0.2 * available / (now - self.lastRead)
+        self.lastRead = now
+        self.backlog = 0.8 * self.backlog + 0.2 * available
+        if not self.adaptive:
+            return
+        if available > self.capacity / 2:
+            #   Close to overflowing: poll as fast as possible and drain in large blocks.
+            self.interval = self.minInterval
+            self.blockSize = self.maxBlock
+            return
+        if available == 0:
+            #   Nothing to read: back off instead of spinning on empty reads.
+            self.interval = self.clamp(self.interval * 1.5)
+        else:
+            self.interval = self.clamp(self.targetLines / max(self.observedRate, 1e-6))
+        self.blockSize = int(min(self.maxBlock, 2 ** np.ceil(np.log2(max(self.backlog, available, 1)))))
+
+    def stats(self):
+        return {"rate": self.rate, "observedRate": self.observedRate, "adaptive": self.adaptive,
+                "blockSize": self.blockSize, "interval": self.interval, "backlog": self.backlog,
+                "maxBacklog": self.maxBacklog, "reads": self.reads, "emptyReads": self.emptyReads,
+                "lines": self.lines, "overflows": self.overflows}
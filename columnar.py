@@ -0,0 +1,85 @@
+#   COLUMNAR FORMAT OF THE RECORDINGS
+#
+#   A session is stored as a directory `netbox-data-X.columns` with one .npy
+#   file per column and a meta.json file. Every column is a typed numpy array
+#   that can be memory mapped, so a query only reads the columns (and the
+#   pages) it uses.
+#
+#   Columns: time (float64, seconds since the epoch), then one float64
+#   column per channel of `samplebuffer.CHANNELS`, and for recordings that
+#   have them, seq (int64) and quality (uint16, see `quality.py`). Sessions
+#   converted before the Net F/T channels were added do not have them.
+#   Burst captures (see /api/burst) store time in seconds from their first
+#   entry and the epoch of that entry as `start` in meta.json: `timeOrigin()`.
+
+import json, os
+import numpy as np
+from samplebuffer import CHANNELS
+
+
+COLUMNS = ("time",) + CHANNELS
+SUFFIX = ".columns"
+
+
+def sessionPath(csvPath, directory=None):
+    """Returns the path of the columnar session of a CSV recording.
+    """
+    stem = os.path.basename(csvPath)
+    stem = stem[:-4] if stem.endswith('.csv') else stem
+    return os.path.join(directory or os.path.dirname(csvPath), stem + SUFFIX)
+
+
+def writeSession(path, columns, meta=None):
+    """Writes a columnar session.
+
+    Params
+    ------
+    path: str
+        path of the session directory. It is created if needed.
+    columns: dict
+        column name -> numpy.ndarray. Every column must have the same length.
+    meta: dict
+        extra metadata stored in meta.json.
+    """
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Columns have different lengths: {lengths}")
+    os.makedirs(path, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(values))
+    info = dict(meta or {})
+    info.update(rows=lengths.pop() if lengths else 0,
+                columns={name: str(values.dtype) for name, values in columns.items()})
+    with open(os.path.join(path, "meta.json"), 'w') as file:
+        json.dump(info, file, indent=2)
+
+
+def readMeta(path):
+    with open(os.path.join(path, "meta.json")) as file:
+        return json.load(file)
+
+
+def timeOrigin(path):
+    """Returns the epoch the time column of a session counts from: 0 for
+    the sessions converted from a recording, `start` for the bursts.
+    """
+    return readMeta(path).get("start", 0)
+
+
+def openSession(path, columns=None):
+    """Opens the columns of a session as read only memory maps.
+
+    Params
+    ------
+    path: str
+        path of the session directory.
+    columns: list
+        names of the columns to open. Default is every column.
+
+    Returns
+    -------
+    dict
+        column name -> numpy.memmap.
+    """
+    names = columns or list(readMeta(path)["columns"])
+    return {name: np.load(os.path.join(path, name + ".npy"), mmap_mode='r') for name in names}
@@ -0,0 +1,168 @@
+#   BULK IMPORT OF THE CSV ARCHIVE INTO THE COLUMNAR FORMAT
+#
+#   Converts every netbox-data-*.csv recording of a directory into a columnar
+#   session (see `columnar.py`). Files are converted in parallel in a process
+#   pool, one file per task, and each file is parsed with a vectorized parser:
+#   the fixed width dates are decoded with array slicing and the values of all
+#   the rows are parsed with a single numpy call.
+#
+#   Usage: python csvimport.py [data directory] [--output dir] [--workers N] [--force]
+
+import argparse, datetime, glob, os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import columnar
+from samplebuffer import CHANNELS, NETFT_CHANNELS
+
+
+#   Value columns of a row, in file order. Recordings made before the
+#   sequence numbers end after tz and recordings made before the Net F/T
+#   end after quality: the channels they lack are NaN.
+FILE_COLUMNS = CHANNELS[:-len(NETFT_CHANNELS)] + ("seq", "quality") + NETFT_CHANNELS
+DATE_WIDTH = len("01-01-2021-00:00:00")
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def parseDates(dates):
+    """Converts dates with the format %d-%m-%Y-%H:%M:%S (local time) into
+    seconds since the epoch.
+
+    Params
+    ------
+    dates: numpy.ndarray
+        array of bytes strings of DATE_WIDTH characters.
+
+    Returns
+    -------
+    numpy.ndarray
+        float64 timestamps.
+    """
+    if len(dates) == 0:
+        return np.zeros(0)
+    chars = dates.view(np.uint8).reshape(-1, DATE_WIDTH).astype(np.int64) - ord('0')
+    number = lambda a, b: (chars[:, a:b] * 10 ** np.arange(b - a - 1, -1, -1)).sum(axis=1)
+    day, month, year = number(0, 2), number(3, 5), number(6, 10)
+    hour, minute, second = number(11, 13), number(14, 16), number(17, 19)
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]').astype(np.int64) + day - 1
+    naive = days * 86400 + hour * 3600 + minute * 60 + second
+    #   The recordings are in local time. The UTC offset is looked up once per hour.
+    uniqueHours, inverse = np.unique(naive // 3600, return_inverse=True)
+    offsets = np.array([(EPOCH + datetime.timedelta(hours=int(h))).timestamp() - int(h) * 3600
+                        for h in uniqueHours])
+    return (naive + offsets[inverse]).astype(np.float64)
+
+
+def parseValue(field):
+    try:
+        return float(field) if field else np.nan
+    except ValueError:
+        return np.nan
+
+
+def parseValues(line, n):
+    """Parses the values of one row. Empty, missing or malformed fields are NaN.
+    """
+    fields = line.decode('ascii', errors='replace').replace(',', ';').split(';')[:n]
+    return [parseValue(x) for x in fields] + [np.nan] * (n - len(fields))
+
+
+def parseFile(path):
+    """Parses a recording. The header is comma separated (or semicolon separated
+    in some old files) and the rows are semicolon separated. Recordings with
+    the Sequence and Quality columns also get the `seq` and `quality` columns.
+    Files without a header are the oldest recordings, with the first 9 channels.
+
+    Returns
+    -------
+    dict
+        column name -> numpy.ndarray.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    lines = data.replace(b'\r', b'').split(b'\n')
+    n = FILE_COLUMNS.index("seq")
+    if lines and lines[0].startswith(b'Date'):
+        n = headerColumns(lines[0])
+        lines = lines[1:]
+    return parseLines(lines, n)
+
+
+def headerColumns(header):
+    """Returns the number of value columns (all but the date) of a header line.
+    """
+    return len(header.strip().replace(b';', b',').split(b',')) - 1
+
+
+def parseLines(lines, n=len(FILE_COLUMNS)):
+    """Parses rows of a recording (bytes, without the header) with the first
+    `n` value columns of `FILE_COLUMNS`. Lines too short to hold a date are
+    skipped and malformed values are NaN.
+
+    Returns
+    -------
+    dict
+        column name -> numpy.ndarray.
+    """
+    lines = [line.rstrip(b'\r\n') for line in lines]
+    lines = [line for line in lines if len(line) > DATE_WIDTH]
+    dates = np.array([line[:DATE_WIDTH] for line in lines], dtype=f'S{DATE_WIDTH}')
+    text = b' '.join(line[DATE_WIDTH + 1:] for line in lines).replace(b';', b' ').replace(b',', b' ')
+    try:
+        values = np.array(text.split(), dtype=np.float64)
+    except ValueError:
+        values = None
+    if values is None or len(values) != len(lines) * n:
+        #   Rows with empty, missing or malformed fields: slower row by row parse.
+        values = np.array([parseValues(line[DATE_WIDTH + 1:], n) for line in lines])
+    values = values.reshape(len(lines), n)
+    columns = {"time": parseDates(dates)}
+    for channel in CHANNELS:
+        i = FILE_COLUMNS.index(channel)
+        columns[channel] = values[:, i] if i < n else np.full(len(lines), np.nan)
+    if n > FILE_COLUMNS.index("quality"):
+        columns["seq"] = np.nan_to_num(values[:, FILE_COLUMNS.index("seq")], nan=-1).astype(np.int64)
+        columns["quality"] = np.nan_to_num(values[:, FILE_COLUMNS.index("quality")]).astype(np.uint16)
+    return columns
+
+
+def convert(path, output=None, force=False):
+    """Converts one recording. Returns (path, rows, seconds), with rows None
+    if the session already existed.
+    """
+    start = time.perf_counter()
+    target = columnar.sessionPath(path, output)
+    if os.path.exists(target) and not force:
+        return path, None, 0
+    columns = parseFile(path)
+    columnar.writeSession(target, columns, {"source": os.path.basename(path)})
+    return path, len(columns["time"]), time.perf_counter() - start
+
+
+def convertAll(paths, output=None, workers=None, force=False):
+    """Converts the recordings in a process pool with `workers` processes
+    (default: one per core). Yields the result of every file as it finishes.
+    """
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(convert, path, output, force) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Converts the CSV recordings into the columnar format")
+    parser.add_argument('directory', nargs='?', default='./data')
+    parser.add_argument('--output', default=None, help="output directory. Default is the input directory")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help="convert sessions that already exist")
+    args = parser.parse_args()
+    paths = sorted(glob.glob(os.path.join(args.directory, 'netbox-data-*.csv')))
+    start = time.perf_counter()
+    total = 0
+    for path, rows, seconds in convertAll(paths, args.output, args.workers, args.force):
+        if rows is None:
+            print(f"[SYSTEM]: {path} already converted")
+        else:
+            total += rows
+            print(f"[SYSTEM]: {path} -> {rows} rows in {seconds:.2f} s")
+    print(f"[SYSTEM]: {len(paths)} files, {total} rows in {time.perf_counter() - start:.2f} s")
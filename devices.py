@@ -0,0 +1,649 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import calibration
+from clipxreader import ClipXReader
+import quality
+from netft import NetFTReader
+from pyeibwrapper import PyEIBWrapper, packetFields, AXES
+from pyhbcwrapper import PyHBCWraperr
+from realtime import RealtimeLoop
+from replay import ReplayEIB, ReplayHBC
+
+
+class DeviceManager():
+    """
+    Owns the Heidenhain EIB741, the ClipX and the Net F/T connections of the process.
+
+    ...
+
+    Both devices are connected and configured concurrently, each one in its
+    own worker thread. Once a device is up it is kept warm: following calls
+    to `connect()` (a browser reload, a second dashboard) reuse it instead
+    of loading the DLL and running the configuration again.
+
+    The manager also supervises both connections. A failed read or a
+    dropped ClipX connection marks the device as lost and starts a
+    background thread that reconnects it and re-runs its configuration,
+    retrying with exponential backoff, until it is back or `disconnect()`
+    is called. While a device is lost its reads return None so the caller
+    can record the gap.
+
+    `burst()` borrows the EIB741 for a capture in a recording mode. During
+    the capture EIB741 reads return None (a gap) without waiting, and the
+    ClipX keeps being read.
+
+    The Net F/T streams on its own thread (see `netft.py`) at its RDT rate.
+    It has no connection to lose: while it is silent its rows are gaps and
+    the reader keeps asking for the stream until it comes back. Its outages
+    are kept in `gaps` like the other devices'.
+
+    `startRealtime()` switches the EIB741 to the soft real-time mode, polled
+    by a `realtime.RealtimeLoop`. EIB741 reads then return its latest sample.
+
+    Attributes
+    ----------
+    pathToDLL: str
+        path to the eib7.dll file.
+    heidenCon: bool
+        whether the Heidenhain EIB741 is used.
+    heiden: PyEIBWrapper
+        the EIB741 wrapper, or None before the first connection.
+    hbc: PyHBCWraperr
+        the ClipX wrapper, or None before the first connection.
+    heidenReady: bool
+        True when the EIB741 is connected and streaming.
+    hbcReady: bool
+        True when the ClipX is connected and measuring.
+    wanted: bool
+        True between `connect()` and `disconnect()`. Lost devices are only
+        reconnected while it is set.
+    replaying: bool
+        True while the devices are replaced by a `replay.ReplaySession`.
+    reconnecting: set
+        names of the devices being reconnected ('heiden', 'hbc').
+    gaps: list
+        [device, start, end] of every outage, with `end` None while ongoing.
+    minBackoff, maxBackoff: float
+        first and maximum delay in seconds between reconnection attempts.
+    maxReadErrors: int
+        consecutive failed EIB741 reads before the device is considered lost.
+    realtime: RealtimeLoop
+        the soft real-time loop, or None in streaming mode.
+    reader: ClipXReader
+        block reader of the ClipX, with the measurement rate and block size
+        of the session.
+    flags: int
+        quality flags (see `quality.py`) raised by the reads since the last
+        `takeFlags()`.
+    statusMask: int
+        bits of the EIB741 status word treated as errors.
+    axes: tuple
+        EIB741 axes in the data packet. Default is ax, ay and az, the
+        ones shown by the front end.
+    netftAddress: tuple
+        ('IP', PORT) of the Net F/T, or None if it is not used (the default).
+    netft: NetFTReader
+        the Net F/T stream, or None before the first connection.
+    netftRate: float
+        RDT output rate set on the Net F/T, in samples per second.
+    """
+
+    def __init__(self, pathToDLL='./eib7_64.dll', heidenCon=True, netftAddress=None):
+        self.pathToDLL = pathToDLL
+        self.heidenCon = heidenCon
+        self.netftAddress = netftAddress
+        self.netft = None
+        self.netftRate = 1000
+        self.heiden = None
+        self.hbc = None
+        self.heidenReady = False
+        self.hbcReady = False
+        self.wanted = False
+        self.replaying = False
+        self.reconnecting = set()
+        self.gaps = []
+        self.minBackoff = 0.5
+        self.maxBackoff = 30
+        self.maxReadErrors = 3
+        self.readErrors = 0
+        self.lock = threading.Lock()
+        #   Serializes the EIB741 calls of every thread (acquisition, bursts, soft
+        #   real-time). Always taken before `self.lock`, never while holding it.
+        self.heidenLock = threading.Lock()
+        self.realtime = None
+        self.heidenLast = None
+        self.heidenTrigger = None
+        self.heidenOverflows = 0
+        self.clipxOverflows = 0
+        self.flags = 0
+        self.statusMask = 0xFF00
+        self.axes = ("ax", "ay", "az")
+        self.reader = ClipXReader()
+        self.clipxLast = None
+        self.clipxOffset = None
+        self.clipxDevice = None
+        self.rate = None
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="device")
+
+    def connectHeiden(self):
+        """Connects the EIB741 and configures the streaming mode.
+        The DLL wrapper is created only once.
+        """
+        if self.heidenReady:
+            return
+        if self.heiden is None:
+            self.heiden = PyEIBWrapper(self.pathToDLL)
+        err = self.heiden.openConnectInit([0, 1, 2, 3])
+        if err != 0:
+            raise ConnectionError(f"Heidenhain connection failed with error code {err}")
+        self.heiden.configStreaming(self.axes)
+        self.heidenTrigger = None
+        self.heidenReady = True
+
+    def selectAxes(self, axes):
+        """Changes the EIB741 axes in the data packet. A streaming EIB741 is
+        stopped and configured again with the new packet.
+
+        Params
+        ------
+        axes: list
+            names of the axes, from `pyeibwrapper.AXES`.
+        """
+        axes = tuple(name for name, region, _, _ in packetFields(axes) if region > 0 and name in AXES)
+        if axes == self.axes:
+            return
+        if self.realtime is not None:
+            raise ConnectionError("Stop the soft real-time mode first")
+        self.axes = axes
+        if self.heidenReady and not self.replaying:
+            with self.heidenLock:
+                try:
+                    self.heiden.globalTriggerEnable(0, -1)
+                    self.heiden.selectMode(0)
+                    self.heiden.configStreaming(axes)
+                    self.heidenTrigger = None
+                    self.heidenLast = None
+                except Exception as e:
+                    self.deviceLost('heiden', e)
+                    raise
+
+    def connectClipX(self):
+        """Connects the ClipX, sets the measurement rate and starts measuring.
+        An open ClipX connection is reused.
+        """
+        if self.hbcReady and self.hbc.isConnected() and self.rate == self.reader.rate:
+            return
+        if self.hbc is None:
+            self.hbc = PyHBCWraperr()
+            self.hbc.connect()
+        elif not self.hbc.isConnected():
+            self.hbc.connect()
+        elif self.hbcReady:
+            #   Only the rate changed: restart the measurement with the new one.
+            self.hbc.stopMeasurements()
+        self.hbc.sdoWrite(0x4428, 8, f'{self.reader.rate:g}')
+        self.rate = self.reader.rate
+        self.clipxOffset = None
+        self.hbc.startMeasurement()
+        self.hbcReady = True
+
+    def connectNetFT(self):
+        """Starts the Net F/T stream. A running stream with the same address
+        and rate is kept, and a stream is stopped if the Net F/T is not used.
+        """
+        netft = self.netft
+        if self.netftAddress is None:
+            if netft is not None:
+                netft.stop()
+                self.closeNetFTGaps()
+            self.netft = None
+            return
+        if netft is not None and netft.running and netft.address == self.netftAddress and netft.rate == self.netftRate:
+            return
+        if netft is not None:
+            netft.stop()
+        self.netft = NetFTReader(self.netftAddress, self.netftRate)
+        self.netft.start()
+
+    def closeNetFTGaps(self):
+        for gap in self.gaps:
+            if gap[0] == 'netft' and gap[2] is None:
+                gap[2] = time.time()
+
+    def replay(self, session):
+        """Replaces both devices with the replay of a recorded session.
+        The real devices are used again after `disconnect()`.
+
+        Params
+        ------
+        session: replay.ReplaySession
+            the session to be played.
+        """
+        self.disconnect()
+        with self.lock:
+            self.heiden = ReplayEIB(session)
+            self.hbc = ReplayHBC(session)
+            self.heidenOverflows = 0
+            self.replaying = True
+        self.connect()
+
+    def isReady(self):
+        """Returns True if every used device is connected and configured.
+        """
+        return self.hbcReady and (self.heidenReady or not self.heidenCon)
+
+    def connect(self, rate=None, blockSize=None, axes=None, netftRate=None, netftAddress=None):
+        """Connects and configures both devices concurrently. Devices that are
+        already up are reused, so the call is almost instant when the rig is ready.
+        A device that fails to connect is handed to the reconnection loop
+        (see `deviceLost()`), as if it had been lost.
+
+        Params
+        ------
+        rate: float
+            ClipX measurement rate in lines per second. Default keeps the
+            current one (10 at start).
+        blockSize: int
+            lines per ClipX read, or None to adapt it to the backlog.
+        axes: list
+            EIB741 axes in the data packet. Default keeps the current ones.
+        netftRate: float
+            RDT output rate of the Net F/T. Default keeps the current one
+            (1000 at start).
+        netftAddress: tuple
+            ('IP', PORT) of the Net F/T, or False to stop using it. Default
+            keeps the current one.
+
+        Returns
+        -------
+        bool
+            True if the devices were already up (warm connection).
+        """
+        if axes is not None:
+            self.selectAxes(axes)
+        with self.lock:
+            self.wanted = True
+            self.reader.configure(rate or self.reader.rate, blockSize)
+            self.clipxOverflows = self.reader.overflows
+            self.netftRate = netftRate or self.netftRate
+            if netftAddress is not None:
+                self.netftAddress = netftAddress or None
+            if not self.replaying:
+                self.connectNetFT()
+            if self.isReady() and self.hbc.isConnected() and self.rate == self.reader.rate:
+                return True
+            futures = {'hbc': self.executor.submit(self.connectClipX)}
+            if self.heidenCon:
+                futures['heiden'] = self.executor.submit(self.connectHeiden)
+            failed = {name: future.exception() for name, future in futures.items() if future.exception() is not None}
+        for name, error in failed.items():
+            self.deviceLost(name, error)
+        return False
+
+    def disconnect(self):
+        """Stops the measurements and the Net F/T stream and closes the
+        connections. The DLL wrappers are kept so the next connection is cheaper.
+        """
+        self.stopRealtime(restream=False)
+        #   Waits for a burst capture in progress before closing the EIB741.
+        with self.heidenLock, self.lock:
+            self.wanted = False
+            if self.netft is not None:
+                self.netft.stop()
+            self.closeNetFTGaps()
+            if self.hbc is not None and self.hbcReady:
+                self.hbc.stopMeasurements()
+            self.hbcReady = False
+            if self.heiden is not None and self.heidenReady:
+                self.heiden.safeExit()
+            self.heidenReady = False
+            self.clipxLast = None
+            self.clipxOffset = None
+            self.clipxDevice = None
+            if self.replaying:
+                self.hbc.disconnect()
+                self.heiden = None
+                self.hbc = None
+                self.heidenOverflows = 0
+                self.replaying = False
+
+    def readClipX(self):
+        """Drains every line available in the ClipX buffer with the block
+        reader. The lines keep their device timestamps, mapped to host time
+        with a single offset (see `deviceClock()`); without device timestamps
+        they are dated backwards from now at the measurement rate. A line is
+        never dated before the last line of the previous read, so the
+        timestamps never go back. Replayed lines keep the time they were
+        recorded at.
+
+        Returns
+        -------
+        numpy.ndarray
+            timestamp of every line read.
+        numpy.ndarray[lines, 6]
+            raw fx, fy, fz, tx, ty, tz of every line read.
+        tuple
+            replayed lines only: the raw positions and Net F/T values
+            recorded with every line (see `ReplayHBC.takeRecorded()`), else None.
+        Or None while the ClipX is lost.
+        """
+        if not self.wanted:
+            raise ConnectionError("Devices are not connected")
+        if not self.hbcReady:
+            return None
+        try:
+            if not self.hbc.isConnected():
+                raise ConnectionError("ClipX connection lost")
+            lines = self.reader.read(self.hbc)
+            now = time.time()
+            #   The counter restarts from 0 when the reader is configured again: only an increase is an overflow.
+            if self.reader.overflows > self.clipxOverflows:
+                self.flags |= quality.CLIPX_OVERFLOW
+            self.clipxOverflows = self.reader.overflows
+            takeTimes = getattr(self.hbc, 'takeTimes', None)
+            takeDeviceTimes = getattr(self.hbc, 'takeDeviceTimes', None)
+            recorded = None
+            if takeTimes is not None:
+                times = takeTimes()
+                recorded = self.hbc.takeRecorded()
+            elif takeDeviceTimes is not None:
+                times = self.deviceClock(takeDeviceTimes(), now)
+            else:
+                times = now - np.arange(len(lines) - 1, -1, -1) / self.reader.rate
+            if self.clipxLast is not None:
+                times = np.maximum(times, self.clipxLast)
+            if len(times):
+                self.clipxLast = times[-1]
+            return times, lines, recorded
+        except Exception as e:
+            self.deviceLost('hbc', e)
+            return None
+
+    def deviceClock(self, device, now):
+        """Maps ClipX device timestamps to host time with a single offset:
+        the smallest host - device difference seen since the measurement
+        started, i.e. the read with the shortest transfer delay. The offset
+        is measured again when the device clock goes back (the measurement
+        restarted).
+
+        Params
+        ------
+        device: numpy.ndarray
+            device timestamps of the lines of a read, in seconds.
+        now: float
+            host time of the read.
+        """
+        if len(device) == 0:
+            return device
+        if self.clipxDevice is not None and device[0] < self.clipxDevice:
+            self.clipxOffset = None
+        self.clipxDevice = device[-1]
+        offset = now - device[-1]
+        if self.clipxOffset is None or offset < self.clipxOffset:
+            self.clipxOffset = offset
+        return device + self.clipxOffset
+
+    def readHeiden(self):
+        """Reads the status word and the position of every EIB741 axis.
+        It never waits for the FIFO: if no new entry arrived the last one
+        is returned again.
+
+        Returns
+        -------
+        tuple
+            status, ax, ay, az, aw or None while the EIB741 is lost.
+            Axes not in the data packet are None.
+        """
+        if not self.wanted:
+            raise ConnectionError("Devices are not connected")
+        if not self.heidenReady:
+            return None
+        realtime = self.realtime
+        if realtime is not None:
+            if realtime.error is not None:
+                self.realtime = None
+                self.deviceLost('heiden', realtime.error)
+                return None
+            data = realtime.latest[:5] if realtime.latest is not None else None
+            self.checkHeiden(data)
+            return data
+        if not self.heidenLock.acquire(blocking=False):
+            return None
+        try:
+            data = self.heiden.readData(0)
+            self.readErrors = 0
+            self.checkHeiden(data)
+            if data is not None:
+                self.heidenLast = data
+            return self.heidenLast
+        except Exception as e:
+            self.readErrors += 1
+            if self.readErrors >= self.maxReadErrors:
+                self.deviceLost('heiden', e)
+            return None
+        finally:
+            self.heidenLock.release()
+
+    def readNetFT(self, times):
+        """Gives every row the last Net F/T sample before its timestamp (see
+        `NetFTReader.align()`) and opens or closes the Net F/T gaps.
+
+        Params
+        ------
+        times: numpy.ndarray
+            host timestamps of the rows, in increasing order.
+
+        Returns
+        -------
+        numpy.ndarray[rows, 6]
+            raw Fx, Fy, Fz, Tx, Ty, Tz counts of every row, NaN in the gaps.
+        numpy.ndarray[rows]
+            Net F/T quality flags of every row.
+        Or None if the Net F/T is not used.
+        """
+        netft = self.netft
+        if netft is None or not netft.running:
+            return None
+        raw, flags = netft.align(times)
+        streaming = netft.isStreaming()
+        with self.lock:
+            ongoing = [gap for gap in self.gaps if gap[0] == 'netft' and gap[2] is None]
+            if not streaming and not ongoing and netft.lastData is not None:
+                print("[SYSTEM]: Device 'netft' lost: no data. Waiting for the stream ...")
+                self.gaps.append(['netft', netft.lastData, None])
+            elif streaming and ongoing:
+                ongoing[0][2] = time.time()
+                print(f"[SYSTEM]: Device 'netft' reconnected after {ongoing[0][2] - ongoing[0][1]:.1f} s")
+        return raw, flags
+
+    def takeNetFT(self):
+        """Returns every Net F/T sample streamed since the last call, in raw
+        counts (see `NetFTReader.drain()`), or None if the Net F/T is not used.
+        """
+        netft = self.netft
+        if netft is None or not netft.running:
+            return None
+        return netft.drain()
+
+    def checkHeiden(self, data):
+        """Raises the quality flags of an EIB741 read: FIFO overflows, skipped
+        trigger counts and error bits in the status word.
+        """
+        overflows = getattr(self.heiden, 'overflows', 0)
+        #   The counter restarts when the wrapper changes (e.g. a replay): only an increase is an overflow.
+        if overflows > self.heidenOverflows:
+            self.flags |= quality.HEIDEN_OVERFLOW
+        self.heidenOverflows = overflows
+        if data is None:
+            return
+        trigger = getattr(self.heiden, 'trigger', None)
+        if trigger is not None and self.heidenTrigger is not None and (trigger - self.heidenTrigger) % 65536 > 1:
+            self.flags |= quality.HEIDEN_OVERFLOW
+        self.heidenTrigger = trigger
+        if data[0] & self.statusMask:
+            self.flags |= quality.HEIDEN_STATUS
+
+    def takeFlags(self):
+        """Returns the quality flags raised since the last call and clears them.
+        """
+        flags = self.flags
+        self.flags = 0
+        return flags
+
+    def burst(self, mode=3, period=20, timeout=10, heiden=None):
+        """Captures a burst of EIB741 positions with an on-device recording
+        mode (see `PyEIBWrapper.captureBurst()`) and goes back to streaming.
+
+        Params
+        ------
+        mode: int
+            3 (recording single, until the memory is full) or 4 (recording roll).
+        period: int
+            trigger period in microseconds.
+        timeout: float
+            maximum recording time in seconds.
+        heiden: calibration.Calibration
+            converts the positions. Default is the "heiden" entry of
+            `calibration.DEFAULTS`.
+
+        Returns
+        -------
+        dict
+            columns of the capture: time (seconds from the first entry),
+            ax, ay, az (mm, NaN for axes not in the packet), status and trigger.
+        """
+        heiden = heiden or calibration.defaults()["heiden"]
+        with self.heidenLock:
+            if not self.heidenCon or self.replaying:
+                raise ConnectionError("Burst capture needs a real EIB741")
+            if not self.wanted or not self.heidenReady:
+                raise ConnectionError("Heidenhain is not connected")
+            if self.realtime is not None:
+                raise ConnectionError("Stop the soft real-time mode first")
+            try:
+                entries = self.heiden.captureBurst(mode, period, timeout)
+                self.heiden.configStreaming()
+            except Exception as e:
+                self.deviceLost('heiden', e)
+                raise
+        #   Timestamps are 32 bit microsecond counters: unwrap them.
+        ticks = np.diff(entries["timestamp"].astype(np.int64)) % 2**32
+        columns = {"time": np.concatenate([[0], np.cumsum(ticks)])[:len(entries)] / 1e6}
+        axes = calibration.SENSORS["heiden"]
+        raw = np.column_stack([entries[axis] if axis in entries.dtype.names else np.full(len(entries), np.nan)
+                               for axis in axes])
+        columns.update(zip(axes, heiden.apply(raw).T))
+        columns.update(status=entries["status"], trigger=entries["trigger"])
+        return columns
+
+    def startRealtime(self, period=1000, callback=None):
+        """Switches the EIB741 from streaming to the soft real-time mode,
+        polled every `period` microseconds by a dedicated thread.
+
+        Params
+        ------
+        period: int
+            trigger and loop period in microseconds.
+        callback: callable
+            called by the loop with every new (status, ax, ay, az, aw,
+            timestamp, monotonic time) sample.
+
+        Returns
+        -------
+        RealtimeLoop
+            the running loop.
+        """
+        with self.heidenLock:
+            if not self.heidenCon or self.replaying:
+                raise ConnectionError("Soft real-time mode needs a real EIB741")
+            if not self.wanted or not self.heidenReady:
+                raise ConnectionError("Heidenhain is not connected")
+            if self.realtime is not None:
+                self.realtime.callback = callback
+                return self.realtime
+            loop = RealtimeLoop(self.heiden, period, callback)
+            try:
+                loop.start()
+            except Exception as e:
+                self.deviceLost('heiden', e)
+                raise
+            self.realtime = loop
+            return loop
+
+    def stopRealtime(self, restream=True):
+        """Stops the soft real-time loop and goes back to streaming.
+
+        Returns
+        -------
+        dict
+            the final statistics of the loop, or None if it was not running.
+        """
+        with self.heidenLock:
+            loop = self.realtime
+            if loop is None:
+                return None
+            self.realtime = None
+            loop.stop()
+            if restream and self.heidenReady:
+                try:
+                    self.heiden.globalTriggerEnable(0, -1)
+                    self.heiden.selectMode(0)
+                    self.heiden.configStreaming()
+                except Exception as e:
+                    self.deviceLost('heiden', e)
+            return loop.stats()
+
+    def deviceLost(self, name, error):
+        """Marks a device as lost, opens a gap and starts reconnecting it
+        in the background.
+
+        Params
+        ------
+        name: str
+            'heiden' or 'hbc'.
+        error: Exception
+            the error that revealed the loss.
+        """
+        with self.lock:
+            if not self.wanted or name in self.reconnecting:
+                return
+            print(f"[SYSTEM]: Device '{name}' lost: {error}. Reconnecting ...")
+            if name == 'heiden':
+                self.heidenReady = False
+            else:
+                self.hbcReady = False
+            self.reconnecting.add(name)
+            self.gaps.append([name, time.time(), None])
+        threading.Thread(target=self.reconnect, args=(name,), daemon=True,
+                         name=f"reconnect-{name}").start()
+
+    def reconnect(self, name):
+        """Reconnects and reconfigures a lost device, retrying with exponential
+        backoff until it succeeds or the devices are disconnected.
+        """
+        delay = self.minBackoff
+        while self.wanted:
+            try:
+                if name == 'heiden':
+                    try:
+                        self.heiden.safeExit()
+                    except Exception:
+                        pass
+                    self.connectHeiden()
+                    self.readErrors = 0
+                else:
+                    self.connectClipX()
+                with self.lock:
+                    self.reconnecting.discard(name)
+                    for gap in self.gaps:
+                        if gap[0] == name and gap[2] is None:
+                            gap[2] = time.time()
+                            print(f"[SYSTEM]: Device '{name}' reconnected after {gap[2] - gap[1]:.1f} s")
+                return
+            except Exception as e:
+                print(f"[SYSTEM]: Reconnection of '{name}' failed: {e}. Retrying in {delay} s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.maxBackoff)
+        with self.lock:
+            self.reconnecting.discard(name)
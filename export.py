@@ -0,0 +1,151 @@
+#   STREAMING EXPORT OF THE RECORDINGS
+#
+#   Generates an export of a recording (a CSV recording of `./data` or a
+#   columnar session) chunk by chunk, so the memory used does not depend on
+#   the size of the recording and the first bytes can be sent straight away.
+#   CSV recordings are read from the first row of the time range, found with
+#   the 1 s level of the pyramid when it exists. Columnar sessions are read
+#   from their memory maps, with the times of the bursts moved to the epoch
+#   (see `columnar.timeOrigin()`).
+#
+#   Formats:
+#       csv      comma separated, a header with the column names and one
+#                row per sample, time in seconds since the epoch.
+#       ndjson   one JSON object per sample.
+#       binary   fixed size little-endian records, described by `columns()`.
+
+import itertools, json, math, os
+import numpy as np
+import columnar, pyramid
+from csvimport import FILE_COLUMNS, headerColumns, parseLines
+from samplebuffer import CHANNELS
+
+
+FORMATS = ("csv", "ndjson", "binary")
+MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson", "binary": "application/octet-stream"}
+
+
+def readCSV(path, start=None, end=None, chunkRows=5000):
+    """Yields the columns of a CSV recording in chunks of `chunkRows` rows.
+    """
+    offset = 0
+    if start is not None and pyramid.hasLevel(path, pyramid.LEVELS[0]):
+        buckets = pyramid.readLevel(path, pyramid.LEVELS[0], start, start)
+        offset = int(buckets["offset"][0]) if len(buckets) else 0
+    with open(path, 'rb') as file:
+        header = file.readline()
+        n = headerColumns(header) if header.startswith(b'Date') else FILE_COLUMNS.index("seq")
+        if offset > 0:
+            file.seek(offset)
+        elif not header.startswith(b'Date'):
+            file.seek(0)
+        while True:
+            lines = list(itertools.islice(file, chunkRows))
+            if not lines:
+                return
+            columns = parseLines(lines, n)
+            times = columns["time"]
+            if end is not None and len(times) and times[0] > end:
+                return
+            yield columns
+
+
+def readColumns(path, start=None, end=None, chunkRows=50000):
+    """Yields the columns of a columnar session in chunks of `chunkRows` rows.
+    Channels the session does not have (e.g. the Net F/T in sessions
+    converted before it was added) are NaN.
+    """
+    session = columnar.openSession(path)
+    origin = columnar.timeOrigin(path)
+    times = session["time"]
+    first = 0 if start is None else int(np.searchsorted(times, start - origin, side='left'))
+    last = len(times) if end is None else int(np.searchsorted(times, end - origin, side='right'))
+    for i in range(first, last, chunkRows):
+        chunk = {name: np.asarray(values[i:min(last, i + chunkRows)]) for name, values in session.items()}
+        chunk["time"] = chunk["time"] + origin
+        for channel in CHANNELS:
+            if channel not in chunk:
+                chunk[channel] = np.full(len(chunk["time"]), np.nan)
+        yield chunk
+
+
+def columns(channels, seq=False):
+    """Returns the (name, dtype) of the exported columns.
+    """
+    names = [("time", "<f8")] + [(channel, "<f8") for channel in channels]
+    if seq:
+        names += [("seq", "<i8"), ("quality", "<u2")]
+    return names
+
+
+def stream(path, output="csv", channels=CHANNELS, start=None, end=None, every=1):
+    """Opens the export of a recording. The arguments are checked and the
+    first chunk is read straight away, the rest is read while the export is
+    consumed.
+
+    Params
+    ------
+    path: str
+        path of a CSV recording or of a columnar session directory.
+    output: str
+        one of `FORMATS`.
+    channels: list
+        exported channels.
+    start, end: float
+        time range in seconds since the epoch. None means no limit.
+    every: int
+        decimation: one row out of `every` is exported.
+
+    Returns
+    -------
+    list
+        (name, dtype) of the exported columns.
+    generator
+        bytes of the export: the header first (csv only), then one block
+        per chunk of rows.
+    """
+    if output not in FORMATS:
+        raise ValueError(f"Unknown format '{output}'. Use one of {', '.join(FORMATS)}")
+    if every < 1:
+        raise ValueError("every must be 1 or greater")
+    chunks = readColumns(path, start, end) if os.path.isdir(path) else readCSV(path, start, end)
+    first = next(chunks, None)
+    names = columns(channels, first is not None and "seq" in first)
+    chunks = itertools.chain([first], chunks) if first is not None else iter(())
+    return names, encode(chunks, names, output, start, end, every)
+
+
+def encode(chunks, names, output, start=None, end=None, every=1):
+    """Yields the rows of `chunks` in the time range, decimated and encoded
+    as `output`. The decimation phase is kept from one chunk to the next.
+    """
+    if output == "csv":
+        yield (",".join(name for name, _ in names) + "\n").encode()
+    keys = [name for name, _ in names]
+    phase = 0
+    for chunk in chunks:
+        times = chunk["time"]
+        keep = np.ones(len(times), dtype=bool)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times <= end
+        index = np.flatnonzero(keep)
+        index = index[(-phase) % every::every]
+        phase = (phase + len(keep.nonzero()[0])) % every
+        if len(index) == 0:
+            continue
+        data = [np.asarray(chunk[name])[index] for name in keys]
+        if output == "binary":
+            records = np.empty(len(index), dtype=names)
+            for name, values in zip(keys, data):
+                records[name] = values
+            yield records.tobytes()
+        else:
+            rows = zip(*(values.tolist() for values in data))
+            if output == "csv":
+                yield "".join(",".join(map(repr, row)) + "\n" for row in rows).encode()
+            else:
+                #   JSON has no NaN: missing values are null.
+                rows = ([value if math.isfinite(value) else None for value in row] for row in rows)
+                yield "".join(json.dumps(dict(zip(keys, row)), allow_nan=False) + "\n" for row in rows).encode()
@@ -0,0 +1,244 @@
+#   LIMIT MONITORING AND ALARMS
+#
+#   Checks every acquired batch against per-channel limits, inside the
+#   acquisition thread, so an alarm goes out as soon as the batch that
+#   crossed a limit has been read. Three kinds of limits are checked:
+#
+#       high    the value goes above `high`
+#       low     the value goes below `low`
+#       rate    the absolute rate of change goes above `rate` (units per second)
+#
+#   Every limit has a hysteresis band: an alarm raised when the signal
+#   crosses the limit is only cleared once it is back past the limit by more
+#   than the band, so a noisy signal sitting on the limit does not flap.
+#   A batch is checked with array operations only: the raise and clear
+#   conditions of every row and limit are computed at once, and the state of
+#   each limit at each row is the last condition met (forward filled).
+#
+#   Alarms are handed to the local callbacks (`addCallback()`), called in the
+#   acquisition thread, and to the push subscribers (`subscribe()`, served
+#   by /api/alarms as server-sent events). The limits can be read from
+#   limits.json:
+#
+#       {"fz": {"high": 500, "low": -500, "hysteresis": 5, "rate": 20000, "rateHysteresis": 2000}}
+
+import json, os, threading, time
+import numpy as np
+from pipeline import BoundedQueue
+from samplebuffer import CHANNELS, channelIndex
+
+
+KINDS = ("high", "low", "rate")
+
+
+class LimitMonitor():
+    """
+    Checks the acquired batches against the limits of every channel.
+
+    ...
+
+    Attributes
+    ----------
+    limits: dict
+        channel -> {"high", "low", "rate", "hysteresis", "rateHysteresis"}.
+        Missing limits are not checked.
+    active: numpy.ndarray[len(KINDS) * len(CHANNELS)]
+        whether every limit is in alarm, ordered by kind then channel.
+    callbacks: list
+        functions called with the list of alarms of every batch that raised
+        or cleared one.
+    subscribers: dict
+        name -> BoundedQueue of alarms of the push subscribers.
+    raised, cleared: int
+        alarms raised and cleared since the monitor was created.
+    history: int
+        number of latencies kept for `stats()`.
+    """
+
+    def __init__(self, history=1000):
+        self.limits = {}
+        self.thresholds = np.full(len(KINDS) * len(CHANNELS), np.nan)
+        self.bands = np.zeros(len(KINDS) * len(CHANNELS))
+        self.active = np.zeros(len(KINDS) * len(CHANNELS), dtype=bool)
+        self.lastTime = None
+        self.lastValues = None
+        self.callbacks = []
+        self.subscribers = {}
+        self.raised = 0
+        self.cleared = 0
+        self.batches = 0
+        self.latency = np.zeros(history)
+        self.alarms = 0
+        self.work = np.zeros(history)
+        self.lock = threading.Lock()
+
+    def configure(self, limits):
+        """Replaces the limits. The state of every limit is reset.
+
+        Params
+        ------
+        limits: dict
+            channel -> dict with any of high, low, rate, hysteresis (band of
+            high and low, default 0) and rateHysteresis (band of rate, default 0).
+        """
+        thresholds = np.full(len(KINDS) * len(CHANNELS), np.nan)
+        bands = np.zeros(len(KINDS) * len(CHANNELS))
+        clean = {}
+        for channel, limit in limits.items():
+            column = channelIndex(channel)
+            unknown = set(limit) - set(KINDS) - {"hysteresis", "rateHysteresis"}
+            if unknown:
+                raise ValueError(f"Unknown limit fields for '{channel}': {', '.join(sorted(unknown))}")
+            limit = {key: float(value) for key, value in limit.items() if value is not None}
+            if limit.get("hysteresis", 0) < 0 or limit.get("rateHysteresis", 0) < 0 or limit.get("rate", 0) < 0:
+                raise ValueError("rate and hysteresis must be positive")
+            if "high" in limit and "low" in limit and limit["low"] >= limit["high"]:
+                raise ValueError(f"The low limit of '{channel}' must be below the high limit")
+            #   low is checked as -value going above -low, so every kind is an upper limit.
+            for i, (kind, sign, band) in enumerate((("high", 1, "hysteresis"), ("low", -1, "hysteresis"), ("rate", 1, "rateHysteresis"))):
+                if kind in limit:
+                    thresholds[i * len(CHANNELS) + column] = sign * limit[kind]
+                    bands[i * len(CHANNELS) + column] = limit.get(band, 0)
+            clean[channel] = limit
+        with self.lock:
+            self.limits = clean
+            self.thresholds = thresholds
+            self.bands = bands
+            self.active = np.zeros(len(thresholds), dtype=bool)
+
+    def load(self, path='./limits.json'):
+        """Reads the limits from `path` if it exists.
+        """
+        if os.path.isfile(path):
+            with open(path) as file:
+                self.configure(json.load(file))
+
+    def enabled(self):
+        return bool(self.limits)
+
+    def check(self, times, values, seqs):
+        """Checks a batch and sends the alarms it raised or cleared.
+
+        Params
+        ------
+        times: numpy.ndarray[rows]
+            host timestamps of the rows.
+        values: numpy.ndarray[rows, len(CHANNELS)]
+            values of the rows, ordered as `CHANNELS`.
+        seqs: numpy.ndarray[rows]
+            sequence numbers of the rows.
+
+        Returns
+        -------
+        list
+            the alarms, oldest first.
+        """
+        start = time.perf_counter()
+        with self.lock:
+            thresholds, bands, active = self.thresholds, self.bands, self.active
+            n = len(times)
+            previousTime = times[0] if self.lastTime is None else self.lastTime
+            previousValues = values[0] if self.lastValues is None else self.lastValues
+            self.lastTime, self.lastValues = times[-1], values[-1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dt = np.diff(times, prepend=previousTime)
+                rate = np.abs(np.diff(values, axis=0, prepend=previousValues[None, :])) / dt[:, None]
+                rate[dt <= 0] = np.nan
+            signals = np.hstack([values, -values, rate])
+            #   NaN signals (gaps) and NaN thresholds (no limit) meet neither condition.
+            with np.errstate(invalid='ignore'):
+                raise_ = signals > thresholds
+                clear = signals < thresholds - bands
+            rows = np.arange(n)[:, None]
+            last = np.maximum.accumulate(np.where(raise_ | clear, rows, -1), axis=0)
+            states = np.where(last >= 0, np.take_along_axis(raise_, np.maximum(last, 0), axis=0), active)
+            changed = states != np.vstack([active[None, :], states[:-1]])
+            self.active = states[-1]
+            slot = self.batches % len(self.work)
+            self.batches += 1
+            if not changed.any():
+                self.work[slot] = time.perf_counter() - start
+                return []
+            alarms = []
+            for row, column in zip(*np.nonzero(changed)):
+                kind, channel = KINDS[column // len(CHANNELS)], CHANNELS[column % len(CHANNELS)]
+                raised = bool(states[row, column])
+                value = float(rate[row, column % len(CHANNELS)] if kind == "rate" else values[row, column % len(CHANNELS)])
+                alarms.append({"channel": channel, "kind": kind, "state": "raised" if raised else "cleared",
+                               "value": value, "limit": float(self.limits[channel][kind]),
+                               "time": float(times[row]), "seq": int(seqs[row])})
+                if raised:
+                    self.raised += 1
+                else:
+                    self.cleared += 1
+            self.work[slot] = time.perf_counter() - start
+        self.dispatch(alarms)
+        return alarms
+
+    def dispatch(self, alarms):
+        """Hands the alarms to the callbacks and the subscribers. The latency
+        from the row timestamp to the hand-over is added to every alarm.
+        """
+        now = time.time()
+        for alarm in alarms:
+            alarm["latency"] = now - alarm["time"]
+            self.latency[self.alarms % len(self.latency)] = alarm["latency"]
+            self.alarms += 1
+        for callback in list(self.callbacks):
+            try:
+                callback(alarms)
+            except Exception as e:
+                print("[ LIMITS ]: Error ocurred in an alarm callback. Error message: ")
+                print(e)
+        for queue in list(self.subscribers.values()):
+            queue.put(alarms)
+
+    def addCallback(self, callback):
+        self.callbacks.append(callback)
+
+    def removeCallback(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def subscribe(self, name, capacity=1000):
+        """Adds a push subscriber. The oldest alarms are dropped if it falls
+        `capacity` alarms behind.
+
+        Returns
+        -------
+        BoundedQueue
+            the queue the subscriber reads with `get()`.
+        """
+        queue = BoundedQueue(name, capacity, "drop-oldest")
+        self.subscribers = dict(self.subscribers, **{name: queue})
+        return queue
+
+    def unsubscribe(self, name):
+        subscribers = dict(self.subscribers)
+        queue = subscribers.pop(name, None)
+        self.subscribers = subscribers
+        if queue is not None:
+            queue.close()
+
+    def activeAlarms(self):
+        """Returns the limits in alarm as (channel, kind) pairs.
+        """
+        return [{"channel": CHANNELS[column % len(CHANNELS)], "kind": KINDS[column // len(CHANNELS)]}
+                for column in np.flatnonzero(self.active)]
+
+    def stats(self):
+        """Alarm counters and, in microseconds, the check time of the last
+        batches and the latency of the last alarms (row timestamp to hand-over
+        to the callbacks and subscribers): mean, p50, p99 and max.
+        """
+        summary = lambda a: {"mean": float(a.mean() * 1e6), "p50": float(np.percentile(a, 50) * 1e6),
+                             "p99": float(np.percentile(a, 99) * 1e6), "max": float(a.max() * 1e6)} if len(a) else None
+        return {
+            "limits": self.limits,
+            "active": self.activeAlarms(),
+            "batches": self.batches,
+            "raised": self.raised,
+            "cleared": self.cleared,
+            "subscribers": [queue.stats() for queue in self.subscribers.values()],
+            "check": summary(self.work[:min(self.batches, len(self.work))]),
+            "latency": summary(self.latency[:min(self.alarms, len(self.latency))])}
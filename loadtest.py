@@ -0,0 +1,63 @@
+#   LOAD TEST FOR THE DASHBOARD API
+#
+#   Simulates several dashboards polling the server and reports the
+#   throughput and the latency percentiles.
+#
+#   Usage: python loadtest.py [url] [clients] [seconds]
+#   Example: python loadtest.py http://127.0.0.1:4000/api/readsamples 16 30
+
+import sys, threading, time, urllib.request
+from http.cookiejar import CookieJar
+
+
+def client(url, deadline, latencies, errors):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    opener.open(url.split('/api/')[0] + '/').read()
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            opener.open(url).read()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors.append(time.perf_counter() - start)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def run(url, clients, seconds):
+    """Runs `clients` concurrent pollers against `url` for `seconds` seconds.
+
+    Returns
+    -------
+    dict
+        requests per second, errors and latency percentiles in ms.
+    """
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=client, args=(url, deadline, latencies, errors)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / seconds,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "max": max(latencies) * 1000,
+    }
+
+
+if __name__ == '__main__':
+    url = sys.argv[1] if len(sys.argv) > 1 else 'http://127.0.0.1:4000/api/readsamples'
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 30
+    result = run(url, clients, seconds)
+    print(f"[LOADTEST]: {result['clients']} clients, {result['requests']} requests, {result['errors']} errors")
+    print(f"[LOADTEST]: {result['rps']:.0f} req/s, p50 {result['p50']:.1f} ms, p99 {result['p99']:.1f} ms, max {result['max']:.1f} ms")
@@ -25,12 +25,16 @@ def send_request(RECV_ADDRESS, cmd, numOfSamples, sender_socket):
     #print(f"[PROGRAM]: REQUEST SEND WITH {numOfBytes}")
 
 
+def read_record(socket):
+    #   Returns the whole RDT record: rdt_seq, ft_seq, status, fx, fy, fz, tx, ty, tz.
+    #   rdt_seq increases by one per datagram sent, so a jump means lost datagrams.
+    data, address = socket.recvfrom(1024)
+    return struct.unpack('!3I6i', data)
+
+
 def read_data(socket):
     #print("[PROGRAM]: WAITING FOR DATA")
-    data, address = socket.recvfrom(1024)
-    data = struct.unpack('!3I6i', data)
-    ip, port = address
-    rdt_seq, ft_seq, status, fx, fy, fz, tx, ty, tz = data
+    rdt_seq, ft_seq, status, fx, fy, fz, tx, ty, tz = read_record(socket)
     #print(f"[CLIENTE]: Datos redibidos desde: {ip}:{port}\nFt_seq: {ft_seq}\nrdt_seq: {rdt_seq}. The status code is: {status}")
     #print(f"Valores recibidos:\nFx: {fx}\nFy: {fy}\nFz: {fz}")
     return fx, fy, fz, tx, ty, tz
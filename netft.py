@@ -0,0 +1,283 @@
+#   NET F/T RDT STREAM
+#
+#   Reads the ATI Net F/T over its Raw Data Transfer (RDT) UDP protocol, at
+#   the RDT output rate set on the sensor, on a dedicated thread. The sensor
+#   is asked for an endless stream (command 0x0002, 0 samples) and every
+#   datagram is timestamped on arrival with the host clock used by the other
+#   devices. A datagram holds one or more RDT records (RDT buffering): the
+#   records before the last one are dated backwards at the RDT rate.
+#
+#   The samples are kept in a ring. The acquisition never waits for the
+#   sensor: `align()` gives every acquired row the last Net F/T sample taken
+#   at or before its timestamp, in raw counts, with the quality flags of
+#   that sample (see `quality.py`), and `drain()` hands over every sample
+#   at the RDT rate, which the recorder appends to `netbox-data-X.netft.bin`
+#   next to the recording (fixed size `SAMPLE_DTYPE` records, see
+#   `readStream()`). While no datagram arrives the start request is sent
+#   again every `retry` seconds, so the stream comes back by itself after a
+#   sensor restart or a network outage.
+
+import os, socket, threading, time
+import numpy as np
+from netBoxConnection import create_udp_socket, send_request
+import quality
+
+
+START_STREAMING = 0x0002
+STOP_STREAMING = 0x0000
+#   RDT record, big-endian: rdt_sequence, ft_sequence, status, Fx, Fy, Fz, Tx, Ty, Tz (counts).
+RECORD_DTYPE = np.dtype([("rdt", ">u4"), ("ft", ">u4"), ("status", ">u4"), ("raw", ">i4", (6,))])
+#   Largest RDT buffering of the Net F/T.
+MAX_RECORDS = 40
+#   One sample: host time, status word, records lost up to it and Fx, Fy, Fz,
+#   Tx, Ty, Tz (raw counts in the ring, N and Nm once calibrated).
+SAMPLE_DTYPE = np.dtype([("time", "<f8"), ("status", "<u4"), ("lost", "<i8"), ("values", "<f8", (6,))])
+
+
+def streamPath(csvPath):
+    """Returns the path of the Net F/T stream of a recording.
+    """
+    stem = csvPath[:-4] if csvPath.endswith('.csv') else csvPath
+    return f"{stem}.netft.bin"
+
+
+def readStream(csvPath, start=None, end=None):
+    """Returns the Net F/T samples of a recording between `start` and `end`
+    (seconds since the epoch, None means no limit), in N and Nm.
+    """
+    path = streamPath(csvPath)
+    count = os.path.getsize(path) // SAMPLE_DTYPE.itemsize if os.path.isfile(path) else 0
+    if count == 0:
+        return np.zeros(0, dtype=SAMPLE_DTYPE)
+    samples = np.memmap(path, dtype=SAMPLE_DTYPE, mode='r', shape=(count,))
+    first = 0 if start is None else int(np.searchsorted(samples["time"], start, side='left'))
+    last = count if end is None else int(np.searchsorted(samples["time"], end, side='right'))
+    return np.array(samples[first:last])
+
+
+class NetFTReader():
+    """
+    Streams the Net F/T samples into a ring on a dedicated thread.
+
+    ...
+
+    Attributes
+    ----------
+    address: tuple
+        ('IP', PORT) of the Net F/T RDT server.
+    rate: float
+        RDT output rate set on the sensor, in samples per second. It is only
+        used to date the records of a buffered datagram.
+    maxAge: float
+        a row gets no Net F/T values (a gap) if the last sample before it is
+        older than `maxAge` seconds.
+    retry: float
+        seconds without data before the start request is sent again.
+    ring: numpy.ndarray[capacity]
+        `SAMPLE_DTYPE` samples. `lost` is the number of records missing
+        (RDT sequence jumps) up to every sample, counted since `start()`.
+    total: int
+        absolute index of the next sample written to the ring.
+    overruns: int
+        samples overwritten in the ring before `drain()` got them.
+    lastData: float
+        host time of the last datagram, or None.
+    """
+
+    def __init__(self, address, rate=1000, maxAge=0.1, retry=1, capacity=2**16):
+        self.address = address
+        self.rate = rate
+        self.maxAge = maxAge
+        self.retry = retry
+        self.ring = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.total = 0
+        self.cursor = 0
+        self.drained = 0
+        self.overruns = 0
+        self.held = None
+        self.lastRdt = None
+        self.lastData = None
+        self.lost = 0
+        self.datagrams = 0
+        self.statusErrors = 0
+        self.requests = 0
+        self.socket = None
+        self.running = False
+        self.thread = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Opens the socket, asks for the stream and starts the reader thread.
+        """
+        if self.running:
+            return
+        with self.lock:
+            self.total = 0
+            self.cursor = 0
+            self.drained = 0
+            self.held = None
+            self.lastRdt = None
+            self.lastData = None
+            self.lost = 0
+        self.socket = create_udp_socket()
+        self.socket.settimeout(0.1)
+        self.error = None
+        self.request(START_STREAMING)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True, name="netft")
+        self.thread.start()
+
+    def stop(self):
+        """Stops the stream and the reader thread and closes the socket.
+        """
+        if not self.running:
+            return
+        self.running = False
+        self.thread.join()
+        try:
+            self.request(STOP_STREAMING)
+        except OSError:
+            pass
+        self.socket.close()
+        self.socket = None
+
+    def request(self, command):
+        send_request(self.address, command, 0, self.socket)
+        self.requests += 1
+
+    def isStreaming(self):
+        """Returns True if a datagram arrived in the last `maxAge` seconds.
+        """
+        return self.lastData is not None and time.time() - self.lastData <= self.maxAge
+
+    def run(self):
+        requested = time.monotonic()
+        size = RECORD_DTYPE.itemsize * MAX_RECORDS
+        while self.running:
+            try:
+                data = self.socket.recv(size)
+            except socket.timeout:
+                data = None
+            except OSError as e:
+                #   e.g. ICMP port unreachable while the sensor is down.
+                self.error = e
+                time.sleep(0.1)
+                data = None
+            if data:
+                self.store(time.time(), np.frombuffer(data, dtype=RECORD_DTYPE,
+                                                      count=len(data) // RECORD_DTYPE.itemsize))
+                continue
+            silent = self.lastData is None or time.time() - self.lastData > self.retry
+            if silent and time.monotonic() - requested > self.retry:
+                try:
+                    self.request(START_STREAMING)
+                except OSError as e:
+                    self.error = e
+                requested = time.monotonic()
+
+    def store(self, now, records):
+        """Appends the records of one datagram received at `now` to the ring.
+        """
+        n = len(records)
+        if n == 0:
+            return
+        rdt = records["rdt"].astype(np.int64)
+        previous = rdt[0] - 1 if self.lastRdt is None else self.lastRdt
+        #   Records missing before every record. The sequence is 32 bit and
+        #   wraps around, a repeated or older number is not a loss.
+        jumps = (np.diff(rdt, prepend=previous) - 1) % 2**32
+        jumps[jumps >= 2**31] = 0
+        status = records["status"]
+        #   Dating the records backwards must not put them before the last datagram.
+        times = now - np.arange(n - 1, -1, -1) / self.rate
+        if self.lastData is not None:
+            times = np.maximum(times, self.lastData)
+        with self.lock:
+            idx = (self.total + np.arange(n)) % len(self.ring)
+            self.ring["time"][idx] = times
+            self.ring["status"][idx] = status
+            self.ring["lost"][idx] = self.lost + np.cumsum(jumps)
+            self.ring["values"][idx] = records["raw"]
+            self.total += n
+            self.lost += int(jumps.sum())
+        self.lastRdt = int(rdt[-1])
+        self.lastData = now
+        self.datagrams += 1
+        self.statusErrors += int(np.count_nonzero(status))
+        self.error = None
+
+    def align(self, times):
+        """Gives every row the last sample taken at or before its timestamp.
+        It never waits: samples newer than the last row are kept for the
+        next call.
+
+        Params
+        ------
+        times: numpy.ndarray
+            host timestamps of the rows, in increasing order.
+
+        Returns
+        -------
+        numpy.ndarray[rows, 6]
+            raw Fx, Fy, Fz, Tx, Ty, Tz counts of every row, NaN for the rows
+            with no sample in the last `maxAge` seconds.
+        numpy.ndarray[rows]
+            quality flags of every row: NETFT_GAP, NETFT_LOST (records were
+            missing since the sample of the previous row) and NETFT_STATUS.
+        """
+        with self.lock:
+            #   Samples overwritten before they were read are skipped.
+            first = max(self.cursor, self.total - len(self.ring))
+            idx = np.arange(first, self.total) % len(self.ring)
+            samples = self.ring[idx]
+        if self.held is not None:
+            samples = np.concatenate([self.held, samples])
+            first -= 1
+        if len(samples) == 0:
+            return np.full((len(times), 6), np.nan), np.full(len(times), quality.NETFT_GAP, dtype=np.uint16)
+        held = np.searchsorted(samples["time"], times, side='right') - 1
+        valid = held >= 0
+        valid[valid] = times[valid] - samples["time"][held[valid]] <= self.maxAge
+        rows = samples[np.maximum(held, 0)]
+        raw = np.where(valid[:, None], rows["values"], np.nan)
+        lost = rows["lost"]
+        previous = self.held["lost"][0] if self.held is not None else (lost[0] if len(lost) else 0)
+        flags = np.where(valid, 0, quality.NETFT_GAP).astype(np.uint16)
+        flags[valid & (np.diff(lost, prepend=previous) > 0)] |= quality.NETFT_LOST
+        flags[valid & (rows["status"] != 0)] |= quality.NETFT_STATUS
+        if len(times) and held[-1] >= 0:
+            self.held = samples[held[-1]:held[-1] + 1].copy()
+            self.cursor = first + held[-1] + 1
+        return raw, flags
+
+    def drain(self):
+        """Returns every sample received since the last call, oldest first,
+        in raw counts. It never waits.
+        """
+        with self.lock:
+            first = max(self.drained, self.total - len(self.ring))
+            self.overruns += first - self.drained
+            samples = self.ring[np.arange(first, self.total) % len(self.ring)]
+            self.drained = self.total
+        return samples
+
+    def stats(self):
+        """Counters of the stream: datagrams and samples received, records
+        lost, samples overwritten before they were drained, samples with a
+        status error, start requests sent, age of the last datagram in
+        seconds and the last socket error.
+        """
+        return {
+            "address": f"{self.address[0]}:{self.address[1]}",
+            "rate": self.rate,
+            "running": self.running,
+            "streaming": self.isStreaming(),
+            "datagrams": self.datagrams,
+            "samples": self.total,
+            "lost": self.lost,
+            "overruns": self.overruns,
+            "statusErrors": self.statusErrors,
+            "requests": self.requests,
+            "age": time.time() - self.lastData if self.lastData is not None else None,
+            "error": str(self.error) if self.error is not None else None}
@@ -0,0 +1,188 @@
+#   BOUNDED QUEUES BETWEEN THE ACQUISITION AND ITS CONSUMERS
+#
+#   The acquisition thread hands every batch of rows to its consumers (the
+#   recorder, live subscribers) through a `BoundedQueue`, so a slow consumer
+#   never stalls the device reads. What happens when a queue is full is
+#   decided per consumer:
+#
+#       block         put() waits for room. Lossless, but it stalls the
+#                     producer: only for consumers whose producer may wait.
+#       drop-oldest   the oldest rows are discarded to make room.
+#       decimate      every other queued row is discarded and the incoming
+#                     rows are thinned at the same stride, so the consumer
+#                     still sees the whole time span at a lower rate. The
+#                     stride goes back to 1 once the consumer catches up.
+#
+#   Every discarded row is counted. Batches are lists of rows or numpy
+#   arrays of rows (see `batch.py`); a `get()` of arrays returns one array.
+
+import threading
+from collections import deque
+import numpy as np
+
+
+POLICIES = ("block", "drop-oldest", "decimate")
+
+
+class BoundedQueue():
+    """
+    A queue of row batches bounded by a number of rows.
+
+    ...
+
+    Attributes
+    ----------
+    name: str
+        name of the consumer, used in the statistics.
+    capacity: int
+        maximum number of queued rows.
+    policy: str
+        one of `POLICIES`.
+    size: int
+        rows currently queued.
+    dropped: int
+        rows discarded by drop-oldest.
+    decimated: int
+        rows discarded by decimate.
+    """
+
+    def __init__(self, name, capacity, policy="drop-oldest"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}'. Use one of {', '.join(POLICIES)}")
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.name = name
+        self.capacity = capacity
+        self.policy = policy
+        self.batches = deque()
+        self.size = 0
+        self.maxSize = 0
+        self.puts = 0
+        self.rows = 0
+        self.dropped = 0
+        self.decimated = 0
+        self.stride = 1
+        self.phase = 0
+        self.closed = False
+        self.busy = False
+        self.condition = threading.Condition()
+
+    def put(self, rows, timeout=None):
+        """Queues a batch of rows. Only the block policy may wait.
+
+        Params
+        ------
+        rows: list
+            the rows of the batch.
+        timeout: float
+            maximum wait of the block policy, None to wait forever.
+
+        Returns
+        -------
+        bool
+            False if the block policy timed out and the batch was not queued.
+        """
+        if len(rows) == 0:
+            return True
+        with self.condition:
+            self.puts += 1
+            self.rows += len(rows)
+            if self.policy == "block":
+                if not self.condition.wait_for(lambda: self.size + len(rows) <= self.capacity or self.size == 0 or self.closed, timeout):
+                    return False
+            elif self.policy == "decimate":
+                rows = self.thin(rows)
+            self.batches.append(rows)
+            self.size += len(rows)
+            if self.policy == "drop-oldest":
+                while self.size > self.capacity:
+                    self.dropOldest()
+            self.maxSize = max(self.maxSize, self.size)
+            self.condition.notify_all()
+            return True
+
+    def dropOldest(self):
+        excess = self.size - self.capacity
+        oldest = self.batches[0]
+        if len(oldest) <= excess:
+            self.batches.popleft()
+            removed = len(oldest)
+        else:
+            self.batches[0] = oldest[excess:]
+            removed = excess
+        self.size -= removed
+        self.dropped += removed
+
+    def thin(self, rows):
+        """Applies the current stride to the incoming rows, doubling it while
+        the queue would overflow.
+        """
+        while self.size + (len(rows) + self.stride - 1) // self.stride > self.capacity and self.stride < 2 ** 20:
+            self.stride *= 2
+            self.phase = 0
+            kept = deque(batch[::2] for batch in self.batches)
+            size = sum(len(batch) for batch in kept)
+            self.decimated += self.size - size
+            self.batches = deque(batch for batch in kept if len(batch))
+            self.size = size
+        start = (-self.phase) % self.stride
+        kept = rows[start::self.stride]
+        self.phase = (self.phase + len(rows)) % self.stride
+        self.decimated += len(rows) - len(kept)
+        return kept
+
+    def get(self, timeout=None):
+        """Takes every queued row. The consumer calls `done()` once they
+        are processed.
+
+        Params
+        ------
+        timeout: float
+            maximum wait for rows, None to wait forever.
+
+        Returns
+        -------
+        list or numpy.ndarray
+            the rows in order, empty if the wait timed out or the queue is closed.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.size > 0 or self.closed, timeout):
+                return []
+            if self.batches and isinstance(self.batches[0], np.ndarray):
+                rows = self.batches[0] if len(self.batches) == 1 else np.concatenate(self.batches)
+            else:
+                rows = [row for batch in self.batches for row in batch]
+            self.batches.clear()
+            self.size = 0
+            self.busy = len(rows) > 0
+            if self.policy == "decimate" and self.stride > 1:
+                #   The consumer caught up: go back towards the full rate.
+                self.stride //= 2
+                self.phase = 0
+            self.condition.notify_all()
+            return rows
+
+    def done(self):
+        """Marks the rows of the last `get()` as processed.
+        """
+        with self.condition:
+            self.busy = False
+            self.condition.notify_all()
+
+    def waitEmpty(self, timeout=None):
+        """Waits until the consumer has processed every queued row.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: (self.size == 0 and not self.busy) or self.closed, timeout)
+
+    def close(self):
+        """Wakes up every waiting producer and consumer.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def stats(self):
+        return {"name": self.name, "policy": self.policy, "capacity": self.capacity, "size": self.size,
+                "maxSize": self.maxSize, "puts": self.puts, "rows": self.rows, "dropped": self.dropped,
+                "decimated": self.decimated, "stride": self.stride}
@@ -0,0 +1,105 @@
+#   ON-DEMAND SAMPLING PROFILER
+#
+#   Samples the stack of every thread of the running process (request
+#   handlers, acquisition, device and real-time threads) at a fixed interval
+#   with `sys._current_frames()`. Nothing is installed in the interpreter, so
+#   there is no overhead at all when it is not running, and the overhead while
+#   it runs only depends on the sampling interval.
+#
+#   Output formats:
+#       collapsed   one `thread;frame;frame;... count` line per stack, the
+#                   input format of flamegraph.pl and speedscope.
+#       top         functions sorted by the samples in which they are running
+#                   (self) and on the stack (total), like the pstats report.
+
+import sys, threading, time
+from collections import Counter
+
+
+class SamplingProfiler():
+    """
+    Samples the stacks of all the threads for a number of seconds.
+
+    ...
+
+    Attributes
+    ----------
+    interval: float
+        seconds between two samples.
+    stacks: collections.Counter
+        (thread name, frames from the outermost to the innermost) -> samples.
+    samples: int
+        number of samples taken.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def frameName(frame):
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '?')
+        return f"{module}:{code.co_name}:{code.co_firstlineno}"
+
+    def sample(self, ignore):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == ignore:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.frameName(frame))
+                frame = frame.f_back
+            self.stacks[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+        self.samples += 1
+
+    def run(self, seconds, interval=None):
+        """Samples every thread but the calling one for `seconds` seconds,
+        every `interval` seconds (default `self.interval`). Only one profile
+        runs at a time.
+        """
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            self.interval = interval or self.interval
+            self.stacks = Counter()
+            self.samples = 0
+            me = threading.get_ident()
+            start = time.monotonic()
+            deadline = start + seconds
+            due = start
+            while due < deadline:
+                self.sample(me)
+                due += self.interval
+                time.sleep(max(0, due - time.monotonic()))
+            self.elapsed = time.monotonic() - start
+        finally:
+            self.lock.release()
+
+    def collapsed(self):
+        """Returns the stacks in the collapsed format of flamegraph.pl.
+        """
+        lines = [";".join((thread,) + stack) + f" {count}"
+                 for (thread, stack), count in self.stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def top(self, limit=50):
+        """Returns the functions sorted by self samples, as a text table.
+        """
+        own = Counter()
+        total = Counter()
+        for (_, stack), count in self.stacks.items():
+            if stack:
+                own[stack[-1]] += count
+            for name in set(stack):
+                total[name] += count
+        lines = [f"{self.samples} samples in {self.elapsed:.2f} s, every {self.interval * 1000:g} ms",
+                 "", f"{'self':>8} {'self %':>7} {'total':>8} {'total %':>7}  function"]
+        for name, count in own.most_common(limit):
+            lines.append(f"{count:8d} {100 * count / self.samples:7.1f} {total[name]:8d} "
+                         f"{100 * total[name] / self.samples:7.1f}  {name}")
+        return "\n".join(lines) + "\n"
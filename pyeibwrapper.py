@@ -1,11 +1,78 @@
 #   A PYTHON WRAPPER FOR THE EIB7.DLL C LIBRARY
 
 import ctypes
+import struct
 import time
 from sys import getsizeof
+import numpy as np
 from pystructs import DataPacketSection
 
 
+#   Error code returned by EIB7ReadFIFOData when the FIFO has overflowed.
+FIFO_OVERFLOW = -1610612717
+
+#   Axes of the EIB741, in region order (axis region 1 to 4).
+AXES = ("ax", "ay", "az", "aw")
+
+#   Data packet item of every field type of an axis region (see `addDataPacketSection()`):
+#   2 -> status word, 4 -> position, 8 -> timestamp. Region 0 only holds the trigger counter (1).
+FIELD_ITEMS = {1: 0x0001, 2: 0x0002, 4: 0x0004, 8: 0x0008}
+STRUCT_CODES = {'<u2': 'H', '<u4': 'I', '<i8': 'q'}
+
+
+def packetFields(axes=AXES):
+    """Returns the fields of a data packet with the positions of `axes`:
+    (name, region, field type, dtype). The trigger counter is in the global
+    region and the timestamp and the status word in the region of the first axis.
+
+    Params
+    ------
+    axes: list
+        names of the axes, from `AXES`. They are put in region order.
+
+    Returns
+    -------
+    tuple
+        the fields, in packet order.
+    """
+    for axis in axes:
+        if axis not in AXES:
+            raise ValueError(f"Unknown axis '{axis}'. Available axes: {', '.join(AXES)}")
+    axes = [axis for axis in AXES if axis in axes]
+    if not axes:
+        raise ValueError("At least one axis is needed")
+    first = AXES.index(axes[0]) + 1
+    return (("trigger", 0, 1, '<u2'), ("timestamp", first, 8, '<u4'), ("status", first, 2, '<u2')) + \
+        tuple((axis, AXES.index(axis) + 1, 4, '<i8') for axis in axes)
+
+
+def entryDtype(fields):
+    """Returns the numpy dtype of the decoded entries of a packet with `fields`.
+    """
+    return np.dtype([(name, dtype) for name, _, _, dtype in fields])
+
+
+#   Fields decoded from the FIFO entries with every axis in the packet: (name,
+#   region, field type, dtype). The configured packet is `PyEIBWrapper.fields`.
+ENTRY_FIELDS = packetFields()
+ENTRY_DTYPE = entryDtype(ENTRY_FIELDS)
+
+
+class EIBError(Exception):
+    """
+    Raised when a call to the eib7.dll library fails.
+
+    Attributes
+    ----------
+    code: int
+        the error code returned by the library.
+    """
+
+    def __init__(self, code, message=None):
+        self.code = code
+        super().__init__(message or f"EIB7 error code {code}")
+
+
 class PyEIBWrapper():
     """
     A python wrapper for the eib7.dll C library.
@@ -63,6 +130,16 @@ class PyEIBWrapper():
         pointer to a data field
     sz: unsigned long
         size of a data field
+    trigger: int
+        trigger counter of the last entry read by `readData()`.
+    overflows: int
+        number of FIFO overflows (and FIFO clears) since the wrapper was created.
+    axes: tuple
+        axes in the data packet, see `selectAxes()`.
+    fields: tuple
+        fields of the data packet (see `packetFields()`).
+    dtype: numpy.dtype
+        dtype of the decoded entries.
 
 
     Methods
@@ -100,6 +177,9 @@ class PyEIBWrapper():
         self.entries = ctypes.c_ulong()
         self.field = ctypes.c_void_p()
         self.sz = ctypes.c_ulong()
+        self.trigger = None
+        self.overflows = 0
+        self.selectAxes(AXES)
 
     def getHostIp(self):
         """It converts the IP string into a decimal representation.
@@ -177,9 +257,8 @@ class PyEIBWrapper():
         ]
         for x in positions:
             if type(x) is not int or x > 3 or x < 0:
-                print(
+                raise ValueError(
                     "Invalid input arguments. Positions should be integers between 0 and 3")
-                exit(0x60000009)
             else:
                 err = self.lib.EIB7InitAxis(
                     self.axis[x], one, zero, zero, zero, zero, zero, zero, one, zero, zero, zero, zero)
@@ -298,16 +377,21 @@ class PyEIBWrapper():
         self.lib.EIB7GetTimestampTicks.restype = ctypes.c_uint
         return self.lib.EIB7GetTimestampTicks(self.eib, ctypes.byref(self.timestampTicks))
 
-    def setTimestampPeriod(self):
+    def setTimestampPeriod(self, period=None):
         """Set the Timestamp period in clock ticks. 
 
+        Params
+        ------
+        period: int
+            timestamp period in microseconds. Default is `self.TIMESTAMP_PERIOD`.
+
         Returns
         -------
         unsigned int
             Error code. If it is successful it would return NO_ERROR = 0.
         """
         self.timestampPeriod = ctypes.c_ulong(
-            self.timestampTicks.value * self.TIMESTAMP_PERIOD)
+            self.timestampTicks.value * (period or self.TIMESTAMP_PERIOD))
         self.lib.EIB7SetTimestampPeriod.argtypes = [
             ctypes.c_int, ctypes.c_ulong]
         self.lib.EIB7SetTimestampPeriod.restype = ctypes.c_uint
@@ -336,18 +420,16 @@ class PyEIBWrapper():
         self.lib.EIB7SetTimestamp.argtypes = [ctypes.c_int, ctypes.c_int]
         self.lib.EIB7SetTimestamp.restype = ctypes.c_uint
         if enable != 0 and enable != 1:
-            print("Input error. Enable should be 1(enable) or 0(disable)")
-            exit(1)
+            raise ValueError("Input error. Enable should be 1(enable) or 0(disable)")
         for x in positions:
             if type(x) is not int or x > 3 or x < 0:
-                print("Input error. Positions should be integers between 3 and 0")
-                exit(1)
+                raise ValueError("Input error. Positions should be integers between 3 and 0")
             err = self.lib.EIB7SetTimestamp(self.axis[x], ctypes.c_int(enable))
             if err != 0:
                 return err
         return 0
 
-    def addDataPacketSection(self, region, items):
+    def addDataPacketSection(self, region, items, index=None):
         """Configures a section of the data packet configuration.
 
         Params
@@ -358,6 +440,8 @@ class PyEIBWrapper():
                 1,2,3 -> each axis region
         items: int
             items to be added into the packet's region
+        index: int
+            position of the section in the packet. Default is `region`.
 
         Returns
         -------
@@ -365,19 +449,23 @@ class PyEIBWrapper():
             Error code. If it is successful it would return NO_ERROR = 0.
         """
         if type(region) is not int or region > 4 or region < 0:
-            print(
+            raise ValueError(
                 "Input error. Region is not correct. It must be an integer between 0 and four")
-            exit(1)
 
         self.lib.EIB7AddDataPacketSection.argtypes = [
             (DataPacketSection*5), ctypes.c_int, ctypes.c_int, ctypes.c_int]
         self.lib.EIB7AddDataPacketSection.restype = ctypes.c_uint
-        return self.lib.EIB7AddDataPacketSection(self.packet, region, region, items)
+        return self.lib.EIB7AddDataPacketSection(self.packet, region if index is None else index, region, items)
 
-    def configDataPacket(self):
+    def configDataPacket(self, size=5):
         """Configures the data packet for the operation modes 
         "Soft Realtime", "Recording", "Streaming".
 
+        Params
+        ------
+        size: int
+            number of sections of `self.packet` used.
+
         Returns
         -------
         unsigned int
@@ -386,7 +474,45 @@ class PyEIBWrapper():
         self.lib.EIB7ConfigDataPacket.argtypes = [
             ctypes.c_int, (DataPacketSection*5), ctypes.c_int]
         self.lib.EIB7ConfigDataPacket.restype = ctypes.c_uint
-        return self.lib.EIB7ConfigDataPacket(self.eib, self.packet, 5)
+        return self.lib.EIB7ConfigDataPacket(self.eib, self.packet, size)
+
+    def selectAxes(self, axes):
+        """Selects the axes of the data packet. It is used by the next
+        `configStreaming()` or `configMode()`.
+
+        Params
+        ------
+        axes: list
+            names of the axes, from `AXES`.
+        """
+        self.fields = packetFields(axes)
+        self.axes = tuple(name for name, region, _, _ in self.fields if region > 0 and name in AXES)
+        self.dtype = entryDtype(self.fields)
+        self.entryStruct = None
+
+    def axisPositions(self):
+        """Returns the positions (0 to 3) of the selected axes.
+        """
+        return [AXES.index(axis) for axis in self.axes]
+
+    def configPacket(self):
+        """Adds one section per region used by `self.fields`, with only the
+        items of its fields, and configures the data packet.
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        sections = {}
+        for _, region, tipo, _ in self.fields:
+            sections[region] = sections.get(region, 0) | FIELD_ITEMS[tipo]
+        self.packet = (DataPacketSection*5)()
+        for index, region in enumerate(sorted(sections)):
+            self.checkError(self.addDataPacketSection(region, ctypes.c_int(sections[region]), index))
+            print(f"[SYSTEM]: Region {region} data section added into the packet")
+        self.entryStruct = None
+        return self.configDataPacket(len(sections))
 
     def getTimerTriggerTicks(self):
         """Get the clock ticks per microsecond of the Timer Trigger timer.
@@ -402,16 +528,21 @@ class PyEIBWrapper():
         self.lib.EIB7GetTimerTriggerTicks.restype = ctypes.c_uint
         return self.lib.EIB7GetTimerTriggerTicks(self.eib, ctypes.byref(self.timerTicks))
 
-    def setTimerTriggerPeriod(self):
+    def setTimerTriggerPeriod(self, period=None):
         """Set the Timer Trigger period in clock ticks.
 
+        Params
+        ------
+        period: int
+            trigger period in microseconds. Default is `self.TRIGGER_PERIOD`.
+
         Returns
         -------
         unsigned int
             Error code. If it is successful it would return NO_ERROR = 0.
         """
         self.timerPeriod = ctypes.c_ulong(
-            self.TRIGGER_PERIOD*self.timerTicks.value)
+            (period or self.TRIGGER_PERIOD)*self.timerTicks.value)
         self.lib.EIB7SetTimerTriggerPeriod.argtypes = [
             ctypes.c_int, ctypes.c_ulong]
         self.lib.EIB7SetTimerTriggerPeriod.restype = ctypes.c_uint
@@ -438,8 +569,7 @@ class PyEIBWrapper():
         self.lib.EIB7AxisTriggerSource.restype = ctypes.c_uint
         for x in positions:
             if type(x) is not int or x > 3 or x < 0:
-                print("Input error. Positions should be integers between 3 and 0")
-                exit(1)
+                raise ValueError("Input error. Positions should be integers between 3 and 0")
             err = self.lib.EIB7AxisTriggerSource(
                 self.axis[x], ctypes.c_int(12))
             if err != 0:
@@ -507,12 +637,17 @@ class PyEIBWrapper():
         self.lib.EIB7GlobalTriggerEnable.restype = ctypes.c_uint
         return self.lib.EIB7GlobalTriggerEnable(self.eib, ctypes.c_int(enable), ctypes.c_long(source))
 
-    def readFIFOData(self):
+    def readFIFOData(self, timeout=200):
         """Copy data from the soft-realtime FIFO to destination memory. If the FIFO contains less
         than cnt entries only the available entries will be copied. The functions waits for at
         least one entry if none are available, but for max. timeout ms. This function converts the
         6-Byte raw encoder positions into 8-Byte ENCODER_POSITION values.
 
+        Params
+        ------
+        timeout: int
+            maximum wait in ms. 0 returns straight away.
+
         Returns
         -------
         int
@@ -527,7 +662,7 @@ class PyEIBWrapper():
             ctypes.c_int
         ]
         self.lib.EIB7ReadFIFOData.restype = ctypes.c_int
-        return self.lib.EIB7ReadFIFOData(self.eib, self.udpData, ctypes.c_int(1), ctypes.byref(self.entries), ctypes.c_int(200))
+        return self.lib.EIB7ReadFIFOData(self.eib, self.udpData, ctypes.c_int(1), ctypes.byref(self.entries), ctypes.c_int(timeout))
 
     def clearFIFO(self):
         """Clear all data currently in the soft-realtime FIFO.
@@ -569,9 +704,15 @@ class PyEIBWrapper():
         self.lib.EIB7GetDataFieldPtr.restype = ctypes.c_uint
         return self.lib.EIB7GetDataFieldPtr(self.eib, self.udpData, region, tipo, ctypes.byref(self.field), ctypes.byref(self.sz))
 
-    def configStreaming(self):
+    def configStreaming(self, axes=None):
         """Megawrapper to init the soft-realtime streaming mode. It configs the 
-        eib741 to start streaming data of all the axis. 
+        eib741 to start streaming data of the selected axes.
+
+        Params
+        ------
+        axes: list
+            names of the streamed axes (see `selectAxes()`). Default keeps
+            the current selection.
 
         Returns
         -------
@@ -582,21 +723,17 @@ class PyEIBWrapper():
         print("[SYSTEM]: Timestamps gotten")
         self.checkError(self.setTimestampPeriod())
         print("[SYSTEM]: Timestamp period set")
-        self.checkError(self.setTimestamp([0, 1, 2, 3], 1))
+        if axes is not None:
+            self.selectAxes(axes)
+        self.checkError(self.setTimestamp(self.axisPositions(), 1))
         print("[SYSTEM]: Timestamp set")
-        self.checkError(self.addDataPacketSection(0, 1))
-        print("[SYSTEM]: Global data section added into the packet")
-        items = ctypes.c_int(0x0002 | 0x0004 | 0x0008)
-        for x in range(1, 5):
-            self.checkError(self.addDataPacketSection(x, items))
-            print(f"[SYSTEM]: Axis {x} data section added into the packet")
-        self.checkError(self.configDataPacket())
-        print("[SYSTEM]: Data packet configured.")
+        self.checkError(self.configPacket())
+        print(f"[SYSTEM]: Data packet configured with axes {', '.join(self.axes)}.")
         self.checkError(self.getTimerTriggerTicks())
         print("[SYSTEM]: Timer trigger ticks gotten.")
         self.checkError(self.setTimerTriggerPeriod())
         print("[SYSTEM]: Timer trigger period set.")
-        self.checkError(self.axisTriggerSource([0, 1, 2, 3]))
+        self.checkError(self.axisTriggerSource(self.axisPositions()))
         print("[SYSTEM]: Axis trigger source configured.")
         self.checkError(self.masterTriggerSource())
         print("[SYSTEM]: Master trigger source cnfigured.")
@@ -606,6 +743,383 @@ class PyEIBWrapper():
         print("[SYSTEM]: Global trigger enabled")
         return 0
 
+######## END OF THE STREAMING METHODS. STARTING WITH RECORDING METHODS ########
+
+    def sizeOfFIFOEntry(self):
+        """Get the size in bytes of one FIFO entry with the configured data packet.
+        The value is stored at `self.entrySize`.
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        self.entrySize = ctypes.c_ulong()
+        self.lib.EIB7SizeOfFIFOEntry.argtypes = [
+            ctypes.c_int, ctypes.POINTER(ctypes.c_ulong)]
+        self.lib.EIB7SizeOfFIFOEntry.restype = ctypes.c_uint
+        return self.lib.EIB7SizeOfFIFOEntry(self.eib, ctypes.byref(self.entrySize))
+
+    def fifoEntryCount(self):
+        """Get the number of entries waiting in the FIFO.
+        The value is stored at `self.fifoEntries`.
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        self.fifoEntries = ctypes.c_ulong()
+        self.lib.EIB7FIFOEntryCount.argtypes = [
+            ctypes.c_int, ctypes.POINTER(ctypes.c_ulong)]
+        self.lib.EIB7FIFOEntryCount.restype = ctypes.c_uint
+        return self.lib.EIB7FIFOEntryCount(self.eib, ctypes.byref(self.fifoEntries))
+
+    def getRecordingMemSize(self):
+        """Get the size in bytes of the recording memory of the EIB.
+        The value is stored at `self.recordingMemSize`.
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        self.recordingMemSize = ctypes.c_ulong()
+        self.lib.EIB7GetRecordingMemSize.argtypes = [
+            ctypes.c_int, ctypes.POINTER(ctypes.c_ulong)]
+        self.lib.EIB7GetRecordingMemSize.restype = ctypes.c_uint
+        return self.lib.EIB7GetRecordingMemSize(self.eib, ctypes.byref(self.recordingMemSize))
+
+    def getRecordingStatus(self):
+        """Get the amount of data recorded (bytes) and the progress of the
+        transfer (percent). Values are stored at `self.recordingLength` and
+        `self.recordingProgress`.
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        self.recordingLength = ctypes.c_ulong()
+        self.recordingProgress = ctypes.c_ulong()
+        self.lib.EIB7GetRecordingStatus.argtypes = [
+            ctypes.c_int, ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong)]
+        self.lib.EIB7GetRecordingStatus.restype = ctypes.c_uint
+        return self.lib.EIB7GetRecordingStatus(self.eib, ctypes.byref(self.recordingLength), ctypes.byref(self.recordingProgress))
+
+    def transferRecordingData(self, enable):
+        """Starts or stops the transfer of the recording memory into the FIFO.
+
+        Params
+        ------
+        enable: int
+            1 -> start the transfer
+            0 -> stop the transfer
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        self.lib.EIB7TransferRecordingData.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.lib.EIB7TransferRecordingData.restype = ctypes.c_uint
+        return self.lib.EIB7TransferRecordingData(self.eib, ctypes.c_int(enable))
+
+    def readFIFOBlock(self, data, count):
+        """Copies up to `count` entries from the FIFO into `data`. Unlike
+        `readFIFOData()` it does not wait for data.
+
+        Params
+        ------
+        data: ctypes array
+            destination buffer of at least `count * self.entrySize` bytes.
+        count: int
+            maximum number of entries to be copied.
+
+        Returns
+        -------
+        int
+            Error code. If it is successful it would return NO_ERROR = 0.
+            The number of entries copied is stored at `self.entries`.
+        """
+        self.lib.EIB7ReadFIFOData.argtypes = [
+            ctypes.c_int,
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.c_int
+        ]
+        self.lib.EIB7ReadFIFOData.restype = ctypes.c_int
+        return self.lib.EIB7ReadFIFOData(self.eib, ctypes.addressof(data), ctypes.c_int(count), ctypes.byref(self.entries), ctypes.c_int(0))
+
+    def fieldOffsets(self, data):
+        """Looks up once where every field of `self.fields` is inside an entry,
+        so a whole block of entries can be decoded without calling the DLL per field.
+
+        Params
+        ------
+        data: ctypes array
+            buffer holding at least one entry.
+
+        Returns
+        -------
+        dict
+            field name -> offset in bytes from the start of the entry.
+        """
+        self.lib.EIB7GetDataFieldPtr.argtypes = [
+            ctypes.c_int,
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_ulong)
+        ]
+        self.lib.EIB7GetDataFieldPtr.restype = ctypes.c_uint
+        offsets = {}
+        for name, region, tipo, _ in self.fields:
+            self.checkError(self.lib.EIB7GetDataFieldPtr(
+                self.eib, ctypes.addressof(data), region, tipo, ctypes.byref(self.field), ctypes.byref(self.sz)))
+            offsets[name] = self.field.value - ctypes.addressof(data)
+        return offsets
+
+    def configMode(self, mode, period):
+        """Megawrapper to init a triggered mode other than streaming. The data
+        packet is the one of `configStreaming()` (`self.fields`) and the
+        timestamps are in microseconds. The trigger is enabled when this call returns.
+
+        Params
+        ------
+        mode: int
+            operation mode, see `selectMode()`.
+        period: int
+            trigger period in microseconds.
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        if type(period) is not int or period < 1:
+            raise ValueError("Input error. Period should be a positive integer (microseconds)")
+        self.checkError(self.getTimestampTicks())
+        self.checkError(self.setTimestampPeriod(1))
+        self.checkError(self.setTimestamp(self.axisPositions(), 1))
+        self.checkError(self.configPacket())
+        self.checkError(self.sizeOfFIFOEntry())
+        self.checkError(self.getTimerTriggerTicks())
+        self.checkError(self.setTimerTriggerPeriod(period))
+        self.checkError(self.axisTriggerSource(self.axisPositions()))
+        self.checkError(self.masterTriggerSource())
+        self.checkError(self.selectMode(mode))
+        print(f"[SYSTEM]: Mode {mode} selected. Trigger period {period} us.")
+        self.checkError(self.globalTriggerEnable(1, 2048))
+        print("[SYSTEM]: Global trigger enabled")
+        return 0
+
+    def configRecording(self, mode=3, period=20):
+        """Megawrapper to init a recording mode. The entries are stored in the
+        memory of the EIB at the timer trigger rate instead of being sent one
+        by one. The recording starts when this call returns.
+
+        Params
+        ------
+        mode: int
+            3 -> recording single (stops when the memory is full)
+            4 -> recording roll (keeps the last entries until it is stopped)
+        period: int
+            trigger period in microseconds.
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        if mode != 3 and mode != 4:
+            raise ValueError("Input error. Mode should be 3 (recording single) or 4 (recording roll)")
+        self.checkError(self.getRecordingMemSize())
+        return self.configMode(mode, period)
+
+    def waitRecording(self, timeout, stop=None):
+        """Waits until the recording memory is full, `timeout` seconds have
+        passed or `stop` is set, and then stops the trigger.
+
+        Params
+        ------
+        timeout: float
+            maximum recording time in seconds.
+        stop: threading.Event
+            optional event that ends the recording when it is set.
+
+        Returns
+        -------
+        int
+            bytes recorded.
+        """
+        entrySize = self.entrySize.value
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not (stop is not None and stop.is_set()):
+            self.checkError(self.getRecordingStatus())
+            if self.recordingLength.value + entrySize > self.recordingMemSize.value:
+                break
+            time.sleep(0.005)
+        self.checkError(self.globalTriggerEnable(0, -1))
+        self.checkError(self.getRecordingStatus())
+        print(f"[SYSTEM]: Recording stopped. {self.recordingLength.value} bytes recorded.")
+        return self.recordingLength.value
+
+    def downloadRecording(self, batch=4096, timeout=5):
+        """Transfers the recording memory and decodes it in blocks of `batch` entries.
+        The field offsets are looked up on the first block only and every block
+        is decoded with numpy.
+
+        Params
+        ------
+        batch: int
+            maximum number of entries read from the FIFO at once.
+        timeout: float
+            seconds without any new entry before a stalled transfer is given
+            up with an `EIBError` (code -1).
+
+        Returns
+        -------
+        numpy.ndarray
+            one `self.dtype` record per entry.
+        """
+        entrySize = self.entrySize.value
+        data = (ctypes.c_ubyte*(batch*entrySize))()
+        view = np.frombuffer(data, dtype=np.uint8).reshape(batch, entrySize)
+        offsets = None
+        blocks = []
+        self.checkError(self.transferRecordingData(1))
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                self.checkError(self.fifoEntryCount())
+                if self.fifoEntries.value == 0:
+                    self.checkError(self.getRecordingStatus())
+                    self.checkError(self.fifoEntryCount())
+                    if self.fifoEntries.value == 0 and self.recordingProgress.value >= 100:
+                        break
+                    if time.monotonic() > deadline:
+                        raise EIBError(-1, f"Recording transfer stalled at {self.recordingProgress.value} % "
+                                           f"with no entry for {timeout} s")
+                    time.sleep(0.001)
+                    continue
+                deadline = time.monotonic() + timeout
+                res = self.readFIFOBlock(data, min(batch, self.fifoEntries.value))
+                if res != 0:
+                    raise EIBError(res, f"EIB7ReadFIFOData failed with error code {res}")
+                count = self.entries.value
+                if count == 0:
+                    continue
+                if offsets is None:
+                    offsets = self.fieldOffsets(data)
+                block = np.empty(count, dtype=self.dtype)
+                for name, _, _, dtype in self.fields:
+                    size = np.dtype(dtype).itemsize
+                    block[name] = view[:count, offsets[name]:offsets[name] + size].copy().view(dtype)[:, 0]
+                blocks.append(block)
+        finally:
+            self.transferRecordingData(0)
+        entries = np.concatenate(blocks) if blocks else np.zeros(0, dtype=self.dtype)
+        print(f"[SYSTEM]: {len(entries)} recorded entries transferred.")
+        return entries
+
+    def captureBurst(self, mode=3, period=20, timeout=10, stop=None, batch=4096):
+        """Captures a burst with a recording mode: leaves any other mode, records
+        on the EIB at the trigger rate (faster than what streaming over the network
+        can sustain), then downloads and decodes the recording.
+        The EIB is left in polling mode.
+
+        Params
+        ------
+        mode: int
+            3 (recording single) or 4 (recording roll).
+        period: int
+            trigger period in microseconds.
+        timeout: float
+            maximum recording time in seconds.
+        stop: threading.Event
+            optional event that ends the recording when it is set.
+        batch: int
+            entries read from the FIFO at once during the download.
+
+        Returns
+        -------
+        numpy.ndarray
+            one `self.dtype` record per entry.
+        """
+        self.globalTriggerEnable(0, -1)
+        self.checkError(self.selectMode(0))
+        self.configRecording(mode, period)
+        self.waitRecording(timeout, stop)
+        try:
+            return self.downloadRecording(batch)
+        finally:
+            self.selectMode(0)
+
+######## END OF THE RECORDING METHODS. STARTING WITH SOFT REAL-TIME METHODS ########
+
+    def configSoftRealtime(self, period=1000):
+        """Megawrapper to init the soft real-time mode: the EIB sends one entry
+        per trigger and `readLatest()` returns the newest one. Leaves any other
+        mode first.
+
+        Params
+        ------
+        period: int
+            trigger period in microseconds.
+
+        Returns
+        -------
+        unsigned int
+            Error code. If it is successful it would return NO_ERROR = 0.
+        """
+        self.globalTriggerEnable(0, -1)
+        self.checkError(self.selectMode(0))
+        self.latestData = (ctypes.c_ubyte*(64*200))()
+        self.latestOffsets = None
+        err = self.configMode(1, period)
+        self.clearFIFO()
+        return err
+
+    def readLatest(self):
+        """Drains the FIFO without waiting and decodes only the newest entry.
+        The field offsets are looked up on the first entry only.
+
+        Returns
+        -------
+        tuple
+            status, ax, ay, az, aw, timestamp (microseconds) of the newest
+            entry, or None if no entry arrived since the last call. Axes
+            not in the packet are None.
+        """
+        entrySize = self.entrySize.value
+        count = len(self.latestData) // entrySize
+        last = None
+        while True:
+            res = self.readFIFOBlock(self.latestData, count)
+            if res == FIFO_OVERFLOW:
+                self.clearFIFO()
+                self.overflows += 1
+                break
+            elif res != 0:
+                raise EIBError(res, f"EIB7ReadFIFOData failed with error code {res}")
+            if self.entries.value == 0:
+                break
+            last = self.entries.value - 1
+            if self.latestOffsets is None:
+                self.latestOffsets = self.fieldOffsets(self.latestData)
+            values = {name: np.frombuffer(self.latestData, dtype=dtype, count=1,
+                                          offset=last * entrySize + self.latestOffsets[name])[0]
+                      for name, _, _, dtype in self.fields}
+            if self.entries.value < count:
+                break
+        if last is None:
+            return None
+        axes = [int(values[axis]) if axis in values else None for axis in AXES]
+        return (int(values["status"]), *axes, int(values["timestamp"]))
+
     def close(self):
         """Closes the connection to the EIB7 hardware. All former opened child handles (axis, I/O)
         are closed as well. 
@@ -632,46 +1146,64 @@ class PyEIBWrapper():
         self.selectMode(0)
         self.close()
 
-    def readData(self):
-        """Reads the position of every axis and the status word. 
+    def unpacker(self):
+        """Builds the struct that decodes an entry of `self.udpData` from the
+        field offsets, which are looked up once per packet configuration.
+
+        Returns
+        -------
+        struct.Struct
+            reads the fields in offset order, skipping the bytes in between.
+        list
+            field names in the order they are unpacked.
+        """
+        offsets = self.fieldOffsets(self.udpData)
+        dtypes = {name: dtype for name, _, _, dtype in self.fields}
+        names = sorted(offsets, key=offsets.get)
+        fmt, position = '<', 0
+        for name in names:
+            fmt += 'x' * (offsets[name] - position) + STRUCT_CODES[dtypes[name]]
+            position = offsets[name] + np.dtype(dtypes[name]).itemsize
+        return struct.Struct(fmt), names
+
+    def readData(self, timeout=200):
+        """Reads the position of the selected axes and the status word.
+        The entry is decoded with precomputed offsets (see `unpacker()`).
+        A FIFO overflow clears the FIFO, any other error raises an `EIBError`.
+
+        Params
+        ------
+        timeout: int
+            maximum wait for an entry in ms. 0 never waits.
 
         Returns
         -------
         list: int
-            status, posAx1, posAx2, posAx3, posAx4.
+            status, posAx1, posAx2, posAx3, posAx4, or None if no entry
+            arrived within `timeout`. Axes not in the packet are None.
         """
-        res = self.readFIFOData()
-        if res == -1610612717:
+        res = self.readFIFOData(timeout)
+        if res == FIFO_OVERFLOW:
             self.clearFIFO()
-        res = self.getDataFieldPtr(0, 1)
-        trigger = ctypes.cast(
-            self.field, ctypes.POINTER(ctypes.c_ushort)).contents
-        res = self.getDataFieldPtr(1, 8)
-        timestamp = ctypes.cast(
-            self.field, ctypes.POINTER(ctypes.c_ulong)).contents
-        res = self.getDataFieldPtr(1, 4)
-        posx = ctypes.cast(self.field, ctypes.POINTER(
-            ctypes.c_longlong)).contents
-        res = self.getDataFieldPtr(2, 4)
-        posy = ctypes.cast(self.field, ctypes.POINTER(
-            ctypes.c_longlong)).contents
-        res = self.getDataFieldPtr(3, 4)
-        posz = ctypes.cast(self.field, ctypes.POINTER(
-            ctypes.c_longlong)).contents
-        res = self.getDataFieldPtr(4, 4)
-        posw = ctypes.cast(self.field, ctypes.POINTER(
-            ctypes.c_longlong)).contents
-        res = self.getDataFieldPtr(1, 2)
-        status = ctypes.cast(
-            self.field, ctypes.POINTER(ctypes.c_ushort)).contents
-        return status.value, posx.value, posy.value, posz.value, posw.value
+            self.overflows += 1
+            return None
+        elif res != 0:
+            raise EIBError(res, f"EIB7ReadFIFOData failed with error code {res}")
+        if self.entries.value == 0:
+            return None
+        if self.entryStruct is None:
+            self.entryStruct = self.unpacker()
+        unpack, names = self.entryStruct
+        values = dict(zip(names, unpack.unpack_from(self.udpData)))
+        self.trigger = values["trigger"]
+        return values["status"], values.get("ax"), values.get("ay"), values.get("az"), values.get("aw")
 
 
 
     def checkError(self, err):
         """Checks the error code returned by any function of this class.
-        If it is not zero, a message with the error code is printed 
-        and the execution finishes. 
+        If it is not zero, a message with the error code is printed,
+        the connection is closed and an `EIBError` is raised.
 
         Params
         ------
@@ -683,7 +1215,7 @@ class PyEIBWrapper():
             self.globalTriggerEnable(0, -1)
             self.selectMode(0)
             self.close()
-            exit(1)
+            raise EIBError(err)
 
 
     def tare(self):
@@ -1,4 +1,5 @@
 import ctypes, time
+import numpy as np
 from ctypes import CDLL, byref, c_void_p, c_long,c_int, c_bool, c_char,c_char_p, c_double, POINTER, byref, create_string_buffer
 
 
@@ -16,6 +17,8 @@ class PyHBCWraperr:
         self.ty = c_double()
         self.tz = c_double()
         self.buf = ctypes.create_string_buffer(b'\0'*11)
+        self.block = np.zeros((7, 0))
+        self.deviceTimes = []
 
     
     def connect(self):  
@@ -32,6 +35,7 @@ class PyHBCWraperr:
         return self.lib.ClipX_SDOWrite(self.handle, index, subindex, value.encode('utf-8'))
 
     def startMeasurement(self):
+        self.deviceTimes = []
         self.lib.ClipX_startMeasurement.argtypes = [self.VOID]
         self.lib.ClipX_startMeasurement.restype = c_int
         return self.lib.ClipX_startMeasurement(self.handle)
@@ -61,6 +65,44 @@ class PyHBCWraperr:
         self.lib.ClipX_ReadNextBlock.restype = c_int
         self.lib.ClipX_ReadNextBlock(self.handle, 1, byref(self.time), byref(self.fx), byref(self.fy), byref(self.fz), byref(self.tx), byref(self.ty), byref(self.tz))
         return float(self.fx.value), float(self.fy.value), float(self.fz.value), float(self.tx.value), float(self.ty.value), float(self.tz.value)
+
+    def readBlock(self, count):
+        """Reads `count` lines with a single call. `count` must not be greater
+        than `availableLines()`. The destination arrays are reused between calls.
+        The device timestamps of the lines are kept for `takeDeviceTimes()`.
+
+        Returns
+        -------
+        numpy.ndarray
+            (count, 6) array of fx, fy, fz, tx, ty, tz in raw units.
+        """
+        if self.block.shape[1] < count:
+            self.block = np.zeros((7, max(count, 2 * self.block.shape[1])))
+        pointers = [self.block[i].ctypes.data_as(POINTER(c_double)) for i in range(7)]
+        self.lib.ClipX_ReadNextBlock.argtypes = [
+            self.VOID, 
+            c_int, 
+            POINTER(c_double),
+            POINTER(c_double),
+            POINTER(c_double),
+            POINTER(c_double),
+            POINTER(c_double),
+            POINTER(c_double),
+            POINTER(c_double),]
+        self.lib.ClipX_ReadNextBlock.restype = c_int
+        res = self.lib.ClipX_ReadNextBlock(self.handle, count, *pointers)
+        if res < 0:
+            raise ConnectionError(f"ClipX_ReadNextBlock failed with error code {res}")
+        self.deviceTimes.append(self.block[0, :count].copy())
+        return self.block[1:, :count].T.copy()
+
+    def takeDeviceTimes(self):
+        """Returns the device timestamps, in seconds, of the lines read with
+        `readBlock()` since the last call.
+        """
+        times = np.concatenate(self.deviceTimes) if self.deviceTimes else np.zeros(0)
+        self.deviceTimes = []
+        return times
         
 
 
@@ -0,0 +1,281 @@
+#   MULTI-RESOLUTION PYRAMID OF THE RECORDINGS
+#
+#   Next to every recording `netbox-data-X.csv` the recorder writes one file per
+#   level, `netbox-data-X.pyramid-<seconds>s.bin`, with the min, max and mean of
+#   every channel over consecutive buckets of <seconds> seconds. Records have a
+#   fixed size, so a time range is found with a binary search over a memory map
+#   and only the records inside the range are read. Levels written before the
+#   Net F/T channels were added have only the first `LEGACY_CHANNELS` channels
+#   and no channel count in their name: they are still read, with NaN for the
+#   channels they lack.
+#
+#   Usage: python pyramid.py data/netbox-data-X.csv    (builds the pyramid of an existing recording)
+
+import datetime, os, sys
+import numpy as np
+from csvimport import FILE_COLUMNS
+from samplebuffer import CHANNELS
+
+
+LEVELS = (1, 10, 60)
+DATE_FORMAT = "%d-%m-%Y-%H:%M:%S"
+LEGACY_CHANNELS = 9
+#   Field of every channel in a row of a recording, the date being field 0.
+CHANNEL_FIELDS = [1 + FILE_COLUMNS.index(channel) for channel in CHANNELS]
+
+
+def bucketDtype(channels):
+    return np.dtype([
+        ("start", "<f8"),
+        ("count", "<u4"),
+        ("offset", "<u8"),
+        ("min", "<f8", (channels,)),
+        ("max", "<f8", (channels,)),
+        ("mean", "<f8", (channels,)),
+    ])
+
+
+BUCKET_DTYPE = bucketDtype(len(CHANNELS))
+
+
+def levelPath(csvPath, seconds, channels=len(CHANNELS)):
+    """Returns the path of the pyramid level of `seconds` seconds of a recording,
+    for buckets of `channels` channels.
+    """
+    stem = csvPath[:-4] if csvPath.endswith('.csv') else csvPath
+    if channels == LEGACY_CHANNELS:
+        return f"{stem}.pyramid-{seconds}s.bin"
+    return f"{stem}.pyramid-{seconds}s-{channels}ch.bin"
+
+
+def hasLevel(csvPath, seconds):
+    """Returns True if the level of `seconds` seconds of a recording exists,
+    in the current or in the legacy format.
+    """
+    return any(os.path.isfile(levelPath(csvPath, seconds, channels)) for channels in (len(CHANNELS), LEGACY_CHANNELS))
+
+
+class PyramidLevel():
+    """
+    Aggregates rows into buckets of `seconds` seconds and appends every
+    closed bucket to its level file.
+
+    Attributes
+    ----------
+    seconds: int
+        bucket length.
+    bucket: int
+        number of the open bucket (start time // seconds), or None.
+    offset: int
+        byte offset in the recording of the first row of the open bucket.
+    """
+
+    def __init__(self, path, seconds):
+        self.seconds = seconds
+        self.file = open(path, 'ab')
+        self.bucket = None
+        self.reset()
+
+    def reset(self):
+        n = len(CHANNELS)
+        self.count = 0
+        self.offset = 0
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.sum = np.zeros(n)
+        self.valid = np.zeros(n)
+
+    def add(self, times, values, offsets):
+        """Adds a batch of rows.
+
+        Params
+        ------
+        times: numpy.ndarray
+            timestamps of the rows, in increasing order.
+        values: numpy.ndarray
+            one row per timestamp, one column per channel. NaN values are ignored.
+        offsets: numpy.ndarray
+            byte offset of every row in the recording.
+        """
+        ids = np.floor(times / self.seconds).astype(np.int64)
+        bounds = np.flatnonzero(np.diff(ids)) + 1
+        for a, b in zip(np.r_[0, bounds], np.r_[bounds, len(ids)]):
+            if ids[a] != self.bucket:
+                self.flush()
+                self.bucket = int(ids[a])
+                self.offset = int(offsets[a])
+            rows = values[a:b]
+            self.count += b - a
+            self.min = np.fmin(self.min, np.fmin.reduce(rows, axis=0))
+            self.max = np.fmax(self.max, np.fmax.reduce(rows, axis=0))
+            self.sum += np.nansum(rows, axis=0)
+            self.valid += np.sum(~np.isnan(rows), axis=0)
+
+    def flush(self):
+        """Writes the open bucket, if any.
+        """
+        if self.bucket is None or self.count == 0:
+            return
+        record = np.zeros(1, dtype=BUCKET_DTYPE)
+        empty = self.valid == 0
+        record["start"] = self.bucket * self.seconds
+        record["count"] = self.count
+        record["offset"] = self.offset
+        record["min"] = np.where(empty, np.nan, self.min)
+        record["max"] = np.where(empty, np.nan, self.max)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            record["mean"] = np.where(empty, np.nan, self.sum / self.valid)
+        self.file.write(record.tobytes())
+        self.reset()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class PyramidWriter():
+    """
+    Writes every level of the pyramid of one recording.
+    """
+
+    def __init__(self, csvPath, levels=LEVELS):
+        self.levels = [PyramidLevel(levelPath(csvPath, seconds), seconds) for seconds in levels]
+
+    def add(self, times, values, offsets):
+        for level in self.levels:
+            level.add(times, values, offsets)
+
+    def close(self):
+        for level in self.levels:
+            level.close()
+
+
+def readLevel(csvPath, seconds, start=None, end=None):
+    """Returns the buckets of one level that overlap [start, end].
+    Only the matching records are read from disk.
+    """
+    path, dtype = levelPath(csvPath, seconds), BUCKET_DTYPE
+    if not os.path.isfile(path) and os.path.isfile(levelPath(csvPath, seconds, LEGACY_CHANNELS)):
+        path, dtype = levelPath(csvPath, seconds, LEGACY_CHANNELS), bucketDtype(LEGACY_CHANNELS)
+    count = os.path.getsize(path) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=BUCKET_DTYPE)
+    records = np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+    first = 0 if start is None else max(0, int(np.searchsorted(records["start"], start, side='right')) - 1)
+    last = count if end is None else int(np.searchsorted(records["start"], end, side='right'))
+    if dtype == BUCKET_DTYPE:
+        return np.array(records[first:last])
+    buckets = np.zeros(last - first, dtype=BUCKET_DTYPE)
+    for name in ("start", "count", "offset"):
+        buckets[name] = records[name][first:last]
+    for name in ("min", "max", "mean"):
+        buckets[name] = np.nan
+        buckets[name][:, :LEGACY_CHANNELS] = records[name][first:last]
+    return buckets
+
+
+def parseRow(line):
+    """Parses one row of a recording. Returns (timestamp, values) or None.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    fields = line.split(';') if ';' in line else line.split(',')
+    try:
+        timestamp = datetime.datetime.strptime(fields[0], DATE_FORMAT).timestamp()
+    except ValueError:
+        return None
+    return timestamp, [float(fields[i]) if i < len(fields) and fields[i] else np.nan for i in CHANNEL_FIELDS]
+
+
+def readRaw(csvPath, start, end, offset=0):
+    """Reads the rows of a recording between `start` and `end`, starting
+    at the byte `offset`. Returns (times, values).
+    """
+    times = []
+    values = []
+    with open(csvPath, 'rb') as file:
+        file.seek(offset)
+        if offset == 0:
+            file.readline()
+        for line in file:
+            row = parseRow(line.decode('ascii', 'replace'))
+            if row is None:
+                continue
+            if row[0] > end:
+                break
+            if row[0] >= start:
+                times.append(row[0])
+                values.append(row[1])
+    return np.array(times), np.array(values).reshape(-1, len(CHANNELS))
+
+
+def query(csvPath, start=None, end=None, width=1000, levels=LEVELS):
+    """Returns the data of a recording between `start` and `end` to be drawn
+    `width` pixels wide. The coarsest level with at least one bucket per pixel
+    is used. If no level is fine enough, the raw rows are read starting at the
+    offset stored in the finest level.
+
+    Returns
+    -------
+    int
+        level used in seconds, 0 for raw rows.
+    numpy.ndarray
+        start time of every bucket (or timestamp of every row).
+    numpy.ndarray
+        min of every bucket and channel.
+    numpy.ndarray
+        max of every bucket and channel.
+    numpy.ndarray
+        mean of every bucket and channel.
+    """
+    finest = readLevel(csvPath, levels[0])
+    if len(finest) == 0:
+        return 0, np.zeros(0), *(np.zeros((0, len(CHANNELS))) for _ in range(3))
+    if start is None:
+        start = finest["start"][0]
+    if end is None:
+        end = finest["start"][-1] + levels[0]
+    resolution = (end - start) / max(1, width)
+    usable = [seconds for seconds in levels if seconds <= resolution]
+    if usable:
+        seconds = max(usable)
+        records = readLevel(csvPath, seconds, start, end)
+        return seconds, records["start"], records["min"], records["max"], records["mean"]
+    records = readLevel(csvPath, levels[0], start, start)
+    offset = int(records["offset"][0]) if len(records) > 0 else 0
+    times, values = readRaw(csvPath, start, end, offset)
+    return 0, times, values, values, values
+
+
+def build(csvPath, levels=LEVELS, chunkSize=10000):
+    """Builds the pyramid of an existing recording, reading it in chunks.
+    Existing level files are replaced.
+    """
+    for seconds in levels:
+        for channels in (len(CHANNELS), LEGACY_CHANNELS):
+            if os.path.exists(levelPath(csvPath, seconds, channels)):
+                os.remove(levelPath(csvPath, seconds, channels))
+    writer = PyramidWriter(csvPath, levels)
+    with open(csvPath, 'rb') as file:
+        position = len(file.readline())
+        times, values, offsets = [], [], []
+        for line in file:
+            row = parseRow(line.decode('ascii', 'replace'))
+            if row is not None:
+                times.append(row[0])
+                values.append(row[1])
+                offsets.append(position)
+            position += len(line)
+            if len(times) >= chunkSize:
+                writer.add(np.array(times), np.array(values), np.array(offsets))
+                times, values, offsets = [], [], []
+        if times:
+            writer.add(np.array(times), np.array(values), np.array(offsets))
+    writer.close()
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        build(path)
+        print(f"[SYSTEM]: Pyramid of {path} built")
@@ -0,0 +1,59 @@
+#   DATA QUALITY FLAGS
+#
+#   Every acquired row carries a sequence number and a quality bitfield.
+#   Sequence numbers are given by the acquisition engine and increase by one
+#   per row for the life of the process, so a consumer finds any missing row
+#   (a dropped queue batch, a decimated live feed) by comparing the first and
+#   last numbers of a batch. The bitfield tells what happened at the source.
+
+import numpy as np
+
+
+CLIPX_GAP = 0x0001          #   ClipX lost: forces and torques are NaN
+HEIDEN_GAP = 0x0002         #   EIB741 lost: positions are NaN
+CLIPX_OVERFLOW = 0x0004     #   the ClipX backlog reached the device buffer size, lines may be lost
+HEIDEN_OVERFLOW = 0x0008    #   the EIB741 FIFO overflowed and was cleared, or trigger counts were skipped
+HEIDEN_STATUS = 0x0010      #   error bits set in the EIB741 axis status word
+NETFT_GAP = 0x0020          #   Net F/T lost: its channels are NaN
+NETFT_LOST = 0x0040         #   Net F/T datagrams missing (RDT sequence jump)
+NETFT_STATUS = 0x0080       #   Net F/T status word is not zero
+
+FLAGS = {
+    "clipxGap": CLIPX_GAP,
+    "heidenGap": HEIDEN_GAP,
+    "clipxOverflow": CLIPX_OVERFLOW,
+    "heidenOverflow": HEIDEN_OVERFLOW,
+    "heidenStatus": HEIDEN_STATUS,
+    "netftGap": NETFT_GAP,
+    "netftLost": NETFT_LOST,
+    "netftStatus": NETFT_STATUS,
+}
+
+
+def names(flags):
+    """Returns the names of the flags set in `flags`.
+    """
+    return [name for name, bit in FLAGS.items() if flags & bit]
+
+
+def summary(seqs, flags):
+    """Checks a batch of rows in O(1) for missing rows and O(n) vectorized
+    for flags.
+
+    Params
+    ------
+    seqs: numpy.ndarray
+        sequence numbers of the rows, in order.
+    flags: numpy.ndarray
+        quality bitfield of the rows.
+
+    Returns
+    -------
+    dict
+        missing rows inside the batch, flags set in any row and rows flagged.
+    """
+    if len(seqs) == 0:
+        return {"missing": 0, "flags": [], "flagged": 0}
+    combined = int(np.bitwise_or.reduce(flags))
+    return {"missing": int(seqs[-1] - seqs[0] + 1 - len(seqs)), "flags": names(combined),
+            "flagged": int(np.count_nonzero(flags))}
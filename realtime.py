@@ -0,0 +1,185 @@
+#   SOFT REAL-TIME POSITION LOOP
+#
+#   Runs the EIB741 in soft real-time mode (mode 1) and polls it at a fixed
+#   period on a dedicated thread, for closed-loop use. The newest position is
+#   published in the `latest` slot and passed to an optional callback, so a
+#   controller in the same process gets it without going through the
+#   acquisition engine or HTTP. Wake-up latency, loop time and period jitter
+#   are measured on every cycle and reported by `stats()`.
+
+import os, sys, threading, time
+import numpy as np
+
+
+def raisePriority():
+    """Raises the priority of the calling thread as far as the OS allows.
+    Failures are ignored: the loop still runs at normal priority.
+
+    Returns
+    -------
+    bool
+        True if the priority was raised.
+    """
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            #   1 ms timer resolution for the sleeps (until `restorePriority()`), THREAD_PRIORITY_TIME_CRITICAL
+            ctypes.windll.winmm.timeBeginPeriod(1)
+            return bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 15))
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(50))
+        return True
+    except (AttributeError, OSError):
+        return False
+
+
+def restorePriority():
+    """Gives back the 1 ms timer resolution asked by `raisePriority()` on
+    Windows, which is system wide. The thread priority ends with the thread.
+    """
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            ctypes.windll.winmm.timeEndPeriod(1)
+    except (AttributeError, OSError):
+        pass
+
+
+class RealtimeLoop():
+    """
+    Polls the EIB741 in soft real-time mode at a fixed period.
+
+    ...
+
+    The loop keeps an absolute deadline on `time.monotonic()`, so the period
+    does not drift with the time spent reading. It sleeps until `spin`
+    seconds before the deadline and busy-waits the rest, trading CPU for a
+    lower wake-up jitter than `time.sleep()` alone.
+
+    Attributes
+    ----------
+    heiden: PyEIBWrapper
+        the EIB741 wrapper, already connected.
+    period: int
+        loop and trigger period in microseconds.
+    callback: callable
+        called in the loop thread with every new sample. It must be fast.
+    spin: float
+        seconds of busy wait before every deadline.
+    latest: tuple
+        newest (status, ax, ay, az, aw, timestamp, monotonic time) sample,
+        None until the first one. It is replaced, never modified, so it can
+        be read from any thread.
+    prioritized: bool
+        whether the thread priority could be raised.
+    """
+
+    def __init__(self, heiden, period=1000, callback=None, spin=0.0005, history=10000):
+        self.heiden = heiden
+        self.period = period
+        self.callback = callback
+        self.spin = spin
+        self.latest = None
+        self.prioritized = False
+        self.running = False
+        self.thread = None
+        self.error = None
+        #   Per cycle measurements (seconds), in a ring of `history` cycles.
+        self.wake = np.zeros(history)
+        self.work = np.zeros(history)
+        self.interval = np.zeros(history)
+        self.cycles = 0
+        self.samples = 0
+        self.empty = 0
+        self.overruns = 0
+
+    def start(self):
+        """Configures the soft real-time mode and starts the loop thread.
+        """
+        if self.running:
+            return
+        self.heiden.configSoftRealtime(self.period)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True, name="realtime")
+        self.thread.start()
+
+    def stop(self):
+        """Stops the loop thread and waits for it. The EIB741 is left in soft
+        real-time mode, the caller configures the next mode.
+        """
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def run(self):
+        self.prioritized = raisePriority()
+        try:
+            self.loop()
+        finally:
+            restorePriority()
+
+    def loop(self):
+        period = self.period / 1e6
+        deadline = time.monotonic() + period
+        previous = None
+        while self.running:
+            remaining = deadline - time.monotonic()
+            if remaining > self.spin:
+                time.sleep(remaining - self.spin)
+            while time.monotonic() < deadline:
+                pass
+            woke = time.monotonic()
+            try:
+                sample = self.heiden.readLatest()
+            except Exception as e:
+                print("[ REALTIME ]: Error ocurred while reading the EIB741. Error message: ")
+                print(e)
+                self.error = e
+                self.running = False
+                return
+            if sample is None:
+                self.empty += 1
+            else:
+                self.samples += 1
+                self.latest = sample + (woke,)
+                if self.callback is not None:
+                    self.callback(self.latest)
+            done = time.monotonic()
+            i = self.cycles % len(self.wake)
+            self.wake[i] = woke - deadline
+            self.work[i] = done - woke
+            self.interval[i] = woke - previous if previous is not None else period
+            previous = woke
+            self.cycles += 1
+            deadline += period
+            if deadline < done:
+                #   Overrun: skip the missed cycles instead of running them late.
+                self.overruns += 1
+                deadline += np.ceil((done - deadline) / period) * period
+
+    def stats(self):
+        """Latency and jitter of the last cycles, in microseconds.
+
+        Returns
+        -------
+        dict
+            cycles, samples, empty cycles (no new entry), overruns, whether the
+            thread priority was raised and, for the wake-up latency (delay after
+            the deadline), the loop time (read + callback) and the period
+            jitter (interval minus period): mean, p50, p99 and max.
+        """
+        n = min(self.cycles, len(self.wake))
+        summary = lambda a: {"mean": float(a.mean() * 1e6), "p50": float(np.percentile(a, 50) * 1e6),
+                             "p99": float(np.percentile(a, 99) * 1e6), "max": float(np.abs(a).max() * 1e6)} if n else None
+        return {
+            "period": self.period,
+            "running": self.running,
+            "prioritized": self.prioritized,
+            "cycles": self.cycles,
+            "samples": self.samples,
+            "empty": self.empty,
+            "overruns": self.overruns,
+            "wake": summary(self.wake[:n]),
+            "work": summary(self.work[:n]),
+            "jitter": summary(self.interval[:n] - self.period / 1e6),
+            "error": str(self.error) if self.error is not None else None}
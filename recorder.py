@@ -0,0 +1,229 @@
+import datetime, os, threading
+import numpy as np
+import batch
+from catalog import Catalog, SessionStats
+import netft
+from pipeline import BoundedQueue
+from pyramid import PyramidWriter
+from samplebuffer import CHANNELS, NETFT_CHANNELS
+
+
+FIELDS = ["Date", "Heidenhain Ax", "Heidenhain Ay", "Heidenhain Az", "Load Cell Fx", "Load Cell Fy", "Load Cell Fz", "Load Cell Tx", "Load Cell Ty", "Load Cell Tz", "Sequence", "Quality",
+          "Net F/T Fx", "Net F/T Fy", "Net F/T Fz", "Net F/T Tx", "Net F/T Ty", "Net F/T Tz"]
+DATE_FORMAT = "%d-%m-%Y-%H:%M:%S"
+#   Memory of one queued row (see `batch.py`).
+ROW_BYTES = batch.DTYPE.itemsize
+
+
+class Recorder():
+    """
+    Appends the acquired rows to a recording of `./data`.
+
+    ...
+
+    Rows are written with the format of the existing recordings: semicolon
+    separated values after a comma separated header (written when the file
+    is created by /api/connect). The file is kept open while recording.
+    The min/max/mean pyramid of the recording (see `pyramid.py`) is written
+    at the same time, and the session catalog (see `catalog.py`) is updated
+    when the recording closes.
+
+    Every Net F/T sample is appended at the RDT rate to the binary stream
+    of the recording (see `netft.streamPath()`), created with the first
+    sample, by a second thread with its own queue.
+
+    The acquisition hands the rows over with `enqueue()`, which never waits:
+    they are written by the recorder's own thread, so a slow disk does not
+    stall the device reads. Up to `budget` bytes of rows can wait in the
+    queue without any loss. Past the budget the queue `policy` applies and
+    the discarded rows are counted (see `pipeline.py`). `stop()` refuses new
+    rows first, then writes every queued row and only then closes the file.
+
+    Attributes
+    ----------
+    filename: str
+        name of the recording inside `./data`, or None when not recording.
+    tare: tuple
+        (x, y, z) Heidenhain tare offsets subtracted from the positions.
+    calibration: str
+        identity of the calibrations the rows were converted with (see
+        `calibration.identity()`), stored in the catalog.
+    queue: BoundedQueue
+        rows waiting to be written.
+    netftQueue: BoundedQueue
+        Net F/T samples waiting to be written.
+    """
+
+    def __init__(self, directory='./data', budget=64 * 2**20, policy="drop-oldest"):
+        self.directory = directory
+        self.filename = None
+        self.tare = (0, 0, 0)
+        self.calibration = None
+        self.file = None
+        self.netftFile = None
+        self.pyramid = None
+        self.stats = None
+        self.catalog = Catalog(f'{directory}/catalog.db')
+        self.position = 0
+        self.lock = threading.Lock()
+        #   Makes the check of `accepting` and the hand-over one step, so no row is queued once `stop()` refused them.
+        self.gate = threading.Lock()
+        self.accepting = False
+        self.queue = BoundedQueue("recorder", max(1, budget // ROW_BYTES), policy)
+        self.thread = threading.Thread(target=self.run, daemon=True, name="recorder")
+        self.thread.start()
+        self.netftQueue = BoundedQueue("recorder-netft", max(1, budget // netft.SAMPLE_DTYPE.itemsize), policy)
+        self.netftThread = threading.Thread(target=self.runNetFT, daemon=True, name="recorder-netft")
+        self.netftThread.start()
+
+    def isRecording(self):
+        return self.filename is not None
+
+    def start(self, filename, tare, calibration=None):
+        """Starts appending rows to `filename`. If it is already being
+        recorded only the tare offsets are updated.
+
+        Params
+        ------
+        filename: str
+            name of the recording inside `./data`.
+        tare: tuple
+            (x, y, z) Heidenhain tare offsets.
+        calibration: str
+            identity of the calibrations of the rows.
+        """
+        with self.lock:
+            if filename == self.filename:
+                self.tare = tare
+                return
+        self.stop()
+        with self.lock:
+            self.tare = tare
+            self.calibration = calibration
+            path = f'{self.directory}/{filename}'
+            self.file = open(path, 'a', newline='')
+            self.position = os.path.getsize(path)
+            self.pyramid = PyramidWriter(path)
+            self.stats = SessionStats()
+            self.filename = filename
+        with self.gate:
+            self.accepting = True
+
+    def stop(self, timeout=5):
+        """Stops accepting rows, writes the queued ones (waiting up to
+        `timeout` seconds) and closes the file.
+        """
+        with self.gate:
+            self.accepting = False
+        if self.isRecording() and not self.queue.waitEmpty(timeout):
+            print(f"[SYSTEM]: Recorder queue not drained after {timeout} s, {self.queue.size} rows lost")
+        if self.isRecording() and not self.netftQueue.waitEmpty(timeout):
+            print(f"[SYSTEM]: Recorder Net F/T queue not drained after {timeout} s, {self.netftQueue.size} samples lost")
+        with self.lock:
+            self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.pyramid.close()
+            try:
+                self.catalog.update(self.filename, self.stats, self.tare, self.calibration)
+            except Exception as e:
+                print(f"[SYSTEM]: Catalog update of {self.filename} failed: {e}")
+        if self.netftFile is not None:
+            self.netftFile.close()
+        self.file = None
+        self.netftFile = None
+        self.pyramid = None
+        self.stats = None
+        self.filename = None
+
+    def enqueue(self, rows):
+        """Queues rows to be written by the recorder thread. It only waits
+        if the queue policy is 'block'. Rows are ignored once `stop()` started.
+        """
+        with self.gate:
+            if self.accepting:
+                self.queue.put(rows)
+
+    def enqueueNetFT(self, samples):
+        """Queues Net F/T samples to be written by the Net F/T thread. It
+        only waits if the queue policy is 'block'. Samples are ignored once
+        `stop()` started.
+        """
+        with self.gate:
+            if self.accepting:
+                self.netftQueue.put(samples)
+
+    def run(self):
+        while True:
+            rows = self.queue.get()
+            try:
+                if len(rows):
+                    self.write(rows)
+            except Exception as e:
+                print("[ RECORDER ]: Error ocurred while writing the rows. Error message: ")
+                print(e)
+            finally:
+                self.queue.done()
+
+    def runNetFT(self):
+        while True:
+            samples = self.netftQueue.get()
+            try:
+                if len(samples):
+                    self.writeNetFT(samples)
+            except Exception as e:
+                print("[ RECORDER ]: Error ocurred while writing the Net F/T samples. Error message: ")
+                print(e)
+            finally:
+                self.netftQueue.done()
+
+    def writeNetFT(self, samples):
+        """Appends samples to the Net F/T stream of the recording.
+
+        Params
+        ------
+        samples: numpy.ndarray
+            `netft.SAMPLE_DTYPE` samples, with forces in N and torques in Nm.
+        """
+        with self.lock:
+            if self.file is None:
+                return
+            if self.netftFile is None:
+                self.netftFile = open(netft.streamPath(f'{self.directory}/{self.filename}'), 'ab')
+            self.netftFile.write(samples.astype(netft.SAMPLE_DTYPE, copy=False).tobytes())
+            self.netftFile.flush()
+
+    def write(self, rows):
+        """Appends rows to the recording, with the line format of `csv.writer`
+        (semicolon separated, CRLF terminated).
+
+        Params
+        ------
+        rows: numpy.ndarray
+            `batch.DTYPE` rows, with positions in mm, forces in N and torques
+            in Nm. NaN values are written as `nan` and mark a gap. The
+            sequence number and the quality bitfield (see `quality.py`) are
+            written after the ClipX values and before the Net F/T values,
+            so older readers still find them in the same columns.
+        """
+        with self.lock:
+            if self.file is None:
+                return
+            times = rows["time"]
+            values = rows["values"] - np.array(tuple(self.tare) + (0,) * (len(CHANNELS) - 3))
+            #   Dates have a resolution of one second: every distinct second is formatted once.
+            seconds, inverse = np.unique(np.floor(times), return_inverse=True)
+            dates = [datetime.datetime.fromtimestamp(second).strftime(DATE_FORMAT) for second in seconds.tolist()]
+            split = len(CHANNELS) - len(NETFT_CHANNELS)
+            lines = [f"{dates[i]};{';'.join(map(repr, row[:split]))};{seq};{flags};{';'.join(map(repr, row[split:]))}\r\n"
+                     for i, row, seq, flags in zip(inverse.tolist(), values.tolist(), rows["seq"].tolist(), rows["flags"].tolist())]
+            lengths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+            offsets = self.position + np.cumsum(lengths) - lengths
+            text = "".join(lines)
+            self.file.write(text)
+            self.file.flush()
+            self.position += len(text)
+            self.pyramid.add(times, values, offsets)
+            self.stats.add(times, values)
@@ -0,0 +1,286 @@
+import datetime, threading, time
+from collections import deque
+import numpy as np
+
+
+#   Scale factors between the raw device values and the values stored in the recordings.
+POSITION_SCALE = 2000000
+FORCE_SCALE = 1000
+NETFT_SCALE = 1000000
+#   Recorded values of every row: ax, ay, az, fx, fy, fz, tx, ty, tz, nfx, nfy, nfz, ntx, nty, ntz.
+VALUES = 15
+DATE_FORMAT = "%d-%m-%Y-%H:%M:%S"
+
+
+class ReplaySession():
+    """
+    A recorded session of `./data` played back against the wall clock.
+
+    ...
+
+    The recording is read in chunks of `chunkSize` rows, so memory use does
+    not depend on the file size. Recordings only store timestamps with one
+    second resolution, so the rows of the same second are spread evenly
+    along that second. Every row keeps the time it was recorded at, and
+    the passes of a looped playback follow each other in time. The
+    positions and the Net F/T values are replayed with the load cell line
+    of their row (see `ReplayHBC.takeRecorded()`); recordings made before
+    the Net F/T have NaN in its channels.
+
+    Attributes
+    ----------
+    path: str
+        path to the recording (netbox-data-*.csv).
+    speed: float
+        playback speed. 1 -> real time, N -> N times faster,
+        0 -> as fast as possible.
+    loop: bool
+        restarts the recording when it ends.
+    chunkSize: int
+        number of rows read from the file at once.
+    pending: deque
+        rows read from the file that are not due yet.
+    due: deque
+        rows due and not yet read by the ClipX replay.
+    current: tuple
+        last due row, used by the Heidenhain replay.
+    finished: bool
+        True when the recording has been fully played.
+    """
+
+    def __init__(self, path, speed=1, loop=False, chunkSize=1000):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.chunkSize = chunkSize
+        self.file = None
+        self.group = []
+        self.pending = deque()
+        self.due = deque()
+        self.current = None
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Opens the recording and starts the playback clock.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(self.path, 'r', newline='')
+            self.file.readline()
+            self.group = []
+            self.pending.clear()
+            self.due.clear()
+            self.current = None
+            self.finished = False
+            self.firstTime = None
+            self.origin = None
+            self.offset = 0
+            self.lastOffset = 0
+            self.passRows = 0
+            self.startTime = time.monotonic()
+
+    def stop(self):
+        """Closes the recording.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def parse(self, line):
+        """Parses one row of a recording. Returns (date, values) or None for empty rows.
+        The Net F/T values follow the sequence number and the quality flags.
+        """
+        line = line.strip()
+        if not line:
+            return None
+        fields = line.split(';') if ';' in line else line.split(',')
+        recorded = fields[1:10] + fields[12:18]
+        values = tuple(float(x) if x else float('nan') for x in recorded) + (float('nan'),) * (VALUES - len(recorded))
+        return fields[0], values
+
+    def readChunk(self):
+        """Reads up to `chunkSize` rows into `self.pending`. Rows of the same
+        second are released together, once the whole second has been read.
+        """
+        count = 0
+        while count < self.chunkSize:
+            line = self.file.readline()
+            if not line:
+                self.flushGroup()
+                if self.loop and self.passRows > 0:
+                    self.file.seek(0)
+                    self.file.readline()
+                    self.passRows = 0
+                    self.firstTime = None
+                    self.offset = self.lastOffset + 1
+                    continue
+                return False
+            row = self.parse(line)
+            if row is None:
+                continue
+            if self.group and self.group[0][0] != row[0]:
+                self.flushGroup()
+            self.group.append(row)
+            self.passRows += 1
+            count += 1
+        return True
+
+    def flushGroup(self):
+        """Moves the rows of the current second to `self.pending`, spread along the second.
+        """
+        if not self.group:
+            return
+        second = datetime.datetime.strptime(self.group[0][0], DATE_FORMAT).timestamp()
+        if self.firstTime is None:
+            self.firstTime = second
+        if self.origin is None:
+            self.origin = second
+        n = len(self.group)
+        for i, (date, values) in enumerate(self.group):
+            self.lastOffset = self.offset + second - self.firstTime + i / n
+            self.pending.append((self.lastOffset, self.origin + self.lastOffset, values))
+        self.group = []
+
+    def advance(self):
+        """Moves every row that is due at the current playback time from
+        `self.pending` to `self.due`.
+        """
+        with self.lock:
+            if self.file is None:
+                return
+            elapsed = (time.monotonic() - self.startTime) * self.speed
+            while True:
+                if not self.pending and not self.finished:
+                    self.finished = not self.readChunk()
+                if not self.pending:
+                    return
+                if self.speed > 0 and self.pending[0][0] > elapsed:
+                    return
+                row = self.pending.popleft()
+                self.due.append(row)
+                self.current = row
+                if self.speed == 0 and len(self.due) >= self.chunkSize:
+                    return
+
+    def next(self):
+        """Returns the next due row (offset, timestamp, values) or None.
+        """
+        with self.lock:
+            return self.due.popleft() if self.due else None
+
+
+class ReplayEIB():
+    """
+    Replays the Heidenhain positions of a `ReplaySession` with the
+    interface of `PyEIBWrapper`.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def openConnectInit(self, positions):
+        return 0
+
+    def configStreaming(self, axes=None):
+        return 0
+
+    def readData(self, timeout=200):
+        """Returns the status word and the positions of the current row,
+        in raw units (status, ax, ay, az, aw).
+        """
+        self.session.advance()
+        row = self.session.current
+        if row is None:
+            return 0, 0, 0, 0, 0
+        ax, ay, az = row[2][0:3]
+        return 0, ax * POSITION_SCALE, ay * POSITION_SCALE, az * POSITION_SCALE, 0
+
+    def tare(self):
+        return 0
+
+    def safeExit(self):
+        return 0
+
+
+class ReplayHBC():
+    """
+    Replays the load cell lines of a `ReplaySession` with the
+    interface of `PyHBCWraperr`. The recorded time of every line read is
+    kept for `takeTimes()`, and its positions and Net F/T values for
+    `takeRecorded()`.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.time = 0
+        self.times = []
+        self.recorded = []
+
+    def connect(self):
+        return None
+
+    def isConnected(self):
+        return True
+
+    def sdoWrite(self, index, subindex, value):
+        return 0
+
+    def startMeasurement(self):
+        self.session.start()
+        return 0
+
+    def availableLines(self):
+        if not self.session.due:
+            self.session.advance()
+        return len(self.session.due)
+
+    def readNextBlock(self):
+        """Returns the forces and torques of the next due row,
+        in raw units (fx, fy, fz, tx, ty, tz).
+        """
+        row = self.session.next()
+        if row is not None:
+            self.time = row[1]
+        self.times.append(self.time)
+        self.recorded.append(row[2] if row is not None else (float('nan'),) * VALUES)
+        if row is None:
+            return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+        return tuple(x * FORCE_SCALE for x in row[2][3:9])
+
+    def readNextLine(self):
+        return self.readNextBlock()
+
+    def readBlock(self, count):
+        return np.array([self.readNextBlock() for _ in range(count)]).reshape(count, 6)
+
+    def takeTimes(self):
+        """Returns the recorded times of the lines read since the last call.
+        """
+        times = np.array(self.times)
+        self.times = []
+        return times
+
+    def takeRecorded(self):
+        """Returns the recorded positions and Net F/T values of the lines
+        read since the last call, in raw units.
+
+        Returns
+        -------
+        numpy.ndarray[lines, 3]
+            ax, ay, az of every line.
+        numpy.ndarray[lines, 6]
+            nfx, nfy, nfz, ntx, nty, ntz of every line.
+        """
+        recorded = np.array(self.recorded, dtype=np.float64).reshape(len(self.recorded), VALUES)
+        self.recorded = []
+        return recorded[:, 0:3] * POSITION_SCALE, recorded[:, 9:15] * NETFT_SCALE
+
+    def stopMeasurements(self):
+        return 0
+
+    def disconnect(self):
+        self.session.stop()
+        return 0
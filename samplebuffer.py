@@ -0,0 +1,206 @@
+import threading
+import numpy as np
+
+
+#   Channels of the ATI Net F/T (see `netft.py`): forces in N and torques in Nm.
+NETFT_CHANNELS = ("nfx", "nfy", "nfz", "ntx", "nty", "ntz")
+#   Channels stored for every row of the buffer, in column order.
+#   Positions are in the units shown by the front end, forces in N and torques in Nm.
+CHANNELS = ("ax", "ay", "az", "fx", "fy", "fz", "tx", "ty", "tz") + NETFT_CHANNELS
+
+
+class SampleBuffer():
+    """
+    A fixed size in-memory ring buffer with the latest samples of every channel.
+
+    ...
+
+    Every row holds one ClipX line together with the last Heidenhain
+    position read and the last Net F/T sample before the line, so all the
+    channels share the same timestamps.
+    Rows are addressed by an absolute index (the number of rows appended
+    since the last `clear()`), which never wraps around.
+
+    Attributes
+    ----------
+    capacity: int
+        maximum number of rows kept in memory.
+    values: numpy.ndarray[capacity, len(CHANNELS)]
+        sample values. Column order is given by `CHANNELS`.
+    times: numpy.ndarray[capacity]
+        host timestamp (seconds since the epoch) of every row.
+    seqs: numpy.ndarray[capacity]
+        sequence number of every row (see `quality.py`).
+    flags: numpy.ndarray[capacity]
+        quality bitfield of every row (see `quality.py`).
+    total: int
+        absolute index of the next row to be written.
+    generation: int
+        incremented on every `clear()` so cached results can be invalidated.
+    """
+
+    def __init__(self, capacity=120000):
+        """Constructor method.
+
+        Params
+        ------
+        capacity: int
+            maximum number of rows kept in memory. Default is 120000,
+            which is 2 minutes at 1 kHz.
+        """
+        self.capacity = capacity
+        self.values = np.zeros((capacity, len(CHANNELS)), dtype=np.float64)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.seqs = np.zeros(capacity, dtype=np.int64)
+        self.flags = np.zeros(capacity, dtype=np.uint16)
+        self.total = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.appended = threading.Condition(self.lock)
+
+    def clear(self):
+        """Drops every row of the buffer.
+        """
+        with self.lock:
+            self.total = 0
+            self.generation += 1
+
+    def append(self, timestamp, row, seq=0, flags=0):
+        """Appends one row to the buffer.
+
+        Params
+        ------
+        timestamp: float
+            host timestamp of the row in seconds since the epoch.
+        row: sequence of float
+            one value per channel, ordered as `CHANNELS`.
+        seq: int
+            sequence number of the row.
+        flags: int
+            quality bitfield of the row.
+        """
+        with self.lock:
+            i = self.total % self.capacity
+            self.values[i] = row
+            self.times[i] = timestamp
+            self.seqs[i] = seq
+            self.flags[i] = flags
+            self.total += 1
+            self.appended.notify_all()
+
+    def extend(self, rows):
+        """Appends a batch of rows (see `batch.py`) with one write per column.
+
+        Params
+        ------
+        rows: numpy.ndarray
+            `batch.DTYPE` rows, oldest first.
+        """
+        if len(rows) == 0:
+            return
+        with self.lock:
+            skipped = max(0, len(rows) - self.capacity)
+            rows = rows[skipped:]
+            idx = (self.total + skipped + np.arange(len(rows))) % self.capacity
+            self.values[idx] = rows["values"]
+            self.times[idx] = rows["time"]
+            self.seqs[idx] = rows["seq"]
+            self.flags[idx] = rows["flags"]
+            self.total += skipped + len(rows)
+            self.appended.notify_all()
+
+    def last(self, seconds):
+        """Returns the rows written during the last `seconds` seconds.
+
+        Params
+        ------
+        seconds: float
+            length of the window, measured back from the newest row.
+
+        Returns
+        -------
+        int
+            absolute index of the first returned row.
+        numpy.ndarray
+            timestamps of the rows.
+        numpy.ndarray
+            values of the rows, one column per channel.
+        int
+            generation of the buffer the rows belong to.
+        """
+        with self.lock:
+            count = min(self.total, self.capacity)
+            if count == 0:
+                return self.total, np.empty(0), np.empty((0, len(CHANNELS))), self.generation
+            idx = np.arange(self.total - count, self.total) % self.capacity
+            times = self.times[idx]
+            first = int(np.searchsorted(times, times[-1] - seconds, side='left'))
+            values = self.values[idx[first:]]
+            return self.total - count + first, times[first:], values, self.generation
+
+
+    def since(self, seq, limit):
+        """Returns the rows with a sequence number greater than `seq`, oldest
+        first. Sequence numbers increase by one per row, so the first row is
+        found with a single subtraction.
+
+        Params
+        ------
+        seq: int
+            sequence number of the last row the caller already has, -1 for
+            the oldest row in the buffer.
+        limit: int
+            maximum number of rows returned.
+
+        Returns
+        -------
+        numpy.ndarray
+            sequence numbers of the rows.
+        numpy.ndarray
+            timestamps of the rows.
+        numpy.ndarray
+            values of the rows, one column per channel.
+        numpy.ndarray
+            quality flags of the rows.
+        int
+            rows after `seq` that are no longer in the buffer.
+        """
+        with self.lock:
+            count = min(self.total, self.capacity)
+            if count == 0:
+                return (np.empty(0, dtype=np.int64), np.empty(0), np.empty((0, len(CHANNELS))),
+                        np.empty(0, dtype=np.uint16), 0)
+            first = self.total - count
+            oldest = int(self.seqs[first % self.capacity])
+            newest = int(self.seqs[(self.total - 1) % self.capacity])
+            start = first + max(0, min(seq + 1 - oldest, count))
+            if newest - oldest + 1 != count:
+                #   Not contiguous (rows appended without sequence numbers): search instead.
+                idx = np.arange(first, self.total) % self.capacity
+                start = first + int(np.searchsorted(self.seqs[idx], seq, side='right'))
+            missed = max(0, oldest - seq - 1) if seq >= 0 else 0
+            idx = np.arange(start, min(self.total, start + limit)) % self.capacity
+            return self.seqs[idx], self.times[idx], self.values[idx], self.flags[idx], missed
+
+    def wait(self, seq, timeout):
+        """Waits up to `timeout` seconds for a row with a sequence number
+        greater than `seq`.
+
+        Returns
+        -------
+        bool
+            True if such a row is in the buffer.
+        """
+        def ready():
+            return self.total > 0 and self.seqs[(self.total - 1) % self.capacity] > seq
+        with self.appended:
+            return self.appended.wait_for(ready, timeout)
+
+
+def channelIndex(channel):
+    """Returns the column of `channel` in the buffer.
+    Raises a ValueError if the channel does not exist.
+    """
+    if channel not in CHANNELS:
+        raise ValueError(f"Unknown channel '{channel}'. Available channels: {', '.join(CHANNELS)}")
+    return CHANNELS.index(channel)
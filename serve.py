@@ -0,0 +1,51 @@
+#   PRODUCTION ENTRY POINT
+#
+#   Serves the Flask app with waitress, a multi-threaded WSGI server, instead
+#   of the Werkzeug development server of `app.py`. The devices are owned by
+#   the single acquisition thread of `app.engine`; the waitress worker threads
+#   only read its latest values and buffer, so a slow request never delays a
+#   device read and several dashboards can poll at the same time.
+#
+#   Usage: python serve.py [--host 0.0.0.0] [--port 4000] [--threads 8] [--streams 4]
+#
+#   Every open server-sent event stream (/api/live, /api/alarms) holds one
+#   worker thread for as long as it is open. At most `--streams` of them
+#   (default: half the threads) are served at once and the next ones get
+#   503, so the other routes always keep `--threads - --streams` workers.
+#
+#   Load profile
+#   ------------
+#   Measured with `python loadtest.py http://127.0.0.1:4000/api/readsamples <clients> 15`
+#   against `python serve.py --threads 8`, replaying a recording at real time
+#   through /api/replay (single core Linux VM shared by the server and the
+#   load generator, Python 3.11, waitress 3):
+#
+#       clients    req/s    p50 (ms)    p99 (ms)
+#             1      615         1.1         5.5
+#             8      912         8.0        19.6
+#            32     1133        27.3        48.8
+#
+#   The dashboard polls every 300 ms, so one dashboard produces ~3.3 req/s.
+
+import argparse
+from waitress import serve
+from app import app, engine, setMaxStreams
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Production server for the LCS dashboard")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--streams', type=int, default=None)
+    args = parser.parse_args()
+    streams = args.threads // 2 if args.streams is None else args.streams
+    if not 0 <= streams < args.threads:
+        parser.error("--streams must leave at least one thread for the other routes")
+    setMaxStreams(streams)
+    engine.start()
+    print(f"[SYSTEM]: Serving on http://{args.host}:{args.port} with {args.threads} threads, at most {streams} streams")
+    try:
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    finally:
+        engine.stop()
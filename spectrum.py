@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class WelchEstimator():
+    """
+    Welch power spectral density estimator over a `SampleBuffer`.
+
+    ...
+
+    The signal is split into segments of `nperseg` rows that start at
+    absolute buffer indices multiple of the step (`nperseg - noverlap`).
+    Because the segment boundaries do not depend on the requested window,
+    the windowed FFT of a segment is computed only once and reused by every
+    request that overlaps it, until it is evicted from the cache.
+
+    Attributes
+    ----------
+    maxCachedSegments: int
+        maximum number of segment spectra kept in the cache.
+    cache: OrderedDict
+        LRU cache. Key -> (generation, channel, nperseg, noverlap, segment number),
+        value -> one-sided |FFT|^2 of the windowed and detrended segment.
+    """
+
+    def __init__(self, maxCachedSegments=4096):
+        self.maxCachedSegments = maxCachedSegments
+        self.cache = OrderedDict()
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def window(self, nperseg):
+        """Returns the Hann window of length `nperseg`. Windows are cached.
+        """
+        if nperseg not in self.windows:
+            self.windows[nperseg] = np.hanning(nperseg)
+        return self.windows[nperseg]
+
+    def psd(self, start, times, values, generation, channel, nperseg=256, noverlap=None):
+        """Computes the power spectral density of the rows returned by `SampleBuffer.last()`.
+
+        Params
+        ------
+        start: int
+            absolute buffer index of the first row.
+        times: numpy.ndarray
+            timestamps of the rows, used to estimate the sample rate.
+        values: numpy.ndarray
+            samples of the channel.
+        generation: int
+            buffer generation, part of the cache key.
+        channel: str
+            channel name, part of the cache key.
+        nperseg: int
+            length of each segment. Default is 256.
+        noverlap: int
+            rows shared by consecutive segments. Default is nperseg // 2.
+
+        Returns
+        -------
+        numpy.ndarray
+            frequencies in Hz.
+        numpy.ndarray
+            power spectral density in unit^2/Hz.
+        float
+            estimated sample rate in Hz.
+        int
+            number of segments averaged.
+        """
+        if noverlap is None:
+            noverlap = nperseg // 2
+        if nperseg < 2 or noverlap < 0 or noverlap >= nperseg:
+            raise ValueError("nperseg must be at least 2 and 0 <= noverlap < nperseg")
+        if len(values) < nperseg:
+            raise ValueError(f"Not enough samples: {len(values)} available, {nperseg} required")
+        if not np.isfinite(values).all():
+            raise ValueError("The window contains a gap (device lost). Choose a shorter window")
+        if times[-1] <= times[0]:
+            raise ValueError("Samples do not span any time. The sample rate can not be estimated")
+        fs = (len(times) - 1) / (times[-1] - times[0])
+
+        step = nperseg - noverlap
+        first = -(-start // step)
+        last = (start + len(values) - nperseg) // step
+        segments = np.arange(first, last + 1)
+        if len(segments) == 0:
+            raise ValueError(f"Not enough samples: {len(values)} available, {nperseg} required")
+
+        keys = [(generation, channel, nperseg, noverlap, int(s)) for s in segments]
+        with self.lock:
+            spectra = [self.cache.get(key) for key in keys]
+        missing = [i for i, spectrum in enumerate(spectra) if spectrum is None]
+        if missing:
+            offsets = segments[missing] * step - start
+            rows = values[offsets[:, None] + np.arange(nperseg)]
+            rows = rows - rows.mean(axis=1, keepdims=True)
+            computed = np.abs(np.fft.rfft(rows * self.window(nperseg), axis=1)) ** 2
+            for i, spectrum in zip(missing, computed):
+                spectra[i] = spectrum
+        with self.lock:
+            for key, spectrum in zip(keys, spectra):
+                self.cache[key] = spectrum
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.maxCachedSegments:
+                self.cache.popitem(last=False)
+
+        power = np.mean(spectra, axis=0)
+        power /= fs * np.sum(self.window(nperseg) ** 2)
+        if nperseg % 2 == 0:
+            power[1:-1] *= 2
+        else:
+            power[1:] *= 2
+        return np.fft.rfftfreq(nperseg, 1 / fs), power, fs, len(segments)
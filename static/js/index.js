@@ -1,9 +1,9 @@
 window.START = false //Controls if graphs should be updating or not
 window.RECORDING = "false" //Controls wether data is stored or not
 window.DISCONNECTED = "true"
-let UPDATE_RATIO = 1 //controls display speed. Should be between 1 and 20. 1 is max speed, 20 is min speed.
-const MAX_GRAPH_SIZE = 120 //maximum number of concurrent samples per graph
-const REQUEST_PERIOD = 50 //Period in ms. Every 50ms a sample is stored in the data.csv
+const MAX_GRAPH_SIZE = 2000 //maximum number of concurrent samples per graph. Same value as in liveworker.js
+const RENDER_MODE = 'webgl' //'webgl' draws scattergl traces, 'svg' draws scatter traces
+const TRACE_TYPE = RENDER_MODE == 'webgl' ? 'scattergl' : 'scatter'
 //Graphs Initial Configuration
 
 // Forces and Torques Graph
@@ -11,7 +11,7 @@ let initForcesGraph = () => {
     let data = [
         {
             y: [],
-            type: 'scatter',
+            type: TRACE_TYPE,
             name: 'Fz',
             line: {
                 color: '#06D6A0',
@@ -49,6 +49,7 @@ let initForcesGraph = () => {
     }
 
     Plotly.newPlot('graph1', data, layout, config)
+    return {id: 'graph1', data: data, layout: layout, config: config, channels: ['fz']}
 }
 
 // Positions Graph
@@ -56,7 +57,7 @@ let initPositionGraph = () => {
     let data = [
         {
             y: [],
-            type: 'scatter',
+            type: TRACE_TYPE,
             name: 'Ax',
             line: {
                 color: '#EF476F',
@@ -65,7 +66,7 @@ let initPositionGraph = () => {
         },
         {
             y: [],
-            type: 'scatter',
+            type: TRACE_TYPE,
             name: 'Ay',
             line: {
                 color: '#FFD166'
@@ -73,7 +74,7 @@ let initPositionGraph = () => {
         },
         {
             y: [],
-            type: 'scatter',
+            type: TRACE_TYPE,
             name: 'Az',
             line: {
                 color: '#118AB2'
@@ -110,6 +111,7 @@ let initPositionGraph = () => {
     }
 
     Plotly.newPlot('graph2', data, layout, config)
+    return {id: 'graph2', data: data, layout: layout, config: config, channels: ['ax', 'ay', 'az']}
 }
 
 // Positions Forces and Torques Graph
@@ -119,7 +121,7 @@ let initMixedGraph = () => {
 
         {
             y: [],
-            type: 'scatter',
+            type: TRACE_TYPE,
             name: 'Fz',
             line: {
                 color: '#06D6A0',
@@ -127,7 +129,7 @@ let initMixedGraph = () => {
         },
         {
             y: [],
-            type: 'scatter',
+            type: TRACE_TYPE,
             name: 'Ax',
             line: {
                 color: '#EF476F'
@@ -135,7 +137,7 @@ let initMixedGraph = () => {
         },
         {
             y: [],
-            type: 'scatter',
+            type: TRACE_TYPE,
             name: 'Ay',
             line: {
                 color: '#FFD166'
@@ -143,7 +145,7 @@ let initMixedGraph = () => {
         },
         {
             y: [],
-            type: 'scatter',
+            type: TRACE_TYPE,
             name: 'Az',
             line: {
                 color: '#118AB2'
@@ -180,80 +182,81 @@ let initMixedGraph = () => {
     }
 
     Plotly.newPlot('graph3', data, layout, config)
+    return {id: 'graph3', data: data, layout: layout, config: config, channels: ['fz', 'ax', 'ay', 'az']}
 }
 
-// Utility function to format data in a plotly.js friendly way
-// rawData = [fx, fy, fz, tx, ty, tz]
-let formatData = (rawData) => {
-    let formatedData = []
-    rawData.forEach(element => {
-        formatedData.push([element])
-    });
-    
-    return formatedData
+// Values are null while a device is lost and being reconnected
+let formatValue = (value) => value === null ? '--' : value.toFixed(3)
+// Quality flags of the last sample (see quality.py), 'OK' when none is set
+let formatQuality = (flags) => flags === undefined ? '--' : (flags.length ? flags.join(', ') : 'OK')
+
+// The live data client runs in a Web Worker: it polls the server, decodes the
+// samples and keeps the ring buffers. The main thread only draws what it posts.
+let worker = new Worker('/static/js/liveworker.js')
+let graphs = []
+let frame = null
+let lastFrame = null
+let waitingFrame = false
+
+worker.onmessage = (e) => {
+    waitingFrame = false
+    if (e.data.type == 'frame') {
+        frame = e.data
+    }
 }
 
+// Value readouts. The elements are created once and their text is only
+// touched when the displayed value changes.
+let readouts = {}
+let initReadouts = () => {
+    let values = document.getElementById("values")
+    values.innerHTML = `
+    <div class="bg pink"><b>Ax:</b> <span id="value-ax">--</span> mm</div> 
+    <div class="bg yellow"><b>Ay:</b> <span id="value-ay">--</span> mm</div> 
+    <div class="bg blue"><b>Az:</b> <span id="value-az">--</span> mm</div> 
+    <div class="bg green"><b>Fz:</b> <span id="value-fz">--</span> N</div>
+    <div class="bg"><b>Quality:</b> <span id="value-flags">--</span></div>`
+    for (let channel of ['ax', 'ay', 'az', 'fz', 'flags']) {
+        readouts[channel] = {element: document.getElementById(`value-${channel}`), text: '--'}
+    }
+}
 
-let countMod = 0;
+let updateReadouts = (samples) => {
+    for (let channel in readouts) {
+        let text = channel == 'flags' ? formatQuality(samples.flags) : formatValue(samples[channel])
+        if (readouts[channel].text != text) {
+            readouts[channel].text = text
+            readouts[channel].element.textContent = text
+        }
+    }
+}
 
-//Update graph data and axis function
-setInterval(function(){
-    if(window.START) {
-        
-        readNetBoxSamples().then((samples) => {
-            
-            //let data = formatData([samples.fx, samples.fy, samples.fz, samples.tx, samples.ty, samples.tz])
-            let posData = formatData([samples.ax, samples.ay, samples.az])
-            //let allData = formatData([samples.fx, samples.fy, samples.fz, samples.tx, samples.ty, samples.tz, samples.ax, samples.ay, samples.az, samples.aw])
-            let allData = formatData([samples.fz, samples.ax, samples.ay, samples.az])
-            Plotly.extendTraces('graph1', {y: [[samples.fz]]}, [0])
-            Plotly.extendTraces('graph2', {y: posData}, [0, 1, 2])
-            Plotly.extendTraces('graph3', {y: allData}, [0, 1, 2, 3])
-            countMod += 1
-            document.getElementById("values").innerHTML = `
-            <div class="bg pink"><b>Ax:</b> ${samples.ax.toFixed(3)} mm</div> 
-            <div class="bg yellow"><b>Ay:</b> ${samples.ay.toFixed(3)} mm</div> 
-            <div class="bg blue"><b>Az:</b> ${samples.az.toFixed(3)} mm</div> 
-            <div class="bg green"><b>Fz:</b> ${samples.fz.toFixed(3)} N</div>`
-            if (countMod > MAX_GRAPH_SIZE){
-                Plotly.relayout('graph1', {
-                    xaxis: {
-                        range: [countMod-MAX_GRAPH_SIZE, countMod]
-                    }
-                })
-                Plotly.relayout('graph2', {
-                    xaxis: {
-                        range: [countMod-MAX_GRAPH_SIZE, countMod]
-                    }
-                })
-                Plotly.relayout('graph3', {
-                    xaxis: {
-                        range: [countMod-MAX_GRAPH_SIZE, countMod]
-                    }
-                })
+// Draws the last frame posted by the worker, at most once per animation frame,
+// and asks the worker for the next one
+let render = () => {
+    if (frame !== null) {
+        let count = frame.count
+        let x = frame.series.x
+        for (let graph of graphs) {
+            graph.data.forEach((trace, i) => {
+                trace.x = x
+                trace.y = frame.series[graph.channels[i]]
+            })
+            if (count > MAX_GRAPH_SIZE) {
+                graph.layout.xaxis.range = [count - MAX_GRAPH_SIZE, count]
             }
-        })
+            graph.layout.datarevision = count
+            Plotly.react(graph.id, graph.data, graph.layout, graph.config)
+        }
+        updateReadouts(frame.latest)
+        lastFrame = frame
+        frame = null
     }
-}, 300)
-
-
-async function readNetBoxSamples () {
-    let res = await fetch('http://127.0.0.1:4000/api/readsamples?' + new URLSearchParams({
-        write: window.RECORDING
-    }), {
-        method: 'GET', // *GET, POST, PUT, DELETE, etc.
-        mode: 'cors', // no-cors, *cors, same-origin
-        cache: 'no-cache', // *default, no-cache, reload, force-cache, only-if-cached
-        credentials: 'same-origin', // include, *same-origin, omit
-        headers: {
-          'Content-Type': 'application/json',
-          // 'Content-Type': 'application/x-www-form-urlencoded',
-        },
-        redirect: 'follow', // manual, *follow, error
-        referrerPolicy: 'no-referrer', // no-referrer, *no-referrer-when-downgrade, origin, origin-when-cross-origin, same-origin, strict-origin, strict-origin-when-cross-origin, unsafe-url
-      })
-    let toReturn = await res.json()
-    return toReturn
+    if (!waitingFrame) {
+        waitingFrame = true
+        worker.postMessage({type: 'frame'})
+    }
+    window.requestAnimationFrame(render)
 }
 
 async function connect() {
@@ -332,11 +335,15 @@ document.getElementById("start-btn").addEventListener("click", (e) => {
     }else{
         
         window.START = true
+        worker.postMessage({type: 'start'})
     }
    
 })
 
-document.getElementById("stop-btn").addEventListener("click", (e) => window.START = false)
+document.getElementById("stop-btn").addEventListener("click", (e) => {
+    window.START = false
+    worker.postMessage({type: 'stop'})
+})
 document.getElementById("connect-btn").addEventListener("click", (e) => {
     connect().then((res) => {
         let msg = `[SERVER MESSAGE]: ${res.message}\nData would be stored at ${res.filename}`
@@ -351,6 +358,7 @@ document.getElementById("connect-btn").addEventListener("click", (e) => {
 
 document.getElementById("isRecording").addEventListener("change", (e) => {
     document.getElementById("isRecording").checked ? window.RECORDING = "true" : window.RECORDING ="false"
+    worker.postMessage({type: 'recording', value: window.RECORDING})
 })
 
 document.getElementById("disconnect-btn").addEventListener("click", (e) => {
@@ -358,6 +366,7 @@ document.getElementById("disconnect-btn").addEventListener("click", (e) => {
     if(confirm) {
         window.DISCONNECTED = true
         window.START = false
+        worker.postMessage({type: 'stop'})
         disconnect().then((response) => {
             window.alert(response.message)
         })
@@ -387,18 +396,13 @@ document.getElementById("tare-heiden").addEventListener("click", (e) => {
 
 //Relayout function
 window.onresize = function() {
-    Plotly.relayout('graph1', {
-      width: 0.46 * window.innerWidth,
-      height: 0.8 * window.innerHeight
-    })
-    Plotly.relayout('graph2', {
-        width: 0.46 * window.innerWidth,
-        height: 0.8 * window.innerHeight
-      })
-    Plotly.relayout('graph3', {
-    width: 0.8 * window.innerWidth,
-    height: 0.8 * window.innerHeight
-    })  
+    let widths = {graph1: 0.46, graph2: 0.46, graph3: 0.8}
+    for (let graph of graphs) {
+        graph.layout.width = widths[graph.id] * window.innerWidth
+        graph.layout.height = 0.8 * window.innerHeight
+    }
+    // Draw the last frame again with the new size, unless a new one is waiting
+    frame = frame || lastFrame
   }
 
 //Change graphs order  
@@ -420,9 +424,9 @@ let changeView = () => {
  <------- Main Execution -------->
  
  */
-initForcesGraph();
-initPositionGraph();
-initMixedGraph();
+graphs = [initForcesGraph(), initPositionGraph(), initMixedGraph()];
+initReadouts();
 changeView();
+window.requestAnimationFrame(render);
 
 
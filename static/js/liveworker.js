@@ -0,0 +1,147 @@
+// Live data worker. It polls the server, decodes the samples and keeps one ring
+// buffer per plotted series, so the main thread only has to draw.
+// Every acquired row is plotted: the rows are read with the sequence number
+// cursor of /api/samples, and /api/readsamples gives the readouts, the tare
+// and switches the recording on and off.
+//
+// Messages received:
+//   {type: 'start'}                  starts polling
+//   {type: 'stop'}                   stops polling
+//   {type: 'recording', value}       value is "true" or "false"
+//   {type: 'frame'}                  asks for the data of the next frame
+// Messages posted:
+//   {type: 'frame', count, latest, series}   series are transferred Float64Arrays
+//   {type: 'idle'}                           no new samples since the last frame
+
+const MAX_GRAPH_SIZE = 2000 //maximum number of concurrent samples per graph
+const REQUEST_PERIOD = 100 //Minimum period in ms between two requests
+const WAIT = 1 //Seconds /api/samples holds the request until a new row arrives
+const CHANNELS = ['fz', 'ax', 'ay', 'az']
+// Buffer channel of every plotted series, the same ones /api/readsamples sends
+const SOURCES = {fz: 'fy', ax: 'ax', ay: 'ay', az: 'az'}
+
+// Fixed size ring buffer backed by a typed array. Every value is written twice,
+// at i and i + size, so the last `size` values are always the contiguous view
+// data[head, head + size).
+class RingBuffer {
+    constructor(size) {
+        this.size = size
+        this.data = new Float64Array(2 * size).fill(NaN)
+        this.head = 0
+    }
+
+    push(value) {
+        let v = value === null ? NaN : value
+        this.data[this.head] = v
+        this.data[this.head + this.size] = v
+        this.head = (this.head + 1) % this.size
+    }
+
+    // Copy of the last `size` values, owned by the caller so it can be transferred
+    copy() {
+        return this.data.slice(this.head, this.head + this.size)
+    }
+}
+
+// One ring buffer per plotted series. `x` holds the sequence number of the row.
+let series = {}
+let clearSeries = () => {
+    series = {x: new RingBuffer(MAX_GRAPH_SIZE)}
+    CHANNELS.forEach((channel) => series[channel] = new RingBuffer(MAX_GRAPH_SIZE))
+}
+clearSeries()
+
+let started = false
+let recording = "false"
+let count = 0
+let cursor = null
+let latest = null
+let dirty = false
+
+// Appends the rows of an /api/samples response, with the tare of the positions subtracted
+let pushRows = (rows, tare) => {
+    let columns = rows.columns
+    for (let i = 0; i < rows.rows; i++) {
+        series.x.push(columns.seq[i])
+        CHANNELS.forEach((channel) => {
+            let value = columns[SOURCES[channel]][i]
+            series[channel].push(value === null ? null : value - (tare[channel] || 0))
+        })
+    }
+    if (rows.rows > 0) {
+        count = columns.seq[rows.rows - 1] + 1
+        dirty = true
+    }
+}
+
+async function get (route, params) {
+    let res = await fetch(route + '?' + new URLSearchParams(params), {
+        method: 'GET',
+        cache: 'no-cache',
+        credentials: 'same-origin',
+      })
+    return await res.json()
+}
+
+async function readNetBoxSamples () {
+    let samples = await get('/api/readsamples', {write: recording})
+    if (samples.message !== undefined) {
+        return
+    }
+    latest = samples
+    dirty = true
+    if (cursor === null) {
+        // Starts with the last rows that fit in the graphs
+        cursor = Math.max(-1, samples.seq - MAX_GRAPH_SIZE)
+    }
+    let rows = await get('/api/samples', {
+        since: cursor, max: 10000, wait: WAIT, channels: Object.values(SOURCES).join(',')})
+    if (rows.message !== undefined || !started) {
+        return
+    }
+    if (rows.reset) {
+        // The server restarted and numbers the rows from 0 again
+        clearSeries()
+    }
+    pushRows(rows, samples.tare)
+    cursor = rows.next
+}
+
+let sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
+// Polling loop. A slow response delays the next request instead of piling up requests.
+async function poll () {
+    while (started) {
+        let begin = performance.now()
+        try {
+            await readNetBoxSamples()
+        } catch (e) {
+            console.log(`[LIVE WORKER]: ${e}`)
+        }
+        await sleep(Math.max(0, REQUEST_PERIOD - (performance.now() - begin)))
+    }
+}
+
+onmessage = (e) => {
+    let msg = e.data
+    if (msg.type == 'start' && !started) {
+        started = true
+        poll()
+    } else if (msg.type == 'stop') {
+        started = false
+    } else if (msg.type == 'recording') {
+        recording = msg.value
+    } else if (msg.type == 'frame') {
+        if (!dirty) {
+            postMessage({type: 'idle'})
+            return
+        }
+        dirty = false
+        let frame = {}
+        for (let name in series) {
+            frame[name] = series[name].copy()
+        }
+        postMessage({type: 'frame', count: count, latest: latest, series: frame},
+            Object.values(frame).map((array) => array.buffer))
+    }
+}
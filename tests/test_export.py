@@ -0,0 +1,69 @@
+import datetime, json
+import numpy as np
+import columnar, export
+from recorder import FIELDS
+from replay import DATE_FORMAT
+from samplebuffer import CHANNELS
+
+
+START = 1.7e9
+
+
+def writeRecording(path, seconds, rows=10):
+    """Writes `rows` rows per second where fx is the row number and nfx is missing
+    every other row."""
+    with open(path, 'w', newline='') as file:
+        file.write(",".join(FIELDS) + "\r\n")
+        for i in range(seconds * rows):
+            date = datetime.datetime.fromtimestamp(START + i // rows).strftime(DATE_FORMAT)
+            nfx = "" if i % 2 else str(i)
+            file.write(f"{date};0;0;0;{i};0;0;0;0;0;{i};0;{nfx};0;0;0;0;0\r\n")
+    return str(path)
+
+
+def read(names, chunks, output):
+    data = b"".join(chunks)
+    if output == "ndjson":
+        return [json.loads(line) for line in data.decode().splitlines()]
+    if output == "binary":
+        return np.frombuffer(data, dtype=names)
+    return data.decode().splitlines()
+
+
+def test_csv_export_keeps_the_time_range(tmp_path):
+    path = writeRecording(tmp_path / "netbox-data-x.csv", 5)
+    names, chunks = export.stream(path, "csv", ["fx"], start=START + 1, end=START + 2)
+    lines = read(names, chunks, "csv")
+    assert lines[0] == "time,fx,seq,quality"
+    times = [float(line.split(",")[0]) for line in lines[1:]]
+    assert len(times) == 20 and min(times) == START + 1 and max(times) == START + 2
+
+
+def test_decimation_keeps_its_phase_across_chunks(tmp_path):
+    path = writeRecording(tmp_path / "netbox-data-x.csv", 5)
+    names, chunks = export.stream(path, "binary", ["fx"], every=3)
+    records = read(names, chunks, "binary")
+    assert records["fx"].tolist() == list(range(0, 50, 3))
+
+
+def test_ndjson_missing_values_are_null(tmp_path):
+    path = writeRecording(tmp_path / "netbox-data-x.csv", 1)
+    names, chunks = export.stream(path, "ndjson", ["fx", "nfx"])
+    data = b"".join(chunks)
+    assert b"NaN" not in data
+    rows = [json.loads(line) for line in data.decode().splitlines()]
+    assert [row["nfx"] for row in rows[:3]] == [0, None, 2]
+    assert rows[1]["fx"] == 1
+
+
+def test_burst_sessions_are_filtered_and_exported_in_epoch_time(tmp_path):
+    rows = 1000
+    cols = {"time": np.arange(rows) / 1000}
+    cols.update({channel: np.full(rows, np.nan) for channel in CHANNELS})
+    cols["ax"] = np.arange(rows, dtype=np.float64)
+    path = str(tmp_path / "burst.columns")
+    columnar.writeSession(path, cols, {"start": START})
+    names, chunks = export.stream(path, "binary", ["ax"], start=START + 0.1, end=START + 0.2)
+    records = read(names, chunks, "binary")
+    assert records["ax"][0] == 100 and records["ax"][-1] == 200
+    assert np.allclose(records["time"], START + records["ax"] / 1000)
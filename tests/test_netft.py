@@ -0,0 +1,68 @@
+import numpy as np
+import quality
+from netft import NetFTReader, RECORD_DTYPE
+
+
+def records(rdt, raw, status=0):
+    """Records with the sequence numbers `rdt` and every raw count set to `raw`."""
+    data = np.zeros(len(rdt), dtype=RECORD_DTYPE)
+    data["rdt"] = rdt
+    data["status"] = status
+    data["raw"] = np.asarray(raw)[:, None]
+    return data
+
+
+def reader(**kwargs):
+    #   Never started: the samples are stored by hand.
+    return NetFTReader(('127.0.0.1', 1), rate=1000, maxAge=0.1, **kwargs)
+
+
+def test_rows_get_the_last_sample_before_them():
+    netft = reader()
+    netft.store(10.0, records([1], [100]))
+    netft.store(10.05, records([2], [200]))
+    raw, flags = netft.align(np.array([9.9, 10.0, 10.02, 10.05, 10.2]))
+    assert np.isnan(raw[0]).all() and flags[0] == quality.NETFT_GAP
+    assert raw[1:4, 0].tolist() == [100, 100, 200]
+    assert (flags[1:4] == 0).all()
+    #   The last sample is older than maxAge.
+    assert np.isnan(raw[4]).all() and flags[4] == quality.NETFT_GAP
+
+
+def test_the_last_sample_is_held_for_the_next_rows():
+    netft = reader()
+    netft.store(10.0, records([1], [100]))
+    netft.align(np.array([10.01]))
+    raw, flags = netft.align(np.array([10.02, 10.03]))
+    assert raw[:, 0].tolist() == [100, 100]
+    assert (flags == 0).all()
+
+
+def test_buffered_records_are_dated_backwards():
+    netft = reader()
+    netft.store(10.0, records([1, 2, 3], [1, 2, 3]))
+    raw, _ = netft.align(np.array([9.9985, 9.9995, 10.0]))
+    assert raw[:, 0].tolist() == [1, 2, 3]
+
+
+def test_sequence_jumps_and_status_are_flagged():
+    netft = reader()
+    netft.store(10.0, records([1], [100]))
+    netft.store(10.01, records([5], [200]))
+    netft.store(10.02, records([6], [300], status=0x80000000))
+    _, flags = netft.align(np.array([10.0, 10.01, 10.02]))
+    assert flags[0] == 0
+    assert flags[1] == quality.NETFT_LOST
+    assert flags[2] == quality.NETFT_STATUS
+    assert netft.lost == 3
+
+
+def test_drain_returns_every_sample_once():
+    netft = reader(capacity=8)
+    netft.store(10.0, records([1, 2, 3], [1, 2, 3]))
+    assert netft.drain()["values"][:, 0].tolist() == [1, 2, 3]
+    assert len(netft.drain()) == 0
+    netft.store(10.1, records(np.arange(4, 14), np.arange(4, 14)))
+    samples = netft.drain()
+    assert samples["values"][:, 0].tolist() == list(range(6, 14))
+    assert netft.overruns == 2
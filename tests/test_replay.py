@@ -0,0 +1,99 @@
+import datetime, time
+import numpy as np
+from devices import DeviceManager
+from acquisition import AcquisitionEngine
+from recorder import Recorder, FIELDS
+from replay import ReplaySession, ReplayHBC, DATE_FORMAT
+from samplebuffer import SampleBuffer
+
+
+START = 1.7e9
+ROWS_PER_SECOND = 100
+
+
+def writeRecording(path, rows, netft=True):
+    """Writes a recording where ax = i / 1000 mm, fx = i N and nfx = i / 2 N for row i."""
+    with open(path, 'w', newline='') as file:
+        file.write(",".join(FIELDS if netft else FIELDS[:10]) + "\r\n")
+        for i in range(rows):
+            date = datetime.datetime.fromtimestamp(START + i // ROWS_PER_SECOND).strftime(DATE_FORMAT)
+            line = f"{date};{i / 1000};1;2;{i};0;0;0;0;0"
+            if netft:
+                line += f";{i};0;{i / 2};0;0;0;0;0"
+            file.write(line + "\r\n")
+    return str(path)
+
+
+def test_parse_reads_every_recorded_channel():
+    session = ReplaySession("unused")
+    date, values = session.parse("01-01-2024-00:00:00;1;2;3;4;5;6;7;8;9;10;0;11;12;13;14;15;16\r\n")
+    assert date == "01-01-2024-00:00:00"
+    assert values == (1, 2, 3, 4, 5, 6, 7, 8, 9, 11, 12, 13, 14, 15, 16)
+    _, values = session.parse("01-01-2024-00:00:00;1;2;3;4;5;6;7;8;9")
+    assert values[:9] == (1, 2, 3, 4, 5, 6, 7, 8, 9) and np.isnan(values[9:]).all()
+    assert session.parse("   \r\n") is None
+
+
+def test_rows_are_spread_along_their_second(tmp_path):
+    path = writeRecording(tmp_path / "netbox-data-x.csv", 3 * ROWS_PER_SECOND)
+    session = ReplaySession(path, speed=0, loop=True, chunkSize=50)
+    session.start()
+    rows = []
+    while len(rows) < 6 * ROWS_PER_SECOND:
+        session.advance()
+        row = session.next()
+        while row is not None:
+            rows.append(row)
+            row = session.next()
+    times = np.array([row[1] for row in rows])
+    assert times[0] == START
+    assert np.allclose(np.diff(times[:3 * ROWS_PER_SECOND]), 1 / ROWS_PER_SECOND, atol=1e-6)
+    #   The second pass of the loop follows the first one in time.
+    assert (np.diff(times) > 0).all()
+    assert [row[2][3] for row in rows[:3]] == [0, 1, 2]
+
+
+def test_replayed_lines_keep_their_recorded_values(tmp_path):
+    path = writeRecording(tmp_path / "netbox-data-x.csv", 10)
+    session = ReplaySession(path, speed=0)
+    hbc = ReplayHBC(session)
+    hbc.startMeasurement()
+    lines = hbc.readBlock(hbc.availableLines())
+    positions, netft = hbc.takeRecorded()
+    assert len(lines) == len(positions) == len(netft) == len(hbc.takeTimes()) == 10
+    assert np.allclose(positions[:, 0] / 2000000, lines[:, 0] / 1000 / 1000)
+    assert np.allclose(netft[:, 0] / 1000000, lines[:, 0] / 1000 / 2)
+
+
+def acquireReplay(tmp_path, path, rows):
+    devices = DeviceManager('unused', heidenCon=True)
+    buffer = SampleBuffer(10 * rows)
+    engine = AcquisitionEngine(devices, buffer, Recorder(str(tmp_path)), heidenCon=True, period=0.01)
+    engine.start()
+    try:
+        engine.submit(devices.replay, ReplaySession(path, speed=0)).result()
+        deadline = time.monotonic() + 10
+        while buffer.total < rows and time.monotonic() < deadline:
+            time.sleep(0.05)
+        engine.submit(devices.disconnect).result()
+    finally:
+        engine.stop()
+    return buffer.values[:buffer.total], buffer.times[:buffer.total]
+
+
+def test_engine_rows_get_the_positions_recorded_with_them(tmp_path):
+    rows = 2 * ROWS_PER_SECOND
+    values, times = acquireReplay(tmp_path, writeRecording(tmp_path / "netbox-data-x.csv", rows), rows)
+    assert len(values) == rows
+    assert (np.diff(times) > 0).all()
+    #   One position per row, not one per read.
+    assert np.allclose(values[:, 0], values[:, 3] / 1000)
+    assert np.allclose(values[:, 9], values[:, 3] / 2)
+
+
+def test_engine_replays_recordings_without_the_netft(tmp_path):
+    rows = ROWS_PER_SECOND
+    values, _ = acquireReplay(tmp_path, writeRecording(tmp_path / "netbox-data-x.csv", rows, netft=False), rows)
+    assert len(values) == rows
+    assert np.allclose(values[:, 0], values[:, 3] / 1000)
+    assert np.isnan(values[:, 9:]).all()
@@ -0,0 +1,71 @@
+import importlib
+import numpy as np
+import pytest
+import batch
+from samplebuffer import SampleBuffer, CHANNELS
+
+
+def rows(seqs):
+    seqs = np.asarray(seqs)
+    rows = batch.empty(len(seqs))
+    rows["time"] = 1.7e9 + seqs / 100
+    rows["seq"] = seqs
+    rows["values"] = np.repeat(seqs[:, None], len(CHANNELS), axis=1)
+    rows["status"] = 0
+    rows["flags"] = 0
+    return rows
+
+
+def test_since_follows_the_cursor():
+    buffer = SampleBuffer(100)
+    buffer.extend(rows(np.arange(50)))
+    seqs, times, values, flags, missed = buffer.since(-1, 1000)
+    assert seqs.tolist() == list(range(50)) and missed == 0
+    seqs, _, values, _, missed = buffer.since(39, 1000)
+    assert seqs.tolist() == list(range(40, 50)) and missed == 0
+    assert (values[:, 0] == seqs).all()
+    seqs, *_ = buffer.since(49, 1000)
+    assert len(seqs) == 0
+    seqs, *_ = buffer.since(9, 5)
+    assert seqs.tolist() == [10, 11, 12, 13, 14]
+
+
+def test_since_counts_the_rows_lost_by_the_ring():
+    buffer = SampleBuffer(100)
+    buffer.extend(rows(np.arange(250)))
+    seqs, _, _, _, missed = buffer.since(100, 1000)
+    assert seqs[0] == 150 and seqs[-1] == 249 and missed == 49
+
+
+def test_clear_empties_the_buffer():
+    buffer = SampleBuffer(100)
+    buffer.extend(rows(np.arange(10)))
+    generation = buffer.generation
+    buffer.clear()
+    assert buffer.total == 0 and buffer.generation == generation + 1
+    assert len(buffer.since(-1, 10)[0]) == 0
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    #   app.py opens ./data and the configuration files of the working directory.
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    app = importlib.import_module("app")
+    app.buffer.clear()
+    yield app
+    app.buffer.clear()
+    app.engine.seq = 0
+
+
+def test_samples_resets_a_cursor_past_the_newest_row(app):
+    app.buffer.extend(rows(np.arange(20)))
+    app.engine.seq = 20
+    client = app.app.test_client()
+    response = client.get('/api/samples?since=9&channels=fx').json
+    assert response["rows"] == 10 and response["next"] == 19 and not response["reset"]
+    #   e.g. the cursor of a client that was connected before a restart of the server
+    response = client.get('/api/samples?since=5000&channels=fx').json
+    assert response["reset"] and response["rows"] == 20 and response["next"] == 19
+    response = client.get('/api/samples?since=5000&channels=fx&format=binary')
+    assert response.headers["X-Reset"] == "true" and response.headers["X-Rows"] == "20"